@@ -0,0 +1,209 @@
+'''
+## Dynamic vertex buffers
+
+Vertex data rewritten every frame, without waiting for the GPU to finish
+reading what was written the frame before. Three strategies:
+
+    persistent  one buffer, 3 frame-sized regions, glBufferStorage with a
+                persistent coherent mapping; each region gets a fence once
+                drawn from, and is only written again after the fence
+                (GL 4.4 / ARB_buffer_storage)
+    orphan      glBufferData(NULL) then glBufferSubData: the driver hands out
+                fresh storage while the old one is still in use
+    subdata     glBufferSubData into the same storage (may stall; baseline)
+
+persistent is used when the context has it, orphan otherwise.
+
+    positions = dynamic_buffer.DynamicBuffer(GL_ARRAY_BUFFER, vertices.nbytes)
+    while ...:
+        offset = positions.write(vertices)          # byte offset of this frame's copy
+        glVertexAttribPointer(0, 4, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(offset))
+        glDrawElements(...)
+        positions.end_frame()
+
+    python dynamic_buffer.py    # vertices/sec updated per strategy, headless
+
+[Buffer Object Streaming - OpenGL Wiki](https://www.khronos.org/opengl/wiki/Buffer_Object_Streaming)
+[Buffer Object - OpenGL Wiki (Persistent mapping)](https://www.khronos.org/opengl/wiki/Buffer_Object#Persistent_mapping)
+'''
+
+import ctypes
+import time
+
+if __name__ == '__main__':
+    import headless
+
+from OpenGL.GL import *
+from OpenGL.error import GLError
+import numpy as np
+
+import gl_state
+from pbo_readback import WAIT_TIMEOUT, mapped_view
+
+
+STRATEGIES = ('persistent', 'orphan', 'subdata')
+
+
+def persistent_supported():
+    ''' glBufferStorage is core in 4.4, earlier contexts need ARB_buffer_storage '''
+    if not glBufferStorage:
+        return False
+    version = (glGetString(GL_VERSION) or b'0.0').split()[0].split(b'.')
+    if (int(version[0]), int(version[1])) >= (4, 4):
+        return True
+    try:
+        extensions = [glGetStringi(GL_EXTENSIONS, i) for i in range(glGetIntegerv(GL_NUM_EXTENSIONS))]
+    except GLError:
+        return False
+    return b'GL_ARB_buffer_storage' in extensions
+
+
+class DynamicBuffer:
+    ''' A buffer of `size` bytes that is rewritten every frame; see the module docstring. '''
+
+    def __init__(self, target, size, frames=3, strategy=None):
+        if strategy is None:
+            strategy = 'persistent' if persistent_supported() else 'orphan'
+        if strategy not in STRATEGIES:
+            raise RuntimeError('unknown buffer strategy %r (one of %s)' % (strategy, ', '.join(STRATEGIES)))
+
+        self.target = target
+        self.size = size
+        self.strategy = strategy
+        self.frames = frames if strategy == 'persistent' else 1
+
+        self.buffer = glGenBuffers(1)
+        gl_state.bind_buffer(target, self.buffer)
+        if strategy == 'persistent':
+            flags = GL_MAP_WRITE_BIT | GL_MAP_PERSISTENT_BIT | GL_MAP_COHERENT_BIT
+            glBufferStorage(target, size * self.frames, None, flags)
+            pointer = glMapBufferRange(target, 0, size * self.frames, flags)
+            self.view = mapped_view(pointer, (size * self.frames,))
+        else:
+            glBufferData(target, size, None, GL_STREAM_DRAW)
+
+        self.fences = [None] * self.frames
+        self.index = 0
+
+        # regions whose fence had not signalled when they were written again
+        self.stalls = 0
+        self.writes = 0
+
+    def write(self, data):
+        ''' Copy data into this frame's region; returns its byte offset in the buffer. '''
+        data = np.ascontiguousarray(data)
+        if data.nbytes > self.size:
+            raise RuntimeError('%d bytes written to a %d byte dynamic buffer' % (data.nbytes, self.size))
+        self.writes += 1
+
+        if self.strategy == 'persistent':
+            fence = self.fences[self.index]
+            if fence is not None:
+                if glClientWaitSync(fence, 0, 0) not in (GL_ALREADY_SIGNALED, GL_CONDITION_SATISFIED):
+                    self.stalls += 1
+                    if glClientWaitSync(fence, GL_SYNC_FLUSH_COMMANDS_BIT, WAIT_TIMEOUT) == GL_WAIT_FAILED:
+                        raise RuntimeError('glClientWaitSync failed')
+                glDeleteSync(fence)
+                self.fences[self.index] = None
+            offset = self.index * self.size
+            self.view[offset:offset + data.nbytes] = data.reshape(-1).view(np.uint8)
+            return offset
+
+        gl_state.bind_buffer(self.target, self.buffer)
+        if self.strategy == 'orphan':
+            glBufferData(self.target, self.size, None, GL_STREAM_DRAW)
+        glBufferSubData(self.target, 0, data.nbytes, data)
+        return 0
+
+    def end_frame(self):
+        ''' Call after the last draw that reads this frame's data. '''
+        if self.strategy == 'persistent':
+            self.fences[self.index] = glFenceSync(GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+            self.index = (self.index + 1) % self.frames
+
+    def delete(self):
+        for fence in self.fences:
+            if fence is not None:
+                glDeleteSync(fence)
+        self.fences = [None] * self.frames
+        if self.strategy == 'persistent':
+            gl_state.bind_buffer(self.target, self.buffer)
+            glUnmapBuffer(self.target)
+        gl_state.delete_buffer(self.buffer)
+
+
+benchmark_vertex_shader_text = '''
+#version 410 core
+
+layout(location = 0) in vec4 position;
+
+void main(void) {
+    gl_Position = position;
+}
+'''
+
+benchmark_fragment_shader_text = '''
+#version 410 core
+
+out vec4 outFragmentColor;
+
+void main(void) {
+    outFragmentColor = vec4(1.0);
+}
+'''
+
+def benchmark(counts, frames):
+    import program_cache
+
+    context = headless.create_context(512, 512)
+    strategies = [s for s in STRATEGIES if s != 'persistent' or persistent_supported()]
+    if 'persistent' not in strategies:
+        print('Persistent mapping is not supported by this context')
+
+    program = program_cache.create_program(benchmark_vertex_shader_text, benchmark_fragment_shader_text)
+    gl_state.use_program(program)
+    vao = glGenVertexArrays(1)
+    gl_state.bind_vertex_array(vao)
+    glEnableVertexAttribArray(0)
+
+    rng = np.random.default_rng(0)
+    print('%10s %-11s %12s %16s %8s' % ('vertices', 'strategy', 'ms/frame', 'vertices/sec', 'stalls'))
+    for count in counts:
+        # a few precomputed frames, so the timing excludes the NumPy side
+        updates = [rng.uniform(-1, 1, (count, 4)).astype(np.float32) for _ in range(4)]
+        for strategy in strategies:
+            buffer = DynamicBuffer(GL_ARRAY_BUFFER, updates[0].nbytes, strategy=strategy)
+
+            def frame(i):
+                offset = buffer.write(updates[i % len(updates)])
+                gl_state.bind_buffer(GL_ARRAY_BUFFER, buffer.buffer)
+                glVertexAttribPointer(0, 4, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(offset))
+                glDrawArrays(GL_POINTS, 0, count)
+                buffer.end_frame()
+                glFlush()
+
+            frame(0)
+            glFinish()
+            buffer.stalls = 0
+
+            start = time.perf_counter()
+            for i in range(frames):
+                frame(i)
+            # as in a swap chain only the end is waited for
+            glFinish()
+            elapsed = (time.perf_counter() - start) / frames
+            print('%10d %-11s %12.3f %16.0f %8d' % (count, strategy, elapsed * 1000, count / elapsed, buffer.stalls))
+            buffer.delete()
+
+    gl_state.delete_vertex_array(vao)
+    gl_state.delete_program(program)
+    context.destroy()
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Vertices/sec streamed through each dynamic buffer strategy.')
+    parser.add_argument('--counts', type=int, nargs='+', default=[3000, 100000, 1000000])
+    parser.add_argument('--frames', type=int, default=200)
+    args = parser.parse_args()
+
+    benchmark(args.counts, args.frames)
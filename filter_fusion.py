@@ -0,0 +1,290 @@
+'''
+## Filter fusion
+
+Per-pixel filter chains compiled into as few passes as possible. Filters
+come from a small registry and are one of three kinds:
+
+    pointwise   vec4 f(vec4 color, vec2 uv)          colour in, colour out (swizzle, colour correction)
+    remap       vec2 f(vec2 uv)                      where to read from (the fisheye undistortion)
+    kernel      vec4 f(sampler2D image, vec2 uv)     reads neighbours (sharpen)
+
+A chain such as fisheye -> swizzle -> color is fused at build time into one
+generated fragment shader: the remaps of a pass compose into the coordinate
+the input is read at, and the pointwise filters are applied in turn to that
+one texel. A kernel has to read the finished image around it, so it starts
+a new pass (a remap after it still fuses, it only moves where the kernel
+reads). Without fusion every filter is a full-screen pass writing a whole
+intermediate texture; the passes run through postprocess.PassGraph either
+way, and give the same image but for the rounding and resampling of those
+intermediates: where a remap reads outside the image, the result is black
+from there on, whatever came before it.
+
+Filter code uses `$name` for its parameters, so the same filter can appear
+twice in a chain. Generated shaders are kept per chain layout, and their
+programs go through program_cache like every other.
+
+    passes = filter_fusion.build([('fisheye', {}), ('swizzle', {}), ('color', {'saturation': 1.3})])
+    passes.run(texture, (width, height), framebuffer=0, viewport=(0, 0, width, height))
+
+    python filter_fusion.py    # fused vs one pass per filter on 4K input, headless
+
+[Halide: decoupling algorithms from schedules (inlining pointwise stages)](https://halide-lang.org/)
+'''
+
+import collections
+import time
+
+if __name__ == '__main__':
+    import headless
+
+from OpenGL.GL import *
+import numpy as np
+
+import gl_state
+import postprocess
+
+
+Filter = collections.namedtuple('Filter', ['kind', 'code', 'parameters'])
+
+KINDS = ('pointwise', 'remap', 'kernel')
+
+# name -> Filter; parameters are name -> (GLSL type, default)
+filters = collections.OrderedDict()
+
+
+def register(name, kind, code, parameters=None):
+    ''' code is the body of the filter's function (see the module docstring for its arguments). '''
+    if kind not in KINDS:
+        raise RuntimeError('unknown filter kind %r (one of %s)' % (kind, ', '.join(KINDS)))
+    filters[name] = Filter(kind, code, collections.OrderedDict(parameters or {}))
+
+
+# glsl_py12's undistortion, in uv units of the output (center, size: fractions of it)
+register('fisheye', 'remap', '''
+    const float PI = 3.141592653589793;
+    float x = (uv.x - $center.x) / $size.x * 2.0;
+    float y = (uv.y - $center.y) / $size.y * 2.0;
+    float n = length(vec2(x, y));
+    if (n > 1.0) {
+        // outside the image circle: read outside the image, which is black
+        return vec2(-1.0);
+    }
+    float r = atan(n, sqrt(1.0 - n*n));
+    float theta = x == 0.0 ? sign(y) * PI / 2.0 : atan(y, x);
+    float r2 = r*r;
+    float r4 = r2*r2;
+    float r_d = r * (1.0 + $k.x * r2 + $k.y * r4 + $k.z * r2*r4 + $k.w * r4*r4);
+    return vec2((r_d * cos(theta) + 1.0) / 2.0, (r_d * sin(theta) + 1.0) / 2.0);
+''', {'k': ('vec4', (0.0, 0.0, 0.0, 0.0)), 'center': ('vec2', (0.5, 0.5)), 'size': ('vec2', (1.0, 1.0))})
+
+# the channel swap glsl_py1 and glsl_py9/10 used to do in their shaders
+register('swizzle', 'pointwise', '''
+    return color.bgra;
+''')
+
+# glsl_py7's coordinate colouring, blended over the image
+register('coordinate_color', 'pointwise', '''
+    return mix(color, vec4(uv.x, 0.0, uv.y, 1.0), $amount);
+''', {'amount': ('float', 0.5)})
+
+register('color', 'pointwise', '''
+    vec3 c = color.rgb * exp2($exposure);
+    c = (c - 0.5) * $contrast + 0.5;
+    c = mix(vec3(dot(c, vec3(0.2126, 0.7152, 0.0722))), c, $saturation);
+    return vec4(clamp(c, 0.0, 1.0), color.a);
+''', {'exposure': ('float', 0.0), 'contrast': ('float', 1.1), 'saturation': ('float', 1.2)})
+
+register('vignette', 'pointwise', '''
+    float d = length(uv - 0.5) * 1.41421356;
+    return vec4(color.rgb * (1.0 - $strength * d * d), color.a);
+''', {'strength': ('float', 0.5)})
+
+register('sharpen', 'kernel', '''
+    vec2 texel = 1.0 / vec2(textureSize(image, 0));
+    vec4 center = texture(image, uv);
+    vec4 blur = (texture(image, uv + vec2(texel.x, 0.0)) + texture(image, uv - vec2(texel.x, 0.0))
+               + texture(image, uv + vec2(0.0, texel.y)) + texture(image, uv - vec2(0.0, texel.y))) * 0.25;
+    return clamp(center + (center - blur) * $amount, 0.0, 1.0);
+''', {'amount': ('float', 0.8)})
+
+
+def group(chain, fuse=True):
+    ''' The chain's (index, name, values) stages split into passes. '''
+    passes = []
+    for index, (name, values) in enumerate(chain):
+        if name not in filters:
+            raise RuntimeError('unknown filter %r (one of %s)' % (name, ', '.join(filters)))
+        stage = (index, name, values)
+        # a kernel reads its input's neighbours: only the first stage of a pass may be one
+        if not passes or not fuse or filters[name].kind == 'kernel':
+            passes.append([stage])
+        else:
+            passes[-1].append(stage)
+    return passes
+
+def uniform_name(index, parameter):
+    return 'f%d_%s' % (index, parameter)
+
+def substitute(code, index, parameters):
+    for parameter in sorted(parameters, key=len, reverse=True):
+        code = code.replace('$' + parameter, uniform_name(index, parameter))
+    return code
+
+# (stage names, flip) -> generated fragment shader
+generated = {}
+generated_stats = {'hits': 0, 'misses': 0}
+
+def fragment_shader(stages, flip):
+    '''
+    One pass over stages [(index, name, values)]: the first may be a kernel,
+    the input is `vTexture`; flip reads it top row first (the source image).
+    '''
+    key = (tuple((index, name) for index, name, _ in stages), flip)
+    if key in generated:
+        generated_stats['hits'] += 1
+        return generated[key]
+    generated_stats['misses'] += 1
+
+    declarations = []
+    functions = []
+    for index, name, _ in stages:
+        f = filters[name]
+        for parameter, (glsl_type, _) in f.parameters.items():
+            declarations.append('uniform %s %s;' % (glsl_type, uniform_name(index, parameter)))
+        signature = {
+            'pointwise': 'vec4 f%d_%s(vec4 color, vec2 uv)',
+            'remap': 'vec2 f%d_%s(vec2 uv)',
+            'kernel': 'vec4 f%d_%s(sampler2D image, vec2 uv)',
+        }[f.kind] % (index, name)
+        functions.append('%s {%s}' % (signature, substitute(f.code, index, f.parameters)))
+
+    # coordinates from the output back to the input: a remap moves the stages before it
+    body = ['    vec2 uv%d = vTexCoord;' % len(stages)]
+    for position in range(len(stages) - 1, -1, -1):
+        index, name, _ = stages[position]
+        if filters[name].kind == 'remap':
+            body.append('    vec2 uv%d = f%d_%s(uv%d);' % (position, index, name, position + 1))
+        else:
+            body.append('    vec2 uv%d = uv%d;' % (position, position + 1))
+
+    first_index, first_name, _ = stages[0]
+    if filters[first_name].kind == 'kernel':
+        body.append('    vec4 color = f%d_%s(vTexture, input_uv(uv0));' % (first_index, first_name))
+        body.append('    if (outside(uv0)) color = vec4(0.0, 0.0, 0.0, 1.0);')
+    else:
+        body.append('    vec4 color = read(uv0);')
+    for position, (index, name, _) in enumerate(stages):
+        if filters[name].kind == 'pointwise':
+            body.append('    color = f%d_%s(color, uv%d);' % (index, name, position + 1))
+        elif filters[name].kind == 'remap' and position > 0:
+            # unfused, the stages so far are an image this remap reads black around
+            body.append('    if (outside(uv%d)) color = vec4(0.0, 0.0, 0.0, 1.0);' % position)
+    body.append('    flagColor = color;')
+
+    text = '''
+#version 410 core
+
+// generated by filter_fusion.py: %s
+uniform sampler2D vTexture;
+%s
+in vec2 vTexCoord;
+out vec4 flagColor;
+
+bool outside(vec2 uv) {
+    return any(lessThan(uv, vec2(0.0))) || any(greaterThan(uv, vec2(1.0)));
+}
+
+vec2 input_uv(vec2 uv) {
+    return %s;
+}
+
+// out of the image reads black, whatever the wrap mode
+vec4 read(vec2 uv) {
+    return outside(uv) ? vec4(0.0, 0.0, 0.0, 1.0) : texture(vTexture, input_uv(uv));
+}
+
+%s
+
+void main(void) {
+%s
+}
+''' % (
+        ' -> '.join(name for _, name, _ in stages),
+        '\n'.join(declarations),
+        'vec2(uv.x, 1.0 - uv.y)' if flip else 'uv',
+        '\n\n'.join(functions),
+        '\n'.join(body),
+    )
+    generated[key] = text
+    return text
+
+def uniforms(stages):
+    values = {}
+    for index, name, given in stages:
+        for parameter, (_, default) in filters[name].parameters.items():
+            values[uniform_name(index, parameter)] = given.get(parameter, default)
+    return values
+
+def build(chain, fuse=True, pool=None):
+    '''
+    postprocess.PassGraph running the chain [(filter name, {parameter: value})]
+    over a source image uploaded top row first; fuse=False gives every filter a pass.
+    '''
+    graph = postprocess.PassGraph(pool)
+    for number, stages in enumerate(group(chain, fuse)):
+        name = '+'.join(name for _, name, _ in stages)
+        graph.add('%d %s' % (number, name), fragment_shader(stages, flip=number == 0), uniforms=uniforms(stages))
+    return graph
+
+
+BENCHMARK_CHAINS = collections.OrderedDict([
+    ('fisheye+swizzle+coordinate', [('fisheye', {'k': (0.1, 0.01, 0.0, 0.0)}), ('swizzle', {}), ('coordinate_color', {})]),
+    ('fisheye+color+vignette', [('fisheye', {'k': (0.1, 0.01, 0.0, 0.0)}), ('color', {}), ('vignette', {})]),
+    ('color+sharpen+vignette', [('color', {}), ('sharpen', {}), ('vignette', {})]),
+])
+
+def benchmark(width, height, frames):
+    import texture_manager
+
+    context = headless.create_context(width, height)
+
+    img = np.random.randint(0, 256, (height, width, 3), dtype=np.uint8)
+    source = texture_manager.create(img, wrap=GL_CLAMP_TO_BORDER)
+    megapixels = width * height / 1e6
+
+    print('%dx%d input and output, %d frames' % (width, height, frames))
+    print('%-28s %-8s %7s %10s %10s %14s' % ('chain', 'mode', 'passes', 'ms/frame', 'MP/s', 'targets MB'))
+    for label, chain in BENCHMARK_CHAINS.items():
+        for fuse in (False, True):
+            graph = build(chain, fuse)
+
+            def frame():
+                graph.run(source, (width, height), framebuffer=context.framebuffer, viewport=(0, 0, width, height))
+                context.present()
+                gl_state.end_frame()
+
+            frame()
+            glFinish()
+            start = time.perf_counter()
+            for _ in range(frames):
+                frame()
+            glFinish()
+            elapsed = (time.perf_counter() - start) / frames
+
+            print('%-28s %-8s %7d %10.3f %10.1f %14.1f' % (
+                label, 'fused' if fuse else 'unfused', len(graph.passes), elapsed * 1000,
+                megapixels / elapsed, graph.pool.allocated_bytes() / 2**20))
+            graph.delete()
+
+    print('Generated shaders : %(misses)d built, %(hits)d reused' % generated_stats)
+    gl_state.delete_texture(source)
+    context.destroy()
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Fused vs unfused per-pixel filter chains.')
+    parser.add_argument('--size', type=int, nargs=2, default=(3840, 2160), metavar=('W', 'H'))
+    parser.add_argument('--frames', type=int, default=30)
+    args = parser.parse_args()
+
+    benchmark(args.size[0], args.size[1], args.frames)
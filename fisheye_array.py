@@ -0,0 +1,263 @@
+'''
+## Texture-array fisheye batch
+
+Warps many same-sized images in one draw call. Up to
+GL_MAX_ARRAY_TEXTURE_LAYERS inputs are uploaded as the layers of one
+GL_TEXTURE_2D_ARRAY. The glsl_py12.py shader then runs over all of them in
+a single instanced draw: a geometry shader sends instance i to layer i of a
+layered framebuffer (an RGBA8 texture array). All outputs come back with
+one glGetTexImage. Per image, only the layer upload is left; the draw,
+state changes and readback are paid once per batch.
+
+    python fisheye_batch.py --array thumbnails/ out/      # same-sized images go in batches
+    python fisheye_array.py                               # images/sec, array vs one at a time, headless
+    python fisheye_array.py --passthrough --size 128      # glsl_py11.py-style copy instead of the warp
+
+[Array Texture - OpenGL Wiki](https://www.khronos.org/opengl/wiki/Array_Texture)
+[Geometry Shader - OpenGL Wiki (Layered rendering)](https://www.khronos.org/opengl/wiki/Geometry_Shader#Layered_rendering)
+'''
+
+import ctypes
+import time
+
+if __name__ == '__main__':
+    import headless
+
+from OpenGL.GL import *
+from OpenGL.raw.GL.VERSION.GL_1_0 import glGetTexImage as raw_glGetTexImage
+import numpy as np
+
+import gl_program
+import gl_state
+import glsl_py12
+import image_ingest
+import program_cache
+
+
+array_vertex_shader_text = '''
+#version 410 core
+
+in vec3 vPosition;
+out vec3 vVertexPosition;
+flat out int vLayer;
+
+void main(void) {
+    vVertexPosition = vPosition;
+    vLayer = gl_InstanceID;
+    gl_Position = vec4(vPosition, 1.0);
+}
+'''
+
+# instance i -> layer i; gl_Layer can only be written here in GL 4.1
+array_geometry_shader_text = '''
+#version 410 core
+
+layout(triangles) in;
+layout(triangle_strip, max_vertices = 3) out;
+
+in vec3 vVertexPosition[];
+flat in int vLayer[];
+out vec3 vFragmentPosition;
+flat out int gLayer;
+
+void main(void) {
+    for (int i = 0; i < 3; i++) {
+        gl_Layer = vLayer[0];
+        gLayer = vLayer[0];
+        vFragmentPosition = vVertexPosition[i];
+        gl_Position = gl_in[i].gl_Position;
+        EmitVertex();
+    }
+    EndPrimitive();
+}
+'''
+
+# glsl_py12's fisheye, sampling the layer being drawn
+array_fragment_shader_text = glsl_py12.fragment_shader_text.replace(
+    'uniform sampler2D vTexture;',
+    'uniform sampler2DArray vTexture;\nflat in int gLayer;',
+).replace(
+    'texture(vTexture, vec2(vTexCoord.x, 1.0 - vTexCoord.y))',
+    'texture(vTexture, vec3(vTexCoord.x, 1.0 - vTexCoord.y, gLayer))',
+)
+
+# glsl_py11: the image as it is
+passthrough_fragment_shader_text = '''
+#version 410 core
+
+uniform sampler2DArray vTexture;
+in vec3 vFragmentPosition;
+flat in int gLayer;
+out vec4 flagColor;
+
+void main(void) {
+    // the image is uploaded top row first
+    vec2 vTexCoord = vec2((vFragmentPosition.x + 1.0) / 2, (1.0 - vFragmentPosition.y) / 2);
+    flagColor = texture(vTexture, vec3(vTexCoord, gLayer)).rgba;
+}
+'''
+
+
+def max_layers():
+    return int(glGetIntegerv(GL_MAX_ARRAY_TEXTURE_LAYERS))
+
+def allocate_array(width, height, layers):
+    ''' RGBA8 array texture, one level, bound to GL_TEXTURE_2D_ARRAY on unit 0. '''
+    texture = glGenTextures(1)
+    gl_state.bind_texture(GL_TEXTURE_2D_ARRAY, texture, unit=GL_TEXTURE0)
+    if glTexStorage3D:
+        glTexStorage3D(GL_TEXTURE_2D_ARRAY, 1, GL_RGBA8, width, height, layers)
+    else:
+        # GL 4.1 (macOS) has no ARB_texture_storage; same allocation, mutable
+        glTexImage3D(GL_TEXTURE_2D_ARRAY, 0, GL_RGBA8, width, height, layers, 0, GL_BGRA, GL_UNSIGNED_BYTE, None)
+        gl_state.tex_parameter(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_MAX_LEVEL, 0)
+    gl_state.tex_parameter(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+    gl_state.tex_parameter(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+    return texture
+
+
+class ArrayBatch:
+    '''
+    width x height BGR inputs -> size x size BGRA outputs (bottom row first),
+    `layers` at a time. Uses glsl_py12's VAO and FisheyeParams buffer.
+    '''
+
+    def __init__(self, width, height, size, layers, passthrough=False):
+        limit = max_layers()
+        if layers > limit:
+            raise RuntimeError('%d layers asked for, GL_MAX_ARRAY_TEXTURE_LAYERS is %d' % (layers, limit))
+
+        self.width = width
+        self.height = height
+        self.size = size
+        self.layers = layers
+
+        self.program = program_cache.create_program(
+            array_vertex_shader_text,
+            passthrough_fragment_shader_text if passthrough else array_fragment_shader_text,
+            geometry_shader_src=array_geometry_shader_text,
+        )
+        self.shader = gl_program.Program(self.program)
+        glsl_py12.bind_params_block(self.program)
+
+        self.input = allocate_array(width, height, layers)
+        gl_state.tex_parameter(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_BORDER)
+        gl_state.tex_parameter(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_BORDER)
+        self.output = allocate_array(size, size, layers)
+
+        self.framebuffer = glGenFramebuffers(1)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.framebuffer)
+        # every layer at once: a layered attachment
+        glFramebufferTexture(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, self.output, 0)
+        status = glCheckFramebufferStatus(GL_FRAMEBUFFER)
+        if status != GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError('Layered framebuffer is not complete: 0x%x' % status)
+
+        self.pixels = np.empty((layers, size, size, 4), dtype=np.uint8)
+
+    def upload(self, images):
+        gl_state.bind_texture(GL_TEXTURE_2D_ARRAY, self.input, unit=GL_TEXTURE0)
+        for layer, img in enumerate(images):
+            if img.shape[:2] != (self.height, self.width):
+                raise RuntimeError('image is %dx%d, batch is %dx%d' % (img.shape[1], img.shape[0], self.width, self.height))
+            pixels, pixel_format, alignment, _ = image_ingest.prepare(img)
+            glPixelStorei(GL_UNPACK_ALIGNMENT, alignment)
+            glTexSubImage3D(GL_TEXTURE_2D_ARRAY, 0, 0, 0, layer, self.width, self.height, 1,
+                            pixel_format, GL_UNSIGNED_BYTE, pixels)
+
+    def draw(self, count):
+        glBindFramebuffer(GL_FRAMEBUFFER, self.framebuffer)
+        glViewport(0, 0, self.size, self.size)
+        gl_state.clear_color(0, 0, 0, 1)
+        # clears every layer
+        glClear(GL_COLOR_BUFFER_BIT)
+
+        gl_state.use_program(self.program)
+        self.shader.set_uniform('vTexture', 0)
+        gl_state.bind_texture(GL_TEXTURE_2D_ARRAY, self.input, unit=GL_TEXTURE0)
+        gl_state.bind_vertex_array(glsl_py12.vertex_vao)
+        glDrawArraysInstanced(GL_TRIANGLES, 0, 6, count)
+
+    def read(self, count):
+        ''' The first count outputs, BGRA bottom row first; views valid until the next read. '''
+        gl_state.bind_texture(GL_TEXTURE_2D_ARRAY, self.output, unit=GL_TEXTURE0)
+        glPixelStorei(GL_PACK_ALIGNMENT, 4)
+        # one call for all layers, straight into our array
+        raw_glGetTexImage(GL_TEXTURE_2D_ARRAY, 0, GL_BGRA, GL_UNSIGNED_BYTE,
+                          self.pixels.ctypes.data_as(ctypes.c_void_p))
+        return self.pixels[:count]
+
+    def process(self, images):
+        self.upload(images)
+        self.draw(len(images))
+        return self.read(len(images))
+
+    def delete(self):
+        glDeleteFramebuffers(1, [self.framebuffer])
+        gl_state.delete_texture(self.input, self.output)
+        gl_state.delete_program(self.program)
+
+
+def benchmark(count, width, size, layers, passthrough):
+    context = headless.create_context(size, size)
+
+    if passthrough:
+        import glsl_py11
+        program = program_cache.create_program(glsl_py11.vertex_shader_text, glsl_py11.fragment_shader_text)
+    else:
+        program = program_cache.create_program(glsl_py12.vertex_shader_text, glsl_py12.fragment_shader_text)
+    shader = gl_program.Program(program)
+    glsl_py12.init_vao()
+    glsl_py12.init_params(program)
+    glsl_py12.set_params(glsl_py12.DEFAULT_K, (size, size), (size / 2, size / 2))
+
+    images = [np.random.randint(0, 256, (width, width, 3), dtype=np.uint8) for _ in range(min(count, 64))]
+
+    # one at a time, as fisheye_batch.py does
+    texture = glGenTextures(1)
+    gl_state.bind_texture(GL_TEXTURE_2D, texture, unit=GL_TEXTURE0)
+    image_ingest.upload(images[0])
+    gl_state.tex_parameter(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+    start = time.perf_counter()
+    for i in range(count):
+        gl_state.bind_texture(GL_TEXTURE_2D, texture, unit=GL_TEXTURE0)
+        image_ingest.upload(images[i % len(images)], sub=True)
+        gl_state.clear_color(0, 0, 0, 1)
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        gl_state.use_program(program)
+        shader.set_uniform('vTexture', 0)
+        gl_state.bind_vertex_array(glsl_py12.vertex_vao)
+        glDrawArrays(GL_TRIANGLES, 0, 6)
+        context.read_pixels()
+    single_time = time.perf_counter() - start
+    gl_state.delete_texture(texture)
+    gl_state.delete_program(program)
+
+    batch = ArrayBatch(width, width, size, layers, passthrough)
+    start = time.perf_counter()
+    for first in range(0, count, layers):
+        n = min(layers, count - first)
+        batch.process([images[(first + i) % len(images)] for i in range(n)])
+    array_time = time.perf_counter() - start
+    batch.delete()
+    context.bind()
+
+    print('%d images %dx%d -> %dx%d (%s), %d layers (max %d)' % (
+        count, width, width, size, size, 'passthrough' if passthrough else 'fisheye', layers, max_layers()))
+    print('%-14s %12s %12s' % ('mode', 'ms/image', 'images/sec'))
+    for label, elapsed in (('one at a time', single_time), ('texture array', array_time)):
+        print('%-14s %12.3f %12.1f' % (label, elapsed / count * 1000, count / elapsed))
+
+    context.destroy()
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Images/sec: one texture array draw vs one draw per image.')
+    parser.add_argument('--count', type=int, default=2048)
+    parser.add_argument('--width', type=int, default=256, help='input images are width x width')
+    parser.add_argument('--size', type=int, default=256, help='outputs are size x size')
+    parser.add_argument('--layers', type=int, default=256)
+    parser.add_argument('--passthrough', action='store_true', help='glsl_py11.py copy instead of the fisheye warp')
+    args = parser.parse_args()
+
+    benchmark(args.count, args.width, args.size, args.layers, args.passthrough)
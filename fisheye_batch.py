@@ -0,0 +1,195 @@
+'''
+## Batch fisheye
+
+Streams a directory of images through the glsl_py12.py fisheye shader.
+One headless context, one compiled program and one VAO are created per batch;
+each image is re-uploaded as decoded (image_ingest.py, no flip/cvtColor copy)
+into the existing texture with glTexSubImage2D (the texture is only
+reallocated when the image size changes), rendered,
+read back and written to the output directory.
+
+    python fisheye_batch.py input_dir output_dir
+    python fisheye_batch.py --array --size 256 thumbnails/ out/    # many small images per draw, see fisheye_array.py
+'''
+
+import os
+import sys
+import time
+
+start_time = time.perf_counter()
+
+import headless
+import glsl_py12
+from OpenGL.GL import *
+import cv2
+
+import gl_state
+import image_ingest
+
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+
+def list_images(input_dir):
+    return sorted(
+        os.path.join(input_dir, name)
+        for name in os.listdir(input_dir)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+def init_texture():
+    global texture, texture_size
+    texture = glGenTextures(1)
+    texture_size = None
+
+    gl_state.bind_texture(GL_TEXTURE_2D, texture, unit=GL_TEXTURE0)
+
+    glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+    glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_BORDER)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_BORDER)
+
+def upload_image(img):
+    global texture_size
+    height, width = img.shape[:2]
+
+    gl_state.bind_texture(GL_TEXTURE_2D, texture, unit=GL_TEXTURE0)
+    # storage is only (re)allocated when the input size changes
+    image_ingest.upload(img, sub=texture_size == (width, height))
+    texture_size = (width, height)
+
+def read_image():
+    rgba = context.read_pixels()
+    return cv2.cvtColor(cv2.flip(rgba, 0), cv2.COLOR_RGBA2BGR)
+
+def run_batch(paths, output_dir):
+    timings = {'decode': 0.0, 'upload': 0.0, 'render': 0.0, 'readback': 0.0, 'encode': 0.0}
+
+    processed = 0
+    batch_start = time.perf_counter()
+    for path in paths:
+        t0 = time.perf_counter()
+        img = cv2.imread(path, 1)
+        if img is None:
+            print('Skipping unreadable image :', path)
+            continue
+        t1 = time.perf_counter()
+        upload_image(img)
+        t2 = time.perf_counter()
+        glsl_py12.draw_frame()
+        glFinish()
+        t3 = time.perf_counter()
+        out = read_image()
+        t4 = time.perf_counter()
+        cv2.imwrite(os.path.join(output_dir, os.path.basename(path)), out)
+        t5 = time.perf_counter()
+
+        timings['decode'] += t1 - t0
+        timings['upload'] += t2 - t1
+        timings['render'] += t3 - t2
+        timings['readback'] += t4 - t3
+        timings['encode'] += t5 - t4
+        processed += 1
+
+    return processed, time.perf_counter() - batch_start, timings
+
+def run_array_batch(paths, output_dir, size, layers):
+    ''' run_batch, but runs of same-sized images go through one texture array draw, `layers` at a time. '''
+    import fisheye_array
+
+    timings = {'decode': 0.0, 'upload': 0.0, 'render': 0.0, 'readback': 0.0, 'encode': 0.0}
+    pending = []
+    batch = None
+
+    def flush():
+        t0 = time.perf_counter()
+        batch.upload([img for _, img in pending])
+        t1 = time.perf_counter()
+        batch.draw(len(pending))
+        glFinish()
+        t2 = time.perf_counter()
+        outputs = batch.read(len(pending))
+        t3 = time.perf_counter()
+        for (path, _), bgra in zip(pending, outputs):
+            cv2.imwrite(os.path.join(output_dir, os.path.basename(path)), cv2.cvtColor(cv2.flip(bgra, 0), cv2.COLOR_BGRA2BGR))
+        t4 = time.perf_counter()
+
+        timings['upload'] += t1 - t0
+        timings['render'] += t2 - t1
+        timings['readback'] += t3 - t2
+        timings['encode'] += t4 - t3
+        pending.clear()
+
+    processed = 0
+    batch_start = time.perf_counter()
+    for path in paths:
+        t0 = time.perf_counter()
+        img = cv2.imread(path, 1)
+        if img is None:
+            print('Skipping unreadable image :', path)
+            continue
+        timings['decode'] += time.perf_counter() - t0
+
+        height, width = img.shape[:2]
+        if batch is None or (batch.width, batch.height) != (width, height):
+            if pending:
+                flush()
+            if batch is not None:
+                batch.delete()
+            batch = fisheye_array.ArrayBatch(width, height, size, layers)
+
+        pending.append((path, img))
+        processed += 1
+        if len(pending) == layers:
+            flush()
+
+    if pending:
+        flush()
+    if batch is not None:
+        batch.delete()
+    context.bind()
+
+    return processed, time.perf_counter() - batch_start, timings
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Apply the fisheye warp to every image in a directory.')
+    parser.add_argument('input_dir')
+    parser.add_argument('output_dir')
+    parser.add_argument('--k', type=float, nargs=4, default=glsl_py12.DEFAULT_K, metavar=('K1', 'K2', 'K3', 'K4'))
+    parser.add_argument('--center', type=float, nargs=2, default=None, metavar=('CX', 'CY'), help='principal point in pixels')
+    parser.add_argument('--size', type=int, default=glsl_py12.S, help='outputs are size x size')
+    parser.add_argument('--array', action='store_true', help='warp same-sized images together, one texture array draw per batch')
+    parser.add_argument('--layers', type=int, default=16, help='images per texture array draw')
+    args = parser.parse_args()
+
+    paths = list_images(args.input_dir)
+    if not paths:
+        print('No images in', args.input_dir)
+        sys.exit(1)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    # paid once per batch
+    setup_start = time.perf_counter()
+    context = headless.create_context(args.size, args.size)
+    init_texture()
+    glsl_py12.init_shader()
+    glsl_py12.init_vao()
+    glsl_py12.init_params()
+    glsl_py12.set_params(args.k, (args.size, args.size), args.center or (args.size / 2, args.size / 2))
+    setup_end = time.perf_counter()
+
+    print('Processing %d images..' % len(paths))
+    if args.array:
+        processed, elapsed, timings = run_array_batch(paths, args.output_dir, args.size, args.layers)
+    else:
+        processed, elapsed, timings = run_batch(paths, args.output_dir)
+
+    context.destroy()
+
+    print('Imports : %.1f ms' % ((setup_start - start_time) * 1000))
+    print('Context + shader + vao : %.1f ms' % ((setup_end - setup_start) * 1000))
+    if processed:
+        for phase, total in timings.items():
+            print('%s : %.3f ms/image' % (phase, total / processed * 1000))
+    print('Throughput : %.1f images/sec (%d images in %.2f s)' % (processed / elapsed, processed, elapsed))
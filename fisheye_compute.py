@@ -0,0 +1,277 @@
+'''
+## Fisheye warp as a compute shader
+
+glsl_py12.py's undistortion without the rasterizer: one invocation per
+output pixel, written with imageStore into an immutable RGBA8 texture. Needs
+GL 4.3 (`#version 430`; Mesa llvmpipe has it, macOS stops at 4.1, so the
+windowed scenes keep the fragment path).
+
+The camera profile is the same FisheyeParams uniform block, so
+glsl_py12.set_params drives both paths. The workgroup size is a #define
+(`local_size`), and with `shared_tile` a workgroup first gathers the bilinear
+footprint of its pixels into shared memory (packed RGBA8, TILE_SIZE^2
+texels) and filters from there; where the footprint does not fit, as when
+minifying, it falls back to the texture unit.
+
+    warp = fisheye_compute.FisheyeCompute(local_size=(16, 16), shared_tile=True)
+    warp.dispatch(texture, target)    # postprocess.RenderTarget, or anything with texture, width, height
+
+    python fisheye_compute.py    # vs the fragment path across output sizes, headless
+
+[Compute Shader - OpenGL Wiki](https://www.khronos.org/opengl/wiki/Compute_Shader)
+[Image Load Store - OpenGL Wiki](https://www.khronos.org/opengl/wiki/Image_Load_Store)
+'''
+
+import time
+
+if __name__ == '__main__':
+    import headless
+
+from OpenGL.GL import *
+import numpy as np
+
+import gl_program
+import gl_state
+import program_cache
+
+
+IMAGE_UNIT = 0
+
+compute_shader_text = '''
+#version 430
+
+layout(local_size_x = LOCAL_SIZE_X, local_size_y = LOCAL_SIZE_Y) in;
+
+const float PI = 3.141592653589793;
+
+// as in glsl_py12 (see set_params there)
+layout(std140) uniform FisheyeParams {
+    vec4 vK;       // k1..k4
+    vec2 vSize;    // output resolution the image circle is normalized by
+    vec2 vCenter;  // principal point in pixels
+};
+
+uniform sampler2D vTexture;
+layout(rgba8, binding = 0) writeonly uniform image2D vOutput;
+
+float atan2(in float y, in float x) {
+    return x == 0.0 ? sign(y)*PI/2 : atan(y, x);
+}
+
+// texture coordinate for the output pixel centred at position, false outside the image circle
+bool source_coordinate(vec2 position, out vec2 uv) {
+    float x = (position.x - vCenter.x) / vSize.x * 2.0;
+    float y = (position.y - vCenter.y) / vSize.y * 2.0;
+
+    float n = length(vec2(x, y));
+    uv = vec2(0.0);
+    if (n > 1) {
+        return false;
+    }
+    float r = atan2(n, sqrt(1.0 - n*n));
+    float theta = atan2(y, x);
+
+    float r2 = r*r;
+    float r4 = r2*r2;
+    float r_d = r * (1 + vK.x * r2 + vK.y * r4 + vK.z * r2*r4 + vK.w * r4*r4);
+
+    // the image is uploaded top row first, so v runs down it
+    uv = vec2((r_d * cos(theta) + 1.0) / 2.0, 1.0 - (r_d * sin(theta) + 1.0) / 2.0);
+    return true;
+}
+
+#if SHARED_TILE
+shared uint tile[TILE_SIZE * TILE_SIZE];
+shared int tile_min_x, tile_min_y, tile_max_x, tile_max_y;
+
+// texelFetch has no wrap mode: outside the image is the (transparent black) border
+vec4 source_texel(ivec2 p, ivec2 size) {
+    return all(greaterThanEqual(p, ivec2(0))) && all(lessThan(p, size)) ? texelFetch(vTexture, p, 0) : vec4(0.0);
+}
+
+vec4 tile_texel(ivec2 t) {
+    return unpackUnorm4x8(tile[t.y * TILE_SIZE + t.x]);
+}
+#endif
+
+void main(void) {
+    ivec2 pixel = ivec2(gl_GlobalInvocationID.xy);
+    // the last row / column of workgroups hangs over the edge
+    bool inside = all(lessThan(pixel, imageSize(vOutput)));
+    vec2 uv;
+    bool covered = source_coordinate(vec2(pixel) + 0.5, uv) && inside;
+    vec4 color = vec4(0.0, 0.0, 0.0, 1.0);
+
+#if SHARED_TILE
+    ivec2 source_size = textureSize(vTexture, 0);
+    // bilinear footprint: texels base .. base + 1
+    vec2 p = uv * vec2(source_size) - 0.5;
+    ivec2 base = ivec2(floor(p));
+
+    if (gl_LocalInvocationIndex == 0) {
+        tile_min_x = tile_min_y = 1 << 30;
+        tile_max_x = tile_max_y = -(1 << 30);
+    }
+    memoryBarrierShared();
+    barrier();
+    if (covered) {
+        atomicMin(tile_min_x, base.x);
+        atomicMin(tile_min_y, base.y);
+        atomicMax(tile_max_x, base.x + 1);
+        atomicMax(tile_max_y, base.y + 1);
+    }
+    memoryBarrierShared();
+    barrier();
+
+    // the same for the whole workgroup
+    ivec2 origin = ivec2(tile_min_x, tile_min_y);
+    ivec2 extent = ivec2(tile_max_x, tile_max_y) - origin + 1;
+    bool tiled = tile_max_x >= tile_min_x && all(lessThanEqual(extent, ivec2(TILE_SIZE)));
+    if (tiled) {
+        for (int i = int(gl_LocalInvocationIndex); i < extent.x * extent.y; i += LOCAL_SIZE_X * LOCAL_SIZE_Y) {
+            ivec2 t = ivec2(i % extent.x, i / extent.x);
+            tile[t.y * TILE_SIZE + t.x] = packUnorm4x8(source_texel(origin + t, source_size));
+        }
+    }
+    memoryBarrierShared();
+    barrier();
+
+    if (covered) {
+        if (tiled) {
+            ivec2 t = base - origin;
+            vec2 f = p - vec2(base);
+            color = mix(mix(tile_texel(t), tile_texel(t + ivec2(1, 0)), f.x),
+                        mix(tile_texel(t + ivec2(0, 1)), tile_texel(t + ivec2(1, 1)), f.x), f.y);
+        }
+        else {
+            color = textureLod(vTexture, uv, 0.0);
+        }
+    }
+#else
+    if (covered) {
+        color = textureLod(vTexture, uv, 0.0);
+    }
+#endif
+
+    if (inside) {
+        imageStore(vOutput, pixel, color);
+    }
+}
+'''
+
+
+class FisheyeCompute:
+
+    def __init__(self, local_size=(16, 16), shared_tile=False, tile_size=None):
+        import glsl_py12
+
+        self.local_size = tuple(local_size)
+        self.shared_tile = shared_tile
+        # a workgroup's footprint at 1:1 plus the filter's extra texel, with room for some magnification error
+        self.tile_size = tile_size or 2 * max(self.local_size) + 2
+        defines = {
+            'LOCAL_SIZE_X': self.local_size[0],
+            'LOCAL_SIZE_Y': self.local_size[1],
+            'SHARED_TILE': int(shared_tile),
+            'TILE_SIZE': self.tile_size,
+        }
+        invocations = glGetIntegerv(GL_MAX_COMPUTE_WORK_GROUP_INVOCATIONS)
+        if self.local_size[0] * self.local_size[1] > invocations:
+            raise RuntimeError('workgroup %dx%d is over the %d invocation limit' % (*self.local_size, invocations))
+
+        self.program = program_cache.create_compute_program(compute_shader_text, defines)
+        self.shader = gl_program.Program(self.program)
+        glsl_py12.bind_params_block(self.program)
+
+    def dispatch(self, source, target):
+        ''' Warp texture source into target's texture (immutable RGBA8, width x height). '''
+        gl_state.use_program(self.program)
+        gl_state.bind_texture(GL_TEXTURE_2D, source, unit=GL_TEXTURE0)
+        self.shader.set_uniform('vTexture', 0)
+        glBindImageTexture(IMAGE_UNIT, target.texture, 0, GL_FALSE, 0, GL_WRITE_ONLY, GL_RGBA8)
+
+        x, y = self.local_size
+        glDispatchCompute((target.width + x - 1) // x, (target.height + y - 1) // y, 1)
+        # what reads the result next: sampling, blits / readback
+        glMemoryBarrier(GL_TEXTURE_FETCH_BARRIER_BIT | GL_FRAMEBUFFER_BARRIER_BIT | GL_TEXTURE_UPDATE_BARRIER_BIT)
+
+    def delete(self):
+        self.shader.delete()
+
+    def __str__(self):
+        return 'compute %dx%d%s' % (*self.local_size, ' tile %d' % self.tile_size if self.shared_tile else '')
+
+
+def read_texture(target):
+    gl_state.bind_texture(GL_TEXTURE_2D, target.texture, unit=GL_TEXTURE0)
+    glPixelStorei(GL_PACK_ALIGNMENT, 1)
+    data = glGetTexImage(GL_TEXTURE_2D, 0, GL_RGBA, GL_UNSIGNED_BYTE)
+    return np.frombuffer(data, dtype=np.uint8).reshape(target.height, target.width, 4)
+
+def benchmark(source_size, sizes, local_sizes, frames):
+    import glsl_py12
+    import postprocess
+    import texture_manager
+
+    context = headless.create_context(64, 64, version=(4, 3))
+    print('Renderer :', glGetString(GL_RENDERER).decode())
+
+    img = np.random.randint(0, 256, (source_size, source_size, 3), dtype=np.uint8)
+    source = texture_manager.create(img, wrap=GL_CLAMP_TO_BORDER)
+
+    fragment = postprocess.PassGraph()
+    undistort = fragment.add('undistort', glsl_py12.fragment_shader_text)
+    glsl_py12.init_params(undistort.program)
+
+    warps = []
+    for local_size in local_sizes:
+        for shared_tile in (False, True):
+            warps.append(FisheyeCompute(local_size, shared_tile))
+
+    print('%dx%d source, %d frames' % (source_size, source_size, frames))
+    print('%-8s %-24s %10s %10s %10s' % ('output', 'path', 'ms/frame', 'MP/s', 'max diff'))
+    for size in sizes:
+        glsl_py12.set_params(glsl_py12.DEFAULT_K, (size, size), (size / 2, size / 2))
+        target = postprocess.RenderTarget(size, size)
+        megapixels = size * size / 1e6
+
+        def draw_fragment():
+            fragment.run(source, (source_size, source_size), framebuffer=target.framebuffer, viewport=(0, 0, size, size))
+
+        paths = [('fragment', draw_fragment)] + [(str(warp), lambda warp=warp: warp.dispatch(source, target)) for warp in warps]
+        reference = None
+        for name, draw in paths:
+            draw()
+            glFinish()
+            start = time.perf_counter()
+            for _ in range(frames):
+                draw()
+                gl_state.end_frame()
+            glFinish()
+            elapsed = (time.perf_counter() - start) / frames
+
+            pixels = read_texture(target).astype(np.int16)
+            if reference is None:
+                reference = pixels
+            difference = int(np.abs(pixels - reference).max())
+            print('%-8s %-24s %10.3f %10.1f %10d' % ('%dx%d' % (size, size), name, elapsed * 1000, megapixels / elapsed, difference))
+
+        target.delete()
+
+    for warp in warps:
+        warp.delete()
+    fragment.delete()
+    gl_state.delete_texture(source)
+    context.destroy()
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Compute vs fragment fisheye warp across output sizes.')
+    parser.add_argument('--source', type=int, default=2048, help='source image is source x source')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[512, 1024, 2048, 4096], help='square output sizes')
+    parser.add_argument('--local-size', type=int, nargs=2, action='append', metavar=('X', 'Y'),
+                        help='workgroup size, repeatable (default 8 8, 16 16, 32 8)')
+    parser.add_argument('--frames', type=int, default=50)
+    args = parser.parse_args()
+
+    benchmark(args.source, args.sizes, args.local_size or [(8, 8), (16, 16), (32, 8)], args.frames)
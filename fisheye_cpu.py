@@ -0,0 +1,185 @@
+'''
+## Fisheye on the CPU
+
+NumPy version of the glsl_py12.py fragment shader. The r/theta/r_d mapping is
+evaluated over the whole output grid at once, turned into cv2.remap maps and
+cached, so each frame costs a single remap. Needs no OpenGL at all; cv2 is
+only imported by the functions that use it (glsl_py12.py imports S/DEFAULT_K
+from here).
+
+    python fisheye_cpu.py                 # throughput, CPU only
+    python fisheye_cpu.py --compare-gl    # check against the GL shader and compare throughput
+    python fisheye_cpu.py --compare-gl --k 0.5 0.1 0 0 --size 1024 900 --center 512 480    # glsl_py12's parameters
+'''
+
+import functools
+import time
+
+import numpy as np
+
+
+# same as the constants in glsl_py12.py's fragment shader
+DEFAULT_K = (1.0, 1.0, 1.0, 1.0)
+S = 1024
+
+
+def texture_coordinates(k, width, height, size=(S, S), center=None):
+    '''
+    Texture coordinates (u, v) sampled by each output pixel, in GL conventions:
+    rows are bottom-up and (0, 0) is the bottom-left corner of the texture.
+    Pixels outside the image circle are NaN. size (width, height) and center
+    (cx, cy, default size / 2) are the FisheyeParams vSize and vCenter.
+    '''
+    k1, k2, k3, k4 = k
+    size_x, size_y = size
+    cx, cy = center or (size_x / 2, size_y / 2)
+
+    # gl_FragCoord is the pixel centre
+    fx = np.arange(width, dtype=np.float64) + 0.5
+    fy = np.arange(height, dtype=np.float64) + 0.5
+    x, y = np.meshgrid((fx - cx) / size_x * 2.0, (fy - cy) / size_y * 2.0)
+
+    n = np.hypot(x, y)
+    inside = n <= 1
+    z = np.sqrt(np.clip(1.0 - n * n, 0.0, None))
+
+    r = np.arctan2(n, z)
+    theta = np.arctan2(y, x)
+
+    r2 = r * r
+    r4 = r2 * r2
+    r6 = r2 * r4
+    r8 = r4 * r4
+
+    r_d = r * (1 + k1 * r2 + k2 * r4 + k3 * r6 + k4 * r8)
+
+    u = (r_d * np.cos(theta) + 1.0) / 2.0
+    v = (r_d * np.sin(theta) + 1.0) / 2.0
+    u[~inside] = np.nan
+    v[~inside] = np.nan
+
+    return u, v
+
+@functools.lru_cache(maxsize=8)
+def remap_maps(k, width, height, src_width, src_height, size=(S, S), center=None, fixed_point=True):
+    ''' cv2.remap maps from output pixels (top-down) to source image pixels (top-down). '''
+    import cv2
+
+    u, v = texture_coordinates(k, width, height, size, center)
+
+    # texture v goes up, image rows go down (the shaders sample 1 - v of the top-down upload)
+    map_x = u * src_width - 0.5
+    map_y = (1.0 - v) * src_height - 0.5
+    map_x = np.flipud(map_x)
+    map_y = np.flipud(map_y)
+
+    # NaN (outside the circle) -> far outside the source, i.e. border colour
+    map_x = np.nan_to_num(map_x, nan=-1e6).astype(np.float32)
+    map_y = np.nan_to_num(map_y, nan=-1e6).astype(np.float32)
+
+    if fixed_point:
+        # 16-bit fixed point maps are about twice as fast to apply
+        return cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+    return map_x, map_y
+
+def warp(img, k=DEFAULT_K, width=S, height=S, size=(S, S), center=None, fixed_point=True):
+    ''' same parameters as glsl_py12.set_params '''
+    import cv2
+
+    src_height, src_width = img.shape[:2]
+    center = tuple(center) if center is not None else None
+    map1, map2 = remap_maps(tuple(k), width, height, src_width, src_height, tuple(size), center, fixed_point)
+    return cv2.remap(img, map1, map2, cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+
+
+def render_gl(img_path, k=DEFAULT_K, size=(S, S), center=None):
+    import cv2
+    import headless
+    import glsl_py12
+
+    context = headless.create_context(S, S)
+    glsl_py12.init_texture(img_path)
+    glsl_py12.init_shader()
+    glsl_py12.init_vao()
+    glsl_py12.init_params()
+    glsl_py12.set_params(k, size, center or (size[0] / 2, size[1] / 2))
+
+    glsl_py12.draw_frame()
+    rgba = context.read_pixels()
+    out = cv2.cvtColor(cv2.flip(rgba, 0), cv2.COLOR_RGBA2BGR)
+
+    return context, out
+
+def time_gl(context, frames):
+    ''' render-only and render+readback seconds per frame '''
+    import glsl_py12
+    from OpenGL.GL import glFinish
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        glsl_py12.draw_frame()
+    glFinish()
+    render_time = (time.perf_counter() - start) / frames
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        glsl_py12.draw_frame()
+        context.read_pixels()
+    readback_time = (time.perf_counter() - start) / frames
+
+    return render_time, readback_time
+
+def time_cpu(img, frames, fixed_point, **params):
+    warp(img, fixed_point=fixed_point, **params)  # build and cache the maps
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        warp(img, fixed_point=fixed_point, **params)
+    return (time.perf_counter() - start) / frames
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+    import cv2
+    parser = argparse.ArgumentParser(description='CPU fisheye throughput and comparison with the GL shader.')
+    parser.add_argument('--image', default='lena.png')
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--k', type=float, nargs=4, default=DEFAULT_K, metavar=('K1', 'K2', 'K3', 'K4'))
+    parser.add_argument('--size', type=float, nargs=2, default=(S, S), metavar=('W', 'H'), help='size the image circle is normalized by')
+    parser.add_argument('--center', type=float, nargs=2, default=None, metavar=('CX', 'CY'), help='principal point in pixels')
+    parser.add_argument('--compare-gl', action='store_true', help='render with glsl_py12.py headless and diff')
+    parser.add_argument('--tolerance', type=int, default=3, help='per-channel difference allowed against GL')
+    parser.add_argument('--max-outliers', type=float, default=0.001, help='fraction of pixels allowed above tolerance')
+    args = parser.parse_args()
+
+    img = cv2.imread(args.image, 1)
+    # as glsl_py12 takes them
+    params = {'k': tuple(args.k), 'size': tuple(args.size), 'center': tuple(args.center or (args.size[0] / 2, args.size[1] / 2))}
+
+    start = time.perf_counter()
+    remap_maps(params['k'], S, S, img.shape[1], img.shape[0], params['size'], params['center'])
+    print('Map build : %.1f ms' % ((time.perf_counter() - start) * 1000))
+
+    for fixed_point in (False, True):
+        t = time_cpu(img, args.frames, fixed_point, **params)
+        print('CPU remap (%s) : %.3f ms/frame, %.1f frames/sec' % (
+            'int16 maps' if fixed_point else 'float maps', t * 1000, 1 / t))
+
+    if args.compare_gl:
+        context, gl_out = render_gl(args.image, **params)
+
+        render_time, readback_time = time_gl(context, args.frames)
+        print('GL render : %.3f ms/frame, %.1f frames/sec' % (render_time * 1000, 1 / render_time))
+        print('GL render + readback : %.3f ms/frame, %.1f frames/sec' % (readback_time * 1000, 1 / readback_time))
+
+        cpu_out = warp(img, fixed_point=False, **params)
+        diff = np.abs(cpu_out.astype(np.int16) - gl_out.astype(np.int16)).max(axis=2)
+        outliers = np.count_nonzero(diff > args.tolerance) / diff.size
+        print('Diff against GL : max %d, mean %.3f, %.4f%% pixels above %d' % (
+            diff.max(), diff.mean(), outliers * 100, args.tolerance))
+
+        context.destroy()
+
+        if outliers > args.max_outliers:
+            print('CPU output does not match the GL shader')
+            sys.exit(1)
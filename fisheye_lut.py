@@ -0,0 +1,271 @@
+'''
+## Fisheye lookup table
+
+The glsl_py12.py mapping from output pixel to source texture coordinate only
+depends on k1..k4 and the output size, so it is baked once into an RG32F
+texture and the per-frame fragment shader becomes a single dependent fetch.
+The table is rendered on the GPU with the same math as the analytic shader,
+read back and cached on disk keyed by (k1..k4, width, height) plus the
+normalization size and principal point from the FisheyeParams block.
+
+    python glsl_py12.py --lut
+    python fisheye_lut.py        # benchmark against the analytic shader
+
+Cache directory: $FISHEYE_LUT_CACHE or ~/.cache/pyopengltest/fisheye_lut
+'''
+
+import ctypes
+import os
+import time
+
+if __name__ == '__main__':
+    import headless
+
+from OpenGL.GL import *
+from OpenGL.raw.GL.VERSION.GL_1_0 import glReadPixels as raw_glReadPixels
+import numpy as np
+
+from fisheye_cpu import DEFAULT_K
+from program_cache import create_program
+import gl_state
+
+
+LUT_TEXTURE_UNIT = 1
+
+cache_dir = os.environ.get(
+    'FISHEYE_LUT_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'pyopengltest', 'fisheye_lut'),
+)
+
+
+bake_vertex_shader_text = '''
+#version 410 core
+
+void main(void) {
+    // full-screen triangle, no vertex buffer needed
+    vec2 p = vec2((gl_VertexID << 1) & 2, gl_VertexID & 2);
+    gl_Position = vec4(p * 2.0 - 1.0, 0.0, 1.0);
+}
+'''
+
+bake_fragment_shader_text = '''
+#version 410 core
+
+const float PI = 3.141592653589793;
+
+uniform vec4 vK;
+uniform vec2 vSize;
+uniform vec2 vCenter;
+out vec2 flagCoord;
+
+float atan2(in float y, in float x) {
+    return x == 0.0 ? sign(y)*PI/2 : atan(y, x);
+}
+
+void main(void) {
+    float x = (gl_FragCoord.x - vCenter.x) / vSize.x * 2.0;
+    float y = (gl_FragCoord.y - vCenter.y) / vSize.y * 2.0;
+
+    float n = length(vec2(x, y));
+    if (n > 1) {
+        // outside the image circle: sample the (black) texture border
+        flagCoord = vec2(-1.0e4, -1.0e4);
+    }
+    else {
+        float z = sqrt(1.0 - n*n);
+
+        float r = atan2(n, z);
+        float theta = atan2(y, x);
+
+        float r2 = r*r;
+        float r4 = r2*r2;
+        float r6 = r2*r4;
+        float r8 = r4*r4;
+
+        float r_d = r * (1 + vK.x * r2 + vK.y * r4 + vK.z * r6 + vK.w * r8);
+
+        float x_d = r_d * cos(theta);
+        float y_d = r_d * sin(theta);
+
+        flagCoord = vec2((x_d + 1.0) / 2.0, (y_d + 1.0) / 2.0);
+    }
+}
+'''
+
+# drop-in replacement for glsl_py12.fragment_shader_text
+lut_fragment_shader_text = '''
+#version 410 core
+
+uniform sampler2D vTexture;
+uniform sampler2D vLut;
+in vec3 vFragmentPosition;
+out vec4 flagColor;
+
+void main(void) {
+    vec2 vTexCoord = texelFetch(vLut, ivec2(gl_FragCoord.xy), 0).rg;
+    // the image is uploaded top row first, as in glsl_py12
+    flagColor = texture(vTexture, vec2(vTexCoord.x, 1.0 - vTexCoord.y)).rgba;
+}
+'''
+
+
+def cache_path(k, width, height, size, center):
+    params = '_'.join(repr(float(v)) for v in (*k, *size, *center))
+    return os.path.join(cache_dir, 'lut_%dx%d_%s.npy' % (width, height, params))
+
+def bake_lut(k, width, height, size, center):
+    ''' Render the coordinate map on the GPU and read it back as (height, width, 2) float32. '''
+    previous_framebuffer = glGetIntegerv(GL_FRAMEBUFFER_BINDING)
+    previous_viewport = glGetIntegerv(GL_VIEWPORT)
+
+    framebuffer = glGenFramebuffers(1)
+    glBindFramebuffer(GL_FRAMEBUFFER, framebuffer)
+    renderbuffer = glGenRenderbuffers(1)
+    glBindRenderbuffer(GL_RENDERBUFFER, renderbuffer)
+    glRenderbufferStorage(GL_RENDERBUFFER, GL_RG32F, width, height)
+    glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_RENDERBUFFER, renderbuffer)
+    glBindRenderbuffer(GL_RENDERBUFFER, 0)
+    glViewport(0, 0, width, height)
+
+    program = create_program(bake_vertex_shader_text, bake_fragment_shader_text)
+    vao = glGenVertexArrays(1)
+
+    glUseProgram(program)
+    glUniform4f(glGetUniformLocation(program, 'vK'), *k)
+    glUniform2f(glGetUniformLocation(program, 'vSize'), *size)
+    glUniform2f(glGetUniformLocation(program, 'vCenter'), *center)
+    glBindVertexArray(vao)
+    glDrawArrays(GL_TRIANGLES, 0, 3)
+    glBindVertexArray(0)
+    glUseProgram(0)
+
+    glPixelStorei(GL_PACK_ALIGNMENT, 4)
+    # PyOpenGL cannot size an output array for GL_RG, so read into our own
+    lut = np.empty((height, width, 2), dtype=np.float32)
+    raw_glReadPixels(0, 0, width, height, GL_RG, GL_FLOAT, lut.ctypes.data_as(ctypes.c_void_p))
+
+    glDeleteVertexArrays(1, [vao])
+    glDeleteProgram(program)
+    glDeleteRenderbuffers(1, [renderbuffer])
+    glDeleteFramebuffers(1, [framebuffer])
+
+    glBindFramebuffer(GL_FRAMEBUFFER, previous_framebuffer)
+    glViewport(*previous_viewport)
+    gl_state.invalidate()
+
+    return lut
+
+def load_or_bake_lut(k, width, height, size=None, center=None):
+    size = size or (width, height)
+    center = center or (size[0] / 2, size[1] / 2)
+
+    path = cache_path(k, width, height, size, center)
+    if os.path.exists(path):
+        lut = np.load(path)
+        if lut.shape == (height, width, 2) and lut.dtype == np.float32:
+            return lut
+        print('Ignoring malformed LUT cache :', path)
+
+    lut = bake_lut(k, width, height, size, center)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    # write then rename so a concurrent reader never sees a partial file
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        np.save(f, lut)
+    os.replace(tmp_path, path)
+
+    return lut
+
+def create_lut_texture(lut):
+    height, width = lut.shape[:2]
+
+    texture = glGenTextures(1)
+    gl_state.bind_texture(GL_TEXTURE_2D, texture, unit=GL_TEXTURE0 + LUT_TEXTURE_UNIT)
+
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+
+    glPixelStorei(GL_UNPACK_ALIGNMENT, 4)
+    glTexImage2D(GL_TEXTURE_2D, 0, GL_RG32F, width, height, 0, GL_RG, GL_FLOAT, np.ascontiguousarray(lut))
+
+    gl_state.active_texture(GL_TEXTURE0)
+    return texture
+
+def init_lut(program, k, width, height, size=None, center=None):
+    ''' Load (or bake) the table and attach it to a program built from lut_fragment_shader_text. '''
+    texture = create_lut_texture(load_or_bake_lut(k, width, height, size, center))
+
+    glProgramUniform1i(program, glGetUniformLocation(program, 'vLut'), LUT_TEXTURE_UNIT)
+
+    return texture
+
+
+def time_frames(program, vao, frames):
+    gl_state.use_program(program)
+    gl_state.bind_vertex_array(vao)
+
+    # warm-up, also forces shader specialization on some drivers
+    glDrawArrays(GL_TRIANGLES, 0, 6)
+    glFinish()
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        glDrawArrays(GL_TRIANGLES, 0, 6)
+    glFinish()
+    elapsed = time.perf_counter() - start
+
+    return elapsed / frames
+
+def benchmark(sizes, frames):
+    import glsl_py12
+
+    context = headless.create_context(max(sizes), max(sizes))
+    glsl_py12.init_texture()
+    glsl_py12.init_shader()
+    glsl_py12.init_vao()
+    glsl_py12.init_params()
+    analytic_program = glsl_py12.program
+
+    print('%6s %14s %14s %12s %12s' % ('size', 'analytic ms', 'lut ms', 'bake ms', 'cached ms'))
+    for size in sizes:
+        framebuffer = headless.create_framebuffer(size, size, depth=False)
+
+        glsl_py12.set_params(DEFAULT_K, (size, size), (size / 2, size / 2))
+        glProgramUniform1i(analytic_program, glGetUniformLocation(analytic_program, 'vTexture'), 0)
+
+        path = cache_path(DEFAULT_K, size, size, (size, size), (size / 2, size / 2))
+        if os.path.exists(path):
+            os.remove(path)
+        t0 = time.perf_counter()
+        load_or_bake_lut(DEFAULT_K, size, size)
+        t1 = time.perf_counter()
+        load_or_bake_lut(DEFAULT_K, size, size)
+        t2 = time.perf_counter()
+
+        lut_program = create_program(glsl_py12.vertex_shader_text, lut_fragment_shader_text)
+        glProgramUniform1i(lut_program, glGetUniformLocation(lut_program, 'vTexture'), 0)
+        lut_texture = init_lut(lut_program, DEFAULT_K, size, size)
+
+        analytic_time = time_frames(analytic_program, glsl_py12.vertex_vao, frames)
+        lut_time = time_frames(lut_program, glsl_py12.vertex_vao, frames)
+
+        print('%6d %14.3f %14.3f %12.1f %12.1f' % (
+            size, analytic_time * 1000, lut_time * 1000, (t1 - t0) * 1000, (t2 - t1) * 1000))
+
+        gl_state.delete_texture(lut_texture)
+        gl_state.delete_program(lut_program)
+        headless.delete_framebuffer(*framebuffer)
+
+    context.destroy()
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Benchmark the LUT fisheye shader against the analytic one.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[512, 1024, 4096])
+    parser.add_argument('--frames', type=int, default=50)
+    args = parser.parse_args()
+
+    benchmark(args.sizes, args.frames)
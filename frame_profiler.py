@@ -0,0 +1,277 @@
+'''
+## Frame profiler
+
+CPU and GPU timings for the render loops. CPU sections (render, swap, poll)
+and the whole frame are timed with perf_counter; the render section is also
+wrapped in a GL_TIME_ELAPSED query. Queries come from a small ring and are
+only read back once GL_QUERY_RESULT_AVAILABLE says so, a frame or two later,
+so measuring never stalls the pipeline. When every query of the ring is still
+in flight that frame simply goes without a GPU time (counted as dropped).
+
+Each series keeps its last `window` samples; p50/p95/p99 and the histogram
+are taken over that window.
+
+    profiler = frame_profiler.FrameProfiler()
+    while not glfw.window_should_close(window):
+        with profiler.section('render', gpu=True):
+            render()
+        with profiler.section('swap'):
+            glfw.swap_buffers(window)
+        with profiler.section('poll'):
+            glfw.poll_events()
+        profiler.end_frame()
+    profiler.report()
+
+    frame_profiler.count_python_calls(render)    # gl* calls: gl_program.GLCallCounter
+
+    python glsl_py12.py --headless --profile
+    python glsl_py8_1.py --measure      # calls and CPU time per frame, pygame
+    python glsl_py9.py --profile-json frames.json --trace trace.json    # chrome://tracing, ui.perfetto.dev
+
+[Query Object - OpenGL Wiki (Timer queries)](https://www.khronos.org/opengl/wiki/Query_Object#Timer_queries)
+[Trace Event Format](https://docs.google.com/document/d/1CvAClvFfyA5R-PhYUmn5OOQtYMH4h6I0nSsKchNAySU)
+'''
+
+import collections
+import contextlib
+import ctypes
+import json
+import os
+import sys
+import time
+
+from OpenGL.GL import *
+from OpenGL.error import GLError
+from OpenGL.raw.GL.VERSION.GL_3_3 import glGetQueryObjectui64v as raw_glGetQueryObjectui64v
+import numpy as np
+
+
+# bucket edges in ms; the last bucket is open-ended
+HISTOGRAM_EDGES = (0.0, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.7, 33.3, 66.7, 133.3)
+
+CPU_TRACK = 1
+GPU_TRACK = 2
+
+
+def timer_query_supported():
+    ''' GL_TIME_ELAPSED is core in 3.3, earlier contexts need ARB_timer_query '''
+    version = (glGetString(GL_VERSION) or b'0.0').split()[0].split(b'.')
+    if (int(version[0]), int(version[1])) >= (3, 3):
+        return True
+    try:
+        return b'GL_ARB_timer_query' in (glGetString(GL_EXTENSIONS) or b'').split()
+    except GLError:
+        return False
+
+
+class FrameProfiler:
+
+    def __init__(self, window=600, queries=4, gpu=True, max_events=100000, json_path=None, trace_path=None):
+        self.window = window
+        self.series = collections.OrderedDict()
+        # (name, track, start, duration) in seconds, for the trace
+        self.events = collections.deque(maxlen=max_events)
+        self.json_path = json_path
+        self.trace_path = trace_path
+
+        self.start_time = time.perf_counter()
+        self.frame_start = None
+        self.frames = 0
+
+        self.gpu = gpu and timer_query_supported()
+        self.gpu_dropped = 0
+        self.gpu_invalid = 0
+        self.free_queries = []
+        self.pending = collections.deque()    # (query, name, cpu start), oldest first
+        if self.gpu:
+            self.free_queries = [int(q) for q in np.atleast_1d(glGenQueries(queries))]
+            self.queries = list(self.free_queries)
+        self._available = np.zeros(1, dtype=np.int32)
+        # PyOpenGL has no array type for GLuint64 results, so they go through ctypes
+        self._elapsed = ctypes.c_uint64()
+
+    def record(self, name, start, duration, track=CPU_TRACK):
+        if name not in self.series:
+            self.series[name] = collections.deque(maxlen=self.window)
+        self.series[name].append(duration)
+        self.events.append((name, track, start, duration))
+
+    @contextlib.contextmanager
+    def section(self, name, gpu=False):
+        start = time.perf_counter()
+        if self.frame_start is None:
+            self.frame_start = start
+
+        query = None
+        if gpu and self.gpu:
+            if self.free_queries:
+                query = self.free_queries.pop()
+                glBeginQuery(GL_TIME_ELAPSED, query)
+            else:
+                self.gpu_dropped += 1
+        try:
+            yield
+        finally:
+            if query is not None:
+                glEndQuery(GL_TIME_ELAPSED)
+                self.pending.append((query, 'gpu ' + name, start))
+            self.record(name, start, time.perf_counter() - start)
+
+    def end_frame(self):
+        now = time.perf_counter()
+        if self.frame_start is not None:
+            self.record('frame', self.frame_start, now - self.frame_start)
+        self.frame_start = now
+        self.frames += 1
+        self.collect()
+
+    def collect(self, wait=False):
+        ''' Read back finished GPU queries; only blocks with wait. '''
+        while self.pending:
+            query, name, start = self.pending[0]
+            if not wait:
+                # queries finish in submission order, so the oldest decides
+                glGetQueryObjectiv(query, GL_QUERY_RESULT_AVAILABLE, self._available)
+                if not self._available[0]:
+                    break
+            raw_glGetQueryObjectui64v(query, GL_QUERY_RESULT, ctypes.byref(self._elapsed))
+            self.pending.popleft()
+            self.free_queries.append(query)
+            elapsed = self._elapsed.value * 1e-9
+            # the GPU cannot have taken longer than the time since the section began; llvmpipe
+            # (Mesa 22) reports thousands of seconds for a query before anything was flushed
+            if elapsed > time.perf_counter() - start:
+                self.gpu_invalid += 1
+                continue
+            # placed at the CPU time it was issued; the GPU ran it somewhat later
+            self.record(name, start, elapsed, track=GPU_TRACK)
+
+    def stats(self):
+        ''' p50/p95/p99 etc. in ms over the last `window` samples of each series '''
+        stats = collections.OrderedDict()
+        for name, samples in self.series.items():
+            ms = np.array(samples) * 1000
+            counts, _ = np.histogram(ms, bins=HISTOGRAM_EDGES + (np.inf,))
+            p50, p95, p99 = np.percentile(ms, (50, 95, 99))
+            stats[name] = {
+                'count': len(ms),
+                'mean': float(ms.mean()),
+                'p50': float(p50),
+                'p95': float(p95),
+                'p99': float(p99),
+                'max': float(ms.max()),
+                'histogram': counts.tolist(),
+            }
+        return stats
+
+    def print_stats(self):
+        if not self.gpu:
+            print('GPU timer queries are not supported by this context')
+        for name, s in self.stats().items():
+            print('%-12s p50 %8.3f  p95 %8.3f  p99 %8.3f  max %8.3f ms (%d)' % (
+                name, s['p50'], s['p95'], s['p99'], s['max'], s['count']))
+        if self.gpu_dropped:
+            print('GPU timings dropped : %d (all queries in flight)' % self.gpu_dropped)
+        if self.gpu_invalid:
+            print('GPU timings discarded : %d (longer than the wall time since they began)' % self.gpu_invalid)
+
+    def write_json(self, path):
+        with open(path, 'w') as f:
+            json.dump({
+                'frames': self.frames,
+                'window': self.window,
+                'gpu_timer_queries': self.gpu,
+                'gpu_dropped': self.gpu_dropped,
+                'gpu_invalid': self.gpu_invalid,
+                'histogram_edges_ms': HISTOGRAM_EDGES,
+                'series': self.stats(),
+            }, f, indent=2)
+
+    def write_trace(self, path):
+        ''' Chrome trace event format, complete ('X') events in microseconds '''
+        pid = os.getpid()
+        events = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': CPU_TRACK, 'args': {'name': 'CPU'}},
+            {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': GPU_TRACK, 'args': {'name': 'GPU (time elapsed)'}},
+        ]
+        for name, track, start, duration in self.events:
+            events.append({
+                'name': name,
+                'ph': 'X',
+                'pid': pid,
+                'tid': track,
+                'ts': (start - self.start_time) * 1e6,
+                'dur': duration * 1e6,
+            })
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+    def report(self, wait=True):
+        '''
+        Print and write whatever was asked for, and return the stats; wait=False
+        once the context may be gone.
+        '''
+        if wait:
+            self.collect(wait=True)
+        self.print_stats()
+        if self.json_path:
+            self.write_json(self.json_path)
+        if self.trace_path:
+            self.write_trace(self.trace_path)
+        return self.stats()
+
+    def delete(self):
+        if self.gpu:
+            glDeleteQueries(len(self.queries), self.queries)
+            self.gpu = False
+
+
+class NullProfiler:
+    ''' Stand-in when profiling is off, so loops need no branches. '''
+
+    def section(self, name, gpu=False):
+        return contextlib.nullcontext()
+
+    def end_frame(self):
+        pass
+
+    def report(self, wait=True):
+        return collections.OrderedDict()
+
+    def delete(self):
+        pass
+
+
+def count_python_calls(function, *args):
+    ''' Python and builtin function calls made while running function(*args), PyOpenGL's wrappers included. '''
+    calls = [0]
+    def profile(frame, event, arg):
+        if event in ('call', 'c_call'):
+            calls[0] += 1
+    sys.setprofile(profile)
+    try:
+        function(*args)
+    finally:
+        sys.setprofile(None)
+    # the call of function itself, and of setprofile on the way out
+    return calls[0] - 2
+
+
+def add_arguments(parser):
+    parser.add_argument('--profile', action='store_true', help='print CPU/GPU frame time percentiles on exit')
+    parser.add_argument('--profile-json', metavar='PATH', help='write frame time percentiles and histograms')
+    parser.add_argument('--trace', metavar='PATH', help='write a Chrome trace (chrome://tracing, ui.perfetto.dev)')
+
+def parse_known_args():
+    ''' For scripts without their own argument parser. '''
+    import argparse
+    parser = argparse.ArgumentParser(add_help=False)
+    add_arguments(parser)
+    args, _ = parser.parse_known_args()
+    return args
+
+def from_args(args):
+    ''' FrameProfiler if any profiling option was given, else NullProfiler. Needs a current context. '''
+    if args is None or not (args.profile or args.profile_json or args.trace):
+        return NullProfiler()
+    return FrameProfiler(json_path=args.profile_json, trace_path=args.trace)
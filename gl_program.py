@@ -0,0 +1,296 @@
+'''
+## Program wrapper
+
+Introspects a linked program once (glGetActiveUniform / glGetActiveAttrib),
+keeps the uniform and attribute locations and types, and only issues
+glProgramUniform* when a value actually changes. The per-frame
+glGetUniformLocation + glUniform round trip in the render loops becomes a
+dictionary lookup and a comparison.
+
+    shader = gl_program.Program(program)
+    shader.set_uniform('vTexture', 0)    # no GL call if it is already 0
+    shader.set_uniform('vWeights', (0.25, 0.5, 0.25))    # float vWeights[3]: one glProgramUniform1fv
+
+    python gl_program.py    # per-frame GL call counts before/after
+'''
+
+import collections
+import time
+
+if __name__ == '__main__':
+    import headless
+
+from OpenGL.GL import *
+import numpy as np
+
+import gl_state
+
+
+Uniform = collections.namedtuple('Uniform', ['location', 'size', 'type'])
+Attribute = collections.namedtuple('Attribute', ['location', 'size', 'type'])
+
+# sampler and image uniforms hold a texture / image unit, set with glProgramUniform1i
+_DIMENSIONS = ('1D', '2D', '3D', 'CUBE', '1D_ARRAY', '2D_ARRAY', '2D_MULTISAMPLE', '2D_MULTISAMPLE_ARRAY',
+               'BUFFER', '2D_RECT', 'CUBE_MAP_ARRAY')
+SAMPLER_TYPES = {globals()['GL_%sSAMPLER_%s' % (prefix, d)] for prefix in ('', 'INT_', 'UNSIGNED_INT_') for d in _DIMENSIONS} | {
+    GL_SAMPLER_1D_SHADOW, GL_SAMPLER_2D_SHADOW, GL_SAMPLER_CUBE_SHADOW,
+    GL_SAMPLER_1D_ARRAY_SHADOW, GL_SAMPLER_2D_ARRAY_SHADOW,
+    GL_SAMPLER_2D_RECT_SHADOW, GL_SAMPLER_CUBE_MAP_ARRAY_SHADOW,
+}
+IMAGE_TYPES = {globals()['GL_%sIMAGE_%s' % (prefix, d)] for prefix in ('', 'INT_', 'UNSIGNED_INT_') for d in _DIMENSIONS}
+
+# (setter, number of components, Python type of the arguments) for glProgramUniform*
+UNIFORM_SETTERS = {
+    GL_FLOAT: (glProgramUniform1f, 1, float),
+    GL_FLOAT_VEC2: (glProgramUniform2f, 2, float),
+    GL_FLOAT_VEC3: (glProgramUniform3f, 3, float),
+    GL_FLOAT_VEC4: (glProgramUniform4f, 4, float),
+    GL_DOUBLE: (glProgramUniform1d, 1, float),
+    GL_DOUBLE_VEC2: (glProgramUniform2d, 2, float),
+    GL_DOUBLE_VEC3: (glProgramUniform3d, 3, float),
+    GL_DOUBLE_VEC4: (glProgramUniform4d, 4, float),
+    GL_INT: (glProgramUniform1i, 1, int),
+    GL_INT_VEC2: (glProgramUniform2i, 2, int),
+    GL_INT_VEC3: (glProgramUniform3i, 3, int),
+    GL_INT_VEC4: (glProgramUniform4i, 4, int),
+    GL_UNSIGNED_INT: (glProgramUniform1ui, 1, int),
+    GL_UNSIGNED_INT_VEC2: (glProgramUniform2ui, 2, int),
+    GL_UNSIGNED_INT_VEC3: (glProgramUniform3ui, 3, int),
+    GL_UNSIGNED_INT_VEC4: (glProgramUniform4ui, 4, int),
+    GL_BOOL: (glProgramUniform1i, 1, int),
+    GL_BOOL_VEC2: (glProgramUniform2i, 2, int),
+    GL_BOOL_VEC3: (glProgramUniform3i, 3, int),
+    GL_BOOL_VEC4: (glProgramUniform4i, 4, int),
+}
+
+# (setter, element type) for array uniforms (size > 1), all elements in one call
+ARRAY_SETTERS = {
+    GL_FLOAT: (glProgramUniform1fv, np.float32),
+    GL_FLOAT_VEC2: (glProgramUniform2fv, np.float32),
+    GL_FLOAT_VEC3: (glProgramUniform3fv, np.float32),
+    GL_FLOAT_VEC4: (glProgramUniform4fv, np.float32),
+    GL_DOUBLE: (glProgramUniform1dv, np.float64),
+    GL_DOUBLE_VEC2: (glProgramUniform2dv, np.float64),
+    GL_DOUBLE_VEC3: (glProgramUniform3dv, np.float64),
+    GL_DOUBLE_VEC4: (glProgramUniform4dv, np.float64),
+    GL_INT: (glProgramUniform1iv, np.int32),
+    GL_INT_VEC2: (glProgramUniform2iv, np.int32),
+    GL_INT_VEC3: (glProgramUniform3iv, np.int32),
+    GL_INT_VEC4: (glProgramUniform4iv, np.int32),
+    GL_UNSIGNED_INT: (glProgramUniform1uiv, np.uint32),
+    GL_UNSIGNED_INT_VEC2: (glProgramUniform2uiv, np.uint32),
+    GL_UNSIGNED_INT_VEC3: (glProgramUniform3uiv, np.uint32),
+    GL_UNSIGNED_INT_VEC4: (glProgramUniform4uiv, np.uint32),
+    GL_BOOL: (glProgramUniform1iv, np.int32),
+    GL_BOOL_VEC2: (glProgramUniform2iv, np.int32),
+    GL_BOOL_VEC3: (glProgramUniform3iv, np.int32),
+    GL_BOOL_VEC4: (glProgramUniform4iv, np.int32),
+}
+
+MATRIX_SETTERS = {
+    GL_FLOAT_MAT2: glProgramUniformMatrix2fv,
+    GL_FLOAT_MAT3: glProgramUniformMatrix3fv,
+    GL_FLOAT_MAT4: glProgramUniformMatrix4fv,
+    GL_FLOAT_MAT2x3: glProgramUniformMatrix2x3fv,
+    GL_FLOAT_MAT2x4: glProgramUniformMatrix2x4fv,
+    GL_FLOAT_MAT3x2: glProgramUniformMatrix3x2fv,
+    GL_FLOAT_MAT3x4: glProgramUniformMatrix3x4fv,
+    GL_FLOAT_MAT4x2: glProgramUniformMatrix4x2fv,
+    GL_FLOAT_MAT4x3: glProgramUniformMatrix4x3fv,
+    GL_DOUBLE_MAT2: glProgramUniformMatrix2dv,
+    GL_DOUBLE_MAT3: glProgramUniformMatrix3dv,
+    GL_DOUBLE_MAT4: glProgramUniformMatrix4dv,
+}
+
+
+def _name(raw):
+    name = raw.decode('utf-8') if isinstance(raw, bytes) else str(raw)
+    # arrays are reported as 'name[0]'
+    return name[:-3] if name.endswith('[0]') else name
+
+
+class Program:
+    ''' A linked GL program with cached locations and dirty-checked uniforms. '''
+
+    def __init__(self, program):
+        self.program = program
+        self.uniforms = {}
+        self.attributes = {}
+        self.values = {}
+
+        # GL calls issued and skipped by set_uniform
+        self.uniform_calls = 0
+        self.uniform_skips = 0
+
+        for index in range(glGetProgramiv(program, GL_ACTIVE_UNIFORMS)):
+            raw_name, size, uniform_type = glGetActiveUniform(program, index)
+            name = _name(raw_name)
+            location = glGetUniformLocation(program, name)
+            # location -1: member of a uniform block, set through its buffer
+            if location != -1:
+                self.uniforms[name] = Uniform(location, int(size), int(uniform_type))
+
+        for index in range(glGetProgramiv(program, GL_ACTIVE_ATTRIBUTES)):
+            raw_name, size, attribute_type = glGetActiveAttrib(program, index)
+            name = _name(raw_name)
+            self.attributes[name] = Attribute(glGetAttribLocation(program, name), int(size), int(attribute_type))
+
+    def use(self):
+        gl_state.use_program(self.program)
+
+    def uniform_location(self, name):
+        uniform = self.uniforms.get(name)
+        return uniform.location if uniform else -1
+
+    def attribute_location(self, name):
+        attribute = self.attributes.get(name)
+        return attribute.location if attribute else -1
+
+    def set_uniform(self, name, value):
+        '''
+        Set a uniform (scalar, tuple or matrix; an array takes all its
+        elements, flat or nested); returns False when it was already that value.
+        '''
+        uniform = self.uniforms.get(name)
+        if uniform is None:
+            # optimized out by the compiler, same as a -1 location
+            return False
+        # samplers and images are set like an int
+        unit = uniform.type in SAMPLER_TYPES or uniform.type in IMAGE_TYPES
+        uniform_type = GL_INT if unit else uniform.type
+        if uniform_type not in MATRIX_SETTERS and uniform_type not in UNIFORM_SETTERS:
+            raise RuntimeError('uniform %r has a type set_uniform does not support (0x%x)' % (name, uniform.type))
+
+        key = tuple(float(v) for v in _flatten(value)) if hasattr(value, '__len__') else value
+        array = uniform.size > 1 and uniform_type not in MATRIX_SETTERS
+        if array:
+            count = uniform.size * UNIFORM_SETTERS[uniform_type][1]
+            if not hasattr(value, '__len__') or len(key) != count:
+                raise RuntimeError('uniform %r is an array of %d, set all of its %d values at once' % (name, uniform.size, count))
+        if self.values.get(name) == key:
+            self.uniform_skips += 1
+            return False
+        self.values[name] = key
+
+        if array:
+            setter, dtype = ARRAY_SETTERS[uniform_type]
+            setter(self.program, uniform.location, uniform.size, np.array(key, dtype=dtype))
+        elif uniform.type in MATRIX_SETTERS:
+            # an array of matrices is uniform.size of them back to back
+            MATRIX_SETTERS[uniform.type](self.program, uniform.location, uniform.size, GL_TRUE, key)
+        else:
+            setter, components, kind = UNIFORM_SETTERS[uniform_type]
+            args = (value,) if components == 1 else key
+            setter(self.program, uniform.location, *(kind(v) for v in args))
+
+        self.uniform_calls += 1
+        return True
+
+    def forget_values(self):
+        ''' Call after the program was relinked or its uniforms changed behind our back. '''
+        self.values.clear()
+
+    def delete(self):
+        gl_state.delete_program(self.program)
+        self.program = 0
+
+
+def _flatten(value):
+    for v in value:
+        if hasattr(v, '__len__'):
+            yield from _flatten(v)
+        else:
+            yield v
+
+
+class GLCallCounter:
+    '''
+    Counts gl* calls made through the given modules' globals (or attributes
+    of objects such as vbo.get_implementation()), e.g.
+
+        with GLCallCounter(glsl_py12, gl_state) as counter:
+            glsl_py12.render()
+        counter.total, counter.counts    # Counter of gl* names
+
+    The wrappers cost time of their own, so take CPU times outside of this.
+    '''
+
+    def __init__(self, *modules):
+        self.modules = modules
+        self.counts = collections.Counter()
+        self._saved = []
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def _wrap(self, name, function):
+        counts = self.counts
+        def counted(*args, **kwargs):
+            counts[name] += 1
+            return function(*args, **kwargs)
+        return counted
+
+    def __enter__(self):
+        for module in self.modules:
+            for name, value in list(vars(module).items()):
+                if name.startswith('gl') and callable(value):
+                    self._saved.append((module, name, value))
+                    setattr(module, name, self._wrap(name, value))
+        return self
+
+    def __exit__(self, *exc):
+        for module, name, value in reversed(self._saved):
+            setattr(module, name, value)
+        self._saved = []
+
+
+def benchmark(frames):
+    import sys
+    import gl_program
+    import glsl_py12
+
+    context = headless.create_context(glsl_py12.S, glsl_py12.S)
+    glsl_py12.init_texture()
+    glsl_py12.init_shader()
+    glsl_py12.init_vao()
+    glsl_py12.init_params()
+
+    program = glsl_py12.program
+
+    def render_before():
+        # glsl_py12.render() as it was: location lookup + upload every frame
+        glUseProgram(program)
+        glUniform1i(glGetUniformLocation(program, 'vTexture'), 0)
+        glBindVertexArray(glsl_py12.vertex_vao)
+        glDrawArrays(GL_TRIANGLES, 0, 6)
+        glBindVertexArray(0)
+
+    # run as a script this file is __main__, glsl_py12 uses the imported copy
+    modules = {sys.modules[__name__], gl_program, glsl_py12}
+    for label, render in (('before', render_before), ('after', glsl_py12.render)):
+        gl_state.invalidate()
+        render()
+        glFinish()
+
+        with GLCallCounter(*modules) as counter:
+            render()
+
+        start = time.perf_counter()
+        for _ in range(frames):
+            render()
+        glFinish()
+        elapsed = (time.perf_counter() - start) / frames
+
+        print('%-6s : %d GL calls/frame %s, %.1f us/frame' % (
+            label, counter.total, dict(counter.counts), elapsed * 1e6))
+
+    context.destroy()
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='GL calls per frame with and without the Program wrapper.')
+    parser.add_argument('--frames', type=int, default=1000)
+    args = parser.parse_args()
+
+    benchmark(args.frames)
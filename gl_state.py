@@ -0,0 +1,193 @@
+'''
+## GL state tracker
+
+Shadow copy of the bind state the render loops touch every frame: current
+program, vertex array, active texture unit, textures per unit, buffers per
+target, texture parameters and clear colour. A call that would not change
+the state is skipped and counted, so loops can simply bind what they need
+without the unbind-to-0 dance.
+
+Everything that binds these objects directly (without going through this
+module) must call invalidate() afterwards, otherwise the shadow state is
+stale. The same goes for deleting them: GL hands a deleted name out again,
+so textures, buffers, vertex arrays and programs are deleted through
+delete_texture() and friends. The element array binding belongs to the vertex array object and
+is tracked per VAO.
+
+    gl_state.use_program(program)
+    gl_state.bind_vertex_array(vao)
+    glDrawArrays(GL_TRIANGLES, 0, 6)
+    gl_state.end_frame()
+    ...
+    gl_state.print_stats()
+'''
+
+from OpenGL.GL import *
+
+
+class GLState:
+
+    def __init__(self):
+        self.invalidate()
+
+        self.issued = 0
+        self.elided = 0
+        self.frames = 0
+        self.frame_issued = 0
+        self.frame_elided = 0
+        self.last_frame = (0, 0)
+
+    def invalidate(self):
+        ''' Forget everything; the next call of each kind is always issued. '''
+        self.program = None
+        self.vertex_array = None
+        self.active_unit = None
+        self.textures = {}          # (unit, target) -> texture
+        self.buffers = {}           # target -> buffer
+        self.element_buffers = {}   # vertex array -> element array buffer
+        self.tex_parameters = {}    # (texture, target, pname) -> value
+        self.clear_color_value = None
+
+    def _issue(self):
+        self.issued += 1
+        self.frame_issued += 1
+
+    def _elide(self):
+        self.elided += 1
+        self.frame_elided += 1
+        return False
+
+    def use_program(self, program):
+        if self.program == program:
+            return self._elide()
+        glUseProgram(program)
+        self.program = program
+        self._issue()
+        return True
+
+    def bind_vertex_array(self, vertex_array):
+        if self.vertex_array == vertex_array:
+            return self._elide()
+        glBindVertexArray(vertex_array)
+        self.vertex_array = vertex_array
+        self._issue()
+        return True
+
+    def active_texture(self, unit):
+        ''' unit is GL_TEXTURE0 + n '''
+        if self.active_unit == unit:
+            return self._elide()
+        glActiveTexture(unit)
+        self.active_unit = unit
+        self._issue()
+        return True
+
+    def bind_texture(self, target, texture, unit=None):
+        if unit is not None:
+            self.active_texture(unit)
+        key = (self.active_unit, target)
+        if self.active_unit is not None and self.textures.get(key) == texture:
+            return self._elide()
+        glBindTexture(target, texture)
+        self.textures[key] = texture
+        self._issue()
+        return True
+
+    def tex_parameter(self, target, pname, value):
+        ''' glTexParameter on the texture bound to target on the active unit '''
+        texture = self.textures.get((self.active_unit, target))
+        key = (texture, target, pname)
+        if texture is not None and self.tex_parameters.get(key) == value:
+            return self._elide()
+        if isinstance(value, float):
+            glTexParameterf(target, pname, value)
+        else:
+            glTexParameteri(target, pname, value)
+        if texture is not None:
+            self.tex_parameters[key] = value
+        self._issue()
+        return True
+
+    def bind_buffer(self, target, buffer):
+        if target == GL_ELEMENT_ARRAY_BUFFER:
+            if self.vertex_array is not None and self.element_buffers.get(self.vertex_array) == buffer:
+                return self._elide()
+            glBindBuffer(target, buffer)
+            if self.vertex_array is not None:
+                self.element_buffers[self.vertex_array] = buffer
+        else:
+            if self.buffers.get(target) == buffer:
+                return self._elide()
+            glBindBuffer(target, buffer)
+            self.buffers[target] = buffer
+        self._issue()
+        return True
+
+    def clear_color(self, r, g, b, a):
+        value = (r, g, b, a)
+        if self.clear_color_value == value:
+            return self._elide()
+        glClearColor(r, g, b, a)
+        self.clear_color_value = value
+        self._issue()
+        return True
+
+    def delete_texture(self, *textures):
+        ''' glDeleteTextures; GL unbinds them and reuses their names, so forget them too '''
+        glDeleteTextures(list(textures))
+        for key, texture in self.textures.items():
+            if texture in textures:
+                self.textures[key] = 0
+        self.tex_parameters = {key: value for key, value in self.tex_parameters.items() if key[0] not in textures}
+
+    def delete_buffer(self, *buffers):
+        glDeleteBuffers(len(buffers), list(buffers))
+        for target, buffer in self.buffers.items():
+            if buffer in buffers:
+                self.buffers[target] = 0
+        # only the bound vertex array drops its reference; others are asked again
+        self.element_buffers = {vertex_array: buffer for vertex_array, buffer in self.element_buffers.items()
+                                if buffer not in buffers}
+
+    def delete_vertex_array(self, vertex_array):
+        glDeleteVertexArrays(1, [vertex_array])
+        if self.vertex_array == vertex_array:
+            self.vertex_array = 0
+        self.element_buffers.pop(vertex_array, None)
+
+    def delete_program(self, program):
+        glDeleteProgram(program)
+        # still current until something else is used: issue the next use_program either way
+        if self.program == program:
+            self.program = None
+
+    def end_frame(self):
+        self.frames += 1
+        self.last_frame = (self.frame_issued, self.frame_elided)
+        self.frame_issued = 0
+        self.frame_elided = 0
+
+    def print_stats(self):
+        if not self.frames:
+            return
+        print('State calls : %.1f issued, %.1f elided per frame (%d frames)' % (
+            self.issued / self.frames, self.elided / self.frames, self.frames))
+
+
+# one GL context per process in these demos
+state = GLState()
+
+invalidate = state.invalidate
+use_program = state.use_program
+bind_vertex_array = state.bind_vertex_array
+active_texture = state.active_texture
+bind_texture = state.bind_texture
+tex_parameter = state.tex_parameter
+bind_buffer = state.bind_buffer
+clear_color = state.clear_color
+delete_texture = state.delete_texture
+delete_buffer = state.delete_buffer
+delete_vertex_array = state.delete_vertex_array
+delete_program = state.delete_program
+end_frame = state.end_frame
+print_stats = state.print_stats
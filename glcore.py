@@ -0,0 +1,339 @@
+'''
+## Render core
+
+Context, program, vertex array, texture and main-loop helpers shared by the
+demo scripts (glsl_py1, glsl_py4-13), which used to carry their own copy of
+init_context / init_shader / init_vao.
+
+Heavy modules are imported only when a feature needs them: glfw when a
+window is created, headless (EGL/OSMesa) with --headless, cv2 when an image
+has to be decoded (decoded images are cached, see image_cache.py), and
+image_cache / texture_manager when the scene loads an image. Import this
+module before OpenGL.GL so --headless can select the platform.
+
+Every script prints its startup phases on exit:
+
+    Imports : 85.2 ms
+    Context : 40.1 ms
+    ...
+    Time to first frame : 190.4 ms
+
+    python glsl_py12.py --headless --frames 100
+    python -X importtime glsl_py9.py --headless --frames 1    # per-module import cost
+    python startup_bench.py                                   # all scripts, repeated, JSON/CSV
+
+With $GLCORE_PHASE_FILE set the phases are also written there as JSON.
+--profile, --profile-json and --trace add per-frame CPU/GPU timings (see
+frame_profiler.py).
+'''
+
+import os
+import sys
+import time
+
+start_time = time.perf_counter()
+start_wall_time = time.time()
+
+headless_mode = '--headless' in sys.argv
+if headless_mode:
+    # has to happen before OpenGL.GL is imported
+    import headless
+
+from OpenGL.GL import (
+    glGetString, glClear,
+    glGenVertexArrays, glGenBuffers, glBufferData, glEnableVertexAttribArray, glVertexAttribPointer,
+    GL_VENDOR, GL_RENDERER, GL_VERSION,
+    GL_COLOR_BUFFER_BIT, GL_DEPTH_BUFFER_BIT,
+    GL_ARRAY_BUFFER, GL_ELEMENT_ARRAY_BUFFER, GL_STATIC_DRAW, GL_FLOAT,
+    GL_TEXTURE0, GL_LINEAR,
+)
+import numpy as np
+
+import frame_profiler
+import gl_state
+import program_cache
+
+
+# seconds since start_time at the end of each startup phase, in order
+phase_times = {}
+
+window = None
+context = None
+# video_texture.VideoTexture when --video is given, see open_video
+video = None
+# parsed command line, see parse_args
+options = None
+
+
+def mark(phase):
+    phase_times[phase] = time.perf_counter() - start_time
+
+def parse_args(parser=None, readback=False, video=False):
+    '''
+    Adds --headless/--frames and the profiling options to the script's own
+    parser (if any) and parses. readback adds --readback/--capture for scenes
+    whose output is worth reading back, video adds --video/--video-size for
+    scenes that sample an image.
+    '''
+    import argparse
+    parser = parser or argparse.ArgumentParser()
+    parser.add_argument('--headless', action='store_true', help='render offscreen without a window')
+    parser.add_argument('--frames', type=int, default=100, help='number of frames to render in headless mode')
+    frame_profiler.add_arguments(parser)
+    if readback:
+        parser.add_argument('--readback', type=int, default=0, metavar='N', help='read every frame back through an N-deep PBO ring')
+        parser.add_argument('--capture', metavar='DIR', help='write the frames read back as PNG files')
+    if video:
+        parser.add_argument('--video', metavar='SOURCE', help="stream frames into the texture: camera index, video file, frame directory or 'synthetic'")
+        parser.add_argument('--video-size', type=int, nargs=2, default=(1920, 1080), metavar=('W', 'H'), help='size of synthetic frames')
+
+    global options
+    options = parser.parse_args()
+    return options
+
+def init_context(width, height, title, headless_size=None, forward_compat=True):
+    ''' Window (glfw, GL 4.1 core) or, with --headless, a surfaceless offscreen context. '''
+    mark('imports')
+    print('Initializing context..')
+
+    global window, context
+    if headless_mode:
+        context = headless.HeadlessContext(*(headless_size or (width, height)))
+    else:
+        global glfw
+        import glfw
+
+        glfw.init()
+
+        glfw.window_hint(glfw.CONTEXT_VERSION_MAJOR, 4)
+        glfw.window_hint(glfw.CONTEXT_VERSION_MINOR, 1)
+        glfw.window_hint(glfw.OPENGL_FORWARD_COMPAT, forward_compat)
+        glfw.window_hint(glfw.OPENGL_PROFILE, glfw.OPENGL_CORE_PROFILE)
+
+        window = glfw.create_window(width, height, title, None, None)
+        glfw.make_context_current(window)
+
+    print('Vendor :', glGetString(GL_VENDOR))
+    print('GPU :', glGetString(GL_RENDERER))
+    print('OpenGL version :', glGetString(GL_VERSION))
+    mark('context')
+
+def create_program(vertex_shader_text, fragment_shader_text):
+    ''' Compiled (or cache-restored) program; exits with the info log on failure. '''
+    print('Initializing shader..')
+    try:
+        program = program_cache.create_program(vertex_shader_text, fragment_shader_text)
+    except RuntimeError as e:
+        print('Shader program is not OK')
+        print(e)
+        sys.exit(1)
+    print('Shader program is OK')
+    mark('shader')
+    return program
+
+def create_vao(*attributes, indices=None):
+    '''
+    Vertex array with one float buffer per attribute location 0, 1, ...
+    Each attribute is (data, components). Returns (vao, buffers); the element
+    buffer, if any, is last.
+    '''
+    print('Initializing vao..')
+
+    vao = glGenVertexArrays(1)
+    gl_state.bind_vertex_array(vao)
+
+    buffers = []
+    for location, (data, components) in enumerate(attributes):
+        data = np.ascontiguousarray(data, dtype=np.float32)
+        vbo = glGenBuffers(1)
+        gl_state.bind_buffer(GL_ARRAY_BUFFER, vbo)
+        glBufferData(GL_ARRAY_BUFFER, data.nbytes, data, GL_STATIC_DRAW)
+        glEnableVertexAttribArray(location)
+        glVertexAttribPointer(location, components, GL_FLOAT, False, 0, None)
+        buffers.append(vbo)
+
+    if indices is not None:
+        ebo = glGenBuffers(1)
+        gl_state.bind_buffer(GL_ELEMENT_ARRAY_BUFFER, ebo)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, GL_STATIC_DRAW)
+        buffers.append(ebo)
+
+    gl_state.bind_vertex_array(0)
+    mark('vao')
+    return vao, buffers
+
+def load_image(path):
+    '''
+    The image as cv2 decodes it (BGR, top row first) and (width, height). It is
+    uploaded as is; scenes that want it upright flip v in their texcoords.
+    '''
+    import image_cache
+
+    img = image_cache.imread(path)
+    if img is None:
+        raise RuntimeError('cannot read image %r' % path)
+
+    height, width = img.shape[:2]
+    mark('image decode')
+    return img, width, height
+
+def create_texture(img, mipmaps=False, min_filter=None, mag_filter=GL_LINEAR, wrap=None, unit=GL_TEXTURE0):
+    ''' RGBA8 texture bound to unit, see texture_manager.create. '''
+    import texture_manager
+
+    print('Initializing texture..')
+    texture = texture_manager.create(img, mipmaps, min_filter, mag_filter, wrap, unit)
+    mark('texture upload')
+    return texture
+
+def open_video(wrap=None, unit=GL_TEXTURE0):
+    ''' Streaming texture for --video, rows top-down like load_image, or None without it. Returns (texture, width, height). '''
+    if not getattr(options, 'video', None):
+        return None
+    import video_texture
+
+    global video
+    video = video_texture.VideoTexture(options.video, size=tuple(options.video_size), flip=False, wrap=wrap, unit=unit)
+    mark('texture upload')
+    return video.texture, video.width, video.height
+
+def clear():
+    gl_state.clear_color(0, 0, 0, 1)
+    glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+
+def run(render, frames=100):
+    ''' Main loop until the window closes (or for `frames` frames headless), then report and tear down. '''
+    profiler = frame_profiler.from_args(options)
+
+    readback = None
+    if getattr(options, 'readback', 0):
+        import pbo_readback
+        readback = pbo_readback.PixelReadback(*framebuffer_size(), depth=options.readback)
+
+    print('Start rendering..')
+
+    frame_times = []
+    while True:
+        if headless_mode:
+            if len(frame_times) >= frames:
+                break
+        elif glfw.window_should_close(window):
+            break
+
+        frame_start = time.perf_counter()
+
+        if video:
+            with profiler.section('upload'):
+                video.next_frame()
+        with profiler.section('render', gpu=True):
+            clear()
+            render()
+        if readback:
+            with profiler.section('readback'):
+                frame = readback.read()
+            if frame is not None:
+                capture(frame, readback.frames - 1)
+        with profiler.section('swap'):
+            if headless_mode:
+                context.present()
+            else:
+                glfw.swap_buffers(window)
+
+        frame_times.append(time.perf_counter() - frame_start)
+        if len(frame_times) == 1:
+            mark('first frame')
+        gl_state.end_frame()
+
+        if not headless_mode:
+            with profiler.section('poll'):
+                glfw.poll_events()
+        profiler.end_frame()
+
+    if readback:
+        for frame in readback.finish():
+            capture(frame, readback.frames - 1)
+        print('Readback : %d frames, %d stalls (%d-deep PBO ring)' % (readback.frames, readback.stalls, readback.depth))
+        readback.delete()
+
+    if video:
+        video.print_stats()
+
+    report(frame_times)
+    profiler.report()
+    profiler.delete()
+    if os.environ.get('GLCORE_PHASE_FILE'):
+        write_phases(os.environ['GLCORE_PHASE_FILE'], frame_times)
+    terminate()
+
+def framebuffer():
+    ''' The framebuffer frames are presented from: the headless FBO, or the window's. '''
+    if headless_mode:
+        return context.framebuffer
+    return 0
+
+def framebuffer_size():
+    if headless_mode:
+        return context.width, context.height
+    return glfw.get_framebuffer_size(window)
+
+def capture(frame, index):
+    ''' Write a read-back RGBA frame (bottom row first) to --capture, if given. '''
+    if not options.capture:
+        return
+    import cv2
+
+    os.makedirs(options.capture, exist_ok=True)
+    path = os.path.join(options.capture, 'frame%05d.png' % index)
+    cv2.imwrite(path, cv2.cvtColor(np.flipud(frame), cv2.COLOR_RGBA2BGR))
+
+def report(frame_times):
+    previous = 0.0
+    for phase, t in phase_times.items():
+        if phase == 'first frame':
+            continue
+        print('%s : %.1f ms' % (phase.capitalize(), (t - previous) * 1000))
+        previous = t
+    if 'first frame' in phase_times:
+        print('Time to first frame : %.1f ms' % (phase_times['first frame'] * 1000))
+
+    if len(frame_times) > 1:
+        # the first frame includes driver warm-up
+        frame_times = frame_times[1:]
+        print('Frame : %.3f ms avg, %.3f ms min over %d frames' % (
+            sum(frame_times) / len(frame_times) * 1000,
+            min(frame_times) * 1000,
+            len(frame_times),
+        ))
+    # only there if the scene loaded an image
+    image_cache = sys.modules.get('image_cache')
+    if image_cache and (image_cache.stats['hits'] or image_cache.stats['misses']):
+        print('Image cache : %(hits)d hits, %(misses)d misses' % image_cache.stats)
+    gl_state.print_stats()
+
+def write_phases(path, frame_times):
+    '''
+    Phase end times in seconds since this module was imported, in order. With
+    $GLCORE_LAUNCH_TIME (time.time() when the process was spawned) the
+    interpreter startup before that is included as well.
+    '''
+    import json
+
+    report = {
+        'script': os.path.basename(sys.argv[0]),
+        'headless': headless_mode,
+        'renderer': (glGetString(GL_RENDERER) or b'').decode('utf-8', 'replace'),
+        'phases': phase_times,
+        'frame_times': frame_times,
+    }
+    if os.environ.get('GLCORE_LAUNCH_TIME'):
+        report['interpreter'] = start_wall_time - float(os.environ['GLCORE_LAUNCH_TIME'])
+
+    with open(path, 'w') as f:
+        json.dump(report, f)
+
+def terminate():
+    if headless_mode:
+        context.destroy()
+    else:
+        glfw.destroy_window(window)
+        glfw.terminate()
@@ -1,10 +1,11 @@
-import cv2
 from OpenGL.GL import *
 import glfw
 
+import frame_profiler
+import image_cache
+
 if __name__ == '__main__':
-    img = cv2.imread('lena.png', 1)
-    img_gl = cv2.cvtColor(cv2.flip(img, 0), cv2.COLOR_BGR2RGB)
+    img = image_cache.imread('lena.png')
 
     glfw.init()
 
@@ -24,14 +25,27 @@ if __name__ == '__main__':
     print('GPU :', glGetString(GL_RENDERER))
     print('OpenGL version :', glGetString(GL_VERSION))
 
-    while not glfw.window_should_close(window):
-        glClearColor(0, 0, 0, 1)
-        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-
-        glDrawPixels(width, height, GL_RGB, GL_UNSIGNED_BYTE, img_gl)
-
-        glfw.swap_buffers(window)
-        glfw.poll_events()
+    # --profile / --profile-json / --trace
+    profiler = frame_profiler.from_args(frame_profiler.parse_known_args())
 
+    while not glfw.window_should_close(window):
+        with profiler.section('render', gpu=True):
+            glClearColor(0, 0, 0, 1)
+            glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+
+            # the image as decoded: BGR, top row first, drawn downwards from the top left
+            glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+            glRasterPos2f(-1, 1)
+            glPixelZoom(1, -1)
+            glDrawPixels(width, height, GL_BGR, GL_UNSIGNED_BYTE, img)
+
+        with profiler.section('swap'):
+            glfw.swap_buffers(window)
+        with profiler.section('poll'):
+            glfw.poll_events()
+        profiler.end_frame()
+
+    profiler.report()
+    profiler.delete()
     glfw.destroy_window(window)
     glfw.terminate()
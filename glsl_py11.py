@@ -14,11 +14,12 @@ OpenGL version : b'4.1 INTEL-14.4.23'
 [床井研究室 - 第２回 テクスチャの割り当て](marina.sys.wakayama-u.ac.jp/~tokoi/?date=20040914)
 '''
 
-import sys
-from OpenGL.GL import *
-import glfw
+import glcore
+from OpenGL.GL import glDrawArrays, GL_TRIANGLES
 import numpy as np
-import cv2
+
+import gl_program
+import gl_state
 
 
 vertex_shader_text = '''
@@ -28,7 +29,8 @@ in vec3 vPosition;
 out vec2 vTextureCoord;
 
 void main(void) {
-    vTextureCoord = vec2((vPosition.x + 1.0) / 2, (vPosition.y + 1.0) / 2);
+    // the image is uploaded top row first
+    vTextureCoord = vec2((vPosition.x + 1.0) / 2, (1.0 - vPosition.y) / 2);
     gl_Position = vec4(vPosition, 1.0);
 }
 '''
@@ -46,85 +48,27 @@ void main(void) {
 '''
 
 def init_context():
-    print('Initializing context..')
-    glfw.init()
-
-    glfw.window_hint(glfw.CONTEXT_VERSION_MAJOR, 4)
-    glfw.window_hint(glfw.CONTEXT_VERSION_MINOR, 1)
-    glfw.window_hint(glfw.OPENGL_FORWARD_COMPAT, True)
-    glfw.window_hint(glfw.OPENGL_PROFILE, glfw.OPENGL_CORE_PROFILE)
-
-    global window
-    window = glfw.create_window(512, 512, __file__, None, None)
-    glfw.make_context_current(window)
-
-    print('Vendor :', glGetString(GL_VENDOR))
-    print('GPU :', glGetString(GL_RENDERER))
-    print('OpenGL version :', glGetString(GL_VERSION))
+    glcore.init_context(512, 512, __file__)
 
 def init_texture():
-    print('Initializing texture..')
-
-    img = cv2.imread('lena.png', 1)
-    img_gl = cv2.cvtColor(cv2.flip(img, 0), cv2.COLOR_BGR2RGB)
-
-    global width, height
-    height, width = img.shape[:2]
+    global width, height, texture
+    # --video: frames streamed into the texture every frame instead
+    streamed = glcore.open_video()
+    if streamed:
+        texture, width, height = streamed
+        return
 
-    global texture
-    texture = glGenTextures(1)
-
-    glActiveTexture(GL_TEXTURE0)
-    glBindTexture(GL_TEXTURE_2D, texture)
-
-    glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-    glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-
-    glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
-    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGB, width, height, 0, GL_RGB, GL_UNSIGNED_BYTE, img_gl)
+    img, width, height = glcore.load_image('lena.png')
+    texture = glcore.create_texture(img)
 
 def init_shader():
-    print('Initializing shader..')
-
-    global vertex_shader
-    vertex_shader = glCreateShader(GL_VERTEX_SHADER)
-    glShaderSource(vertex_shader, vertex_shader_text)
-    glCompileShader(vertex_shader)
-    if not glGetShaderiv(vertex_shader, GL_COMPILE_STATUS):
-        print('Vertex shader is not OK')
-        print(glGetShaderInfoLog(vertex_shader))
-        sys.exit(1)
-    else:
-        print('Vertex shader is OK')
-
-    global fragment_shader
-    fragment_shader = glCreateShader(GL_FRAGMENT_SHADER)
-    glShaderSource(fragment_shader, fragment_shader_text)
-    glCompileShader(fragment_shader)
-    if not glGetShaderiv(fragment_shader, GL_COMPILE_STATUS):
-        print('Fragment shader is not OK')
-        print(glGetShaderInfoLog(fragment_shader))
-        sys.exit(1)
-    else:
-        print('Fragment shader is OK')
-
     global program
-    program = glCreateProgram()
-    glAttachShader(program, vertex_shader)
-    glDeleteShader(vertex_shader)
-    glAttachShader(program, fragment_shader)
-    glDeleteShader(fragment_shader)
-    glLinkProgram(program)
-    if not glGetProgramiv(program, GL_LINK_STATUS):
-        print('Shader program is not OK')
-        print(glGetProgramInfoLog(program))
-        sys.exit(1)
-    else:
-        print('Shader program is OK')
+    program = glcore.create_program(vertex_shader_text, fragment_shader_text)
 
-def init_vao():
-    print('Initializing vao..')
+    global shader
+    shader = gl_program.Program(program)
 
+def init_vao():
     # anti-clockwise
     vertices = np.array([
         -1.0, -1.0, 0.0, # left bottom
@@ -136,45 +80,22 @@ def init_vao():
         1.0, 1.0, 0.0, # right top
     ], dtype=np.float32)
 
-    global vertex_vbo
-    vertex_vbo = glGenBuffers(1)
-
-    global vertex_vao
-    vertex_vao = glGenVertexArrays(1)
-    glBindVertexArray(vertex_vao)
-
-    glEnableVertexAttribArray(0)
-
-    glBindBuffer(GL_ARRAY_BUFFER, vertex_vbo)
-    glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL_STATIC_DRAW)
-    glVertexAttribPointer(0, 3, GL_FLOAT, False, 0, None)
-
-    glBindVertexArray(0)
+    global vertex_vao, vertex_vbo
+    vertex_vao, (vertex_vbo,) = glcore.create_vao((vertices, 3))
 
 def render():
-    glUseProgram(program)
+    gl_state.use_program(program)
 
-    glUniform1i(glGetUniformLocation(program, 'vTexture'), 0)
+    shader.set_uniform('vTexture', 0)
 
-    glBindVertexArray(vertex_vao)
+    gl_state.bind_vertex_array(vertex_vao)
     glDrawArrays(GL_TRIANGLES, 0, 6)
-    glBindVertexArray(0)
 
 if __name__ == '__main__':
+    args = glcore.parse_args(readback=True, video=True)
+
     init_context()
     init_texture()
     init_shader()
     init_vao()
-
-    print('Start rendering..')
-    while not glfw.window_should_close(window):
-        glClearColor(0, 0, 0, 1)
-        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-
-        render()
-
-        glfw.swap_buffers(window)
-        glfw.poll_events()
-
-    glfw.destroy_window(window)
-    glfw.terminate()
+    glcore.run(render, args.frames)
@@ -10,6 +10,41 @@ Vendor : b'Intel Inc.'
 GPU : b'Intel Iris OpenGL Engine'
 OpenGL version : b'4.1 INTEL-14.4.23'
 
+### Headless
+
+    python glsl_py12.py --headless --frames 100
+    PYOPENGL_PLATFORM=osmesa python glsl_py12.py --headless
+
+Renders into a framebuffer object on a surfaceless EGL/OSMesa context
+(see headless.py). Startup and per-frame times are printed on exit in both modes.
+
+    python glsl_py12.py --lut
+
+Samples a precomputed, disk-cached coordinate table (see fisheye_lut.py).
+
+    python glsl_py12.py --k 0.5 0.1 0 0 --center 512 480
+    python glsl_py12.py --headless --bench-params
+
+k1..k4, the output size and the principal point live in the FisheyeParams
+uniform block, so changing the camera profile is one glBufferSubData.
+
+    python glsl_py12.py --headless --readback 3 --capture frames
+
+Reads every frame back through a PBO ring without stalling (see pbo_readback.py).
+
+    python glsl_py12.py --video clip.mp4
+
+Streams camera/video frames into the texture (see video_texture.py).
+
+    python glsl_py12.py --chain
+
+Undistorts into a pooled render target, then colour correction and
+sharpening as further passes (see postprocess.py).
+
+    python fisheye_compute.py
+
+The same warp as a GL 4.3 compute shader, against this fragment path.
+
 
 [processing-docs/FishEye.glsl at 0c4cdc27af14727413189dd0660773c6b928ebf4 · processing/processing-docs](https://github.com/processing/processing-docs/blob/0c4cdc27af14727413189dd0660773c6b928ebf4/content/examples/Topics/Shaders/GlossyFishEye/data/FishEye.glsl)
 [FisheyeCalibration - Kota Yamaguchi's Wiki](http://ishikawa-vision.org/~kyamagu/cgi-bin/moin.cgi/FisheyeCalibration/)
@@ -17,11 +52,21 @@ OpenGL version : b'4.1 INTEL-14.4.23'
 [OpenGL - Textures](https://open.gl/textures)
 '''
 
-import sys
+import time
+
+import glcore
 from OpenGL.GL import *
-import glfw
 import numpy as np
-import cv2
+
+from fisheye_cpu import DEFAULT_K, S
+import program_cache
+import gl_program
+import gl_state
+
+PARAMS_BINDING = 0
+
+# postprocess.PassGraph with --chain
+chain = None
 
 
 vertex_shader_text = '''
@@ -40,7 +85,13 @@ fragment_shader_text = '''
 #version 410 core
 
 const float PI = 3.141592653589793;
-const float S = 1024;
+
+// camera profile, switched at runtime with one buffer update (see set_params)
+layout(std140) uniform FisheyeParams {
+    vec4 vK;       // k1..k4
+    vec2 vSize;    // output resolution the image circle is normalized by
+    vec2 vCenter;  // principal point in pixels
+};
 
 uniform sampler2D vTexture;
 in vec3 vFragmentPosition;
@@ -51,13 +102,8 @@ float atan2(in float y, in float x) {
 }
 
 void main(void) {
-    float k1 = 1.0;
-    float k2 = 1.0;
-    float k3 = 1.0;
-    float k4 = 1.0;
-
-    float x = (gl_FragCoord.x/S - 0.5) * 2.0;
-    float y = (gl_FragCoord.y/S - 0.5) * 2.0;
+    float x = (gl_FragCoord.x - vCenter.x) / vSize.x * 2.0;
+    float y = (gl_FragCoord.y - vCenter.y) / vSize.y * 2.0;
 
     float n = length(vec2(x, y));
     if (n > 1) {
@@ -74,102 +120,44 @@ void main(void) {
         float r6 = r2*r4;
         float r8 = r4*r4;
 
-        float r_d = r * (1 + k1 * r2 + k2 * r4 + k3 * r6 + k4 * r8);
+        float r_d = r * (1 + vK.x * r2 + vK.y * r4 + vK.z * r6 + vK.w * r8);
 
         float x_d = r_d * cos(theta);
         float y_d = r_d * sin(theta);
 
         vec2 vTexCoord = vec2((x_d + 1.0) / 2.0, (y_d + 1.0) / 2.0);
 
-        flagColor = texture(vTexture, vTexCoord).rgba;
+        // the image is uploaded top row first, so v runs down it
+        flagColor = texture(vTexture, vec2(vTexCoord.x, 1.0 - vTexCoord.y)).rgba;
     }
 
 }
 '''
 
 def init_context():
-    print('Initializing context..')
-    glfw.init()
-
-    glfw.window_hint(glfw.CONTEXT_VERSION_MAJOR, 4)
-    glfw.window_hint(glfw.CONTEXT_VERSION_MINOR, 1)
-    glfw.window_hint(glfw.OPENGL_FORWARD_COMPAT, True)
-    glfw.window_hint(glfw.OPENGL_PROFILE, glfw.OPENGL_CORE_PROFILE)
-
-    global window
-    window = glfw.create_window(512, 512, __file__, None, None)
-    glfw.make_context_current(window)
-
-    print('Vendor :', glGetString(GL_VENDOR))
-    print('GPU :', glGetString(GL_RENDERER))
-    print('OpenGL version :', glGetString(GL_VERSION))
-
-def init_texture():
-    print('Initializing texture..')
-
-    img = cv2.imread('lena.png', 1)
-    img_gl = cv2.cvtColor(cv2.flip(img, 0), cv2.COLOR_BGR2RGB)
-
-    global width, height
-    height, width = img.shape[:2]
-
-    global texture
-    texture = glGenTextures(1)
-
-    glActiveTexture(GL_TEXTURE0)
-    glBindTexture(GL_TEXTURE_2D, texture)
+    # headless: same pixel size as the 512x512 window on a HiDPI display
+    glcore.init_context(512, 512, __file__, headless_size=(S, S))
 
-    glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-    glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-    # https://open.gl/textures
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_BORDER)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_BORDER)
+def init_texture(path='lena.png'):
+    global width, height, texture
+    # --video: frames streamed into the texture every frame instead
+    streamed = glcore.open_video(wrap=GL_CLAMP_TO_BORDER)
+    if streamed:
+        texture, width, height = streamed
+        return
 
-    glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
-    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGB, width, height, 0, GL_RGB, GL_UNSIGNED_BYTE, img_gl)
+    img, width, height = glcore.load_image(path)
+    texture = glcore.create_texture(img, wrap=GL_CLAMP_TO_BORDER)
 
 def init_shader():
-    print('Initializing shader..')
-
-    global vertex_shader
-    vertex_shader = glCreateShader(GL_VERTEX_SHADER)
-    glShaderSource(vertex_shader, vertex_shader_text)
-    glCompileShader(vertex_shader)
-    if not glGetShaderiv(vertex_shader, GL_COMPILE_STATUS):
-        print('Vertex shader is not OK')
-        print(glGetShaderInfoLog(vertex_shader))
-        sys.exit(1)
-    else:
-        print('Vertex shader is OK')
-
-    global fragment_shader
-    fragment_shader = glCreateShader(GL_FRAGMENT_SHADER)
-    glShaderSource(fragment_shader, fragment_shader_text)
-    glCompileShader(fragment_shader)
-    if not glGetShaderiv(fragment_shader, GL_COMPILE_STATUS):
-        print('Fragment shader is not OK')
-        print(glGetShaderInfoLog(fragment_shader))
-        sys.exit(1)
-    else:
-        print('Fragment shader is OK')
-
     global program
-    program = glCreateProgram()
-    glAttachShader(program, vertex_shader)
-    glDeleteShader(vertex_shader)
-    glAttachShader(program, fragment_shader)
-    glDeleteShader(fragment_shader)
-    glLinkProgram(program)
-    if not glGetProgramiv(program, GL_LINK_STATUS):
-        print('Shader program is not OK')
-        print(glGetProgramInfoLog(program))
-        sys.exit(1)
-    else:
-        print('Shader program is OK')
+    # restored from the on-disk program binary cache when possible
+    program = glcore.create_program(vertex_shader_text, fragment_shader_text)
 
-def init_vao():
-    print('Initializing vao..')
+    global shader
+    shader = gl_program.Program(program)
 
+def init_vao():
     # anti-clockwise
     vertices = np.array([
         -1.0, -1.0, 0.0, # left bottom
@@ -181,45 +169,126 @@ def init_vao():
         1.0, 1.0, 0.0, # right top
     ], dtype=np.float32)
 
-    global vertex_vbo
-    vertex_vbo = glGenBuffers(1)
+    global vertex_vao, vertex_vbo
+    vertex_vao, (vertex_vbo,) = glcore.create_vao((vertices, 3))
+
+def init_params(params_program=None):
+    ''' FisheyeParams buffer, bound to this program's block (or params_program's). '''
+    print('Initializing params..')
+
+    global params_ubo
+    params_ubo = glGenBuffers(1)
+    gl_state.bind_buffer(GL_UNIFORM_BUFFER, params_ubo)
+    glBufferData(GL_UNIFORM_BUFFER, 32, None, GL_DYNAMIC_DRAW)
+    glBindBufferBase(GL_UNIFORM_BUFFER, PARAMS_BINDING, params_ubo)
+
+    bind_params_block(params_program or program)
+    set_params(DEFAULT_K, (S, S), (S / 2, S / 2))
+    glcore.mark('params')
+
+def bind_params_block(program):
+    block_index = glGetUniformBlockIndex(program, 'FisheyeParams')
+    if block_index != GL_INVALID_INDEX:
+        glUniformBlockBinding(program, block_index, PARAMS_BINDING)
+
+def params_data(k, size, center):
+    ''' FisheyeParams as std140 lays it out: vec4 at 0, vec2 at 16, vec2 at 24, 32 bytes. '''
+    return np.array([*k, *size, *center], dtype=np.float32)
+
+def set_params(k, size, center):
+    data = params_data(k, size, center)
+    gl_state.bind_buffer(GL_UNIFORM_BUFFER, params_ubo)
+    glBufferSubData(GL_UNIFORM_BUFFER, 0, data.nbytes, data)
+
+def benchmark_params(switches=1000):
+    profiles = [
+        (DEFAULT_K, (S, S), (S / 2, S / 2)),
+        ((0.5, 0.1, 0.0, 0.0), (S, S), (S / 2 + 8, S / 2 - 8)),
+    ]
+
+    draw_frame()
+    glFinish()
+
+    start = time.perf_counter()
+    for i in range(switches):
+        set_params(*profiles[i % 2])
+    glFinish()
+    switch_time = (time.perf_counter() - start) / switches
+
+    start = time.perf_counter()
+    for i in range(switches):
+        set_params(*profiles[i % 2])
+        draw_frame()
+    glFinish()
+    switch_draw_time = (time.perf_counter() - start) / switches
+
+    start = time.perf_counter()
+    for i in range(switches):
+        draw_frame()
+    glFinish()
+    draw_time = (time.perf_counter() - start) / switches
+
+    # what a profile change used to cost: rebuild the program from source
+    compile_times = []
+    for _ in range(5):
+        start = time.perf_counter()
+        rebuilt_program = program_cache.compile_program(vertex_shader_text, fragment_shader_text)
+        glFinish()
+        compile_times.append(time.perf_counter() - start)
+        glDeleteProgram(rebuilt_program)
+
+    print('Parameter switch : %.1f us' % (switch_time * 1e6))
+    print('Frame with switch : %.3f ms, without : %.3f ms' % (switch_draw_time * 1000, draw_time * 1000))
+    print('Compile + link : %.1f ms (min of %d)' % (min(compile_times) * 1000, len(compile_times)))
 
-    global vertex_vao
-    vertex_vao = glGenVertexArrays(1)
-    glBindVertexArray(vertex_vao)
-
-    glEnableVertexAttribArray(0)
+def render():
+    if chain:
+        chain.run(texture, (width, height), framebuffer=glcore.framebuffer(), viewport=(0, 0, *glcore.framebuffer_size()))
+        return
 
-    glBindBuffer(GL_ARRAY_BUFFER, vertex_vbo)
-    glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL_STATIC_DRAW)
-    glVertexAttribPointer(0, 3, GL_FLOAT, False, 0, None)
+    gl_state.use_program(program)
 
-    glBindVertexArray(0)
+    shader.set_uniform('vTexture', 0)
 
-def render():
-    glUseProgram(program)
+    gl_state.bind_vertex_array(vertex_vao)
+    glDrawArrays(GL_TRIANGLES, 0, 6)
 
-    glUniform1i(glGetUniformLocation(program, 'vTexture'), 0)
+def draw_frame():
+    glcore.clear()
 
-    glBindVertexArray(vertex_vao)
-    glDrawArrays(GL_TRIANGLES, 0, 6)
-    glBindVertexArray(0)
+    render()
 
 if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lut', action='store_true', help='sample a precomputed distortion table instead of evaluating it per pixel')
+    parser.add_argument('--k', type=float, nargs=4, default=DEFAULT_K, metavar=('K1', 'K2', 'K3', 'K4'))
+    parser.add_argument('--size', type=float, nargs=2, default=(S, S), metavar=('W', 'H'), help='size the image circle is normalized by')
+    parser.add_argument('--center', type=float, nargs=2, default=None, metavar=('CX', 'CY'), help='principal point in pixels')
+    parser.add_argument('--bench-params', action='store_true', help='time parameter switches against a recompile')
+    parser.add_argument('--chain', action='store_true', help='undistort, colour correct and sharpen as separate passes')
+    args = glcore.parse_args(parser, readback=True, video=True)
+    center = args.center or (args.size[0] / 2, args.size[1] / 2)
+
+    if args.lut:
+        import fisheye_lut
+        fragment_shader_text = fisheye_lut.lut_fragment_shader_text
+
     init_context()
     init_texture()
     init_shader()
     init_vao()
+    init_params()
+    set_params(args.k, args.size, center)
 
-    print('Start rendering..')
-    while not glfw.window_should_close(window):
-        glClearColor(0, 0, 0, 1)
-        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+    if args.lut:
+        fisheye_lut.init_lut(program, tuple(args.k), S, S, args.size, center)
 
-        render()
+    if args.bench_params:
+        benchmark_params()
 
-        glfw.swap_buffers(window)
-        glfw.poll_events()
+    if args.chain:
+        import postprocess
+        chain = postprocess.fisheye_chain((S, S), downscale=False)
 
-    glfw.destroy_window(window)
-    glfw.terminate()
+    glcore.run(render, args.frames)
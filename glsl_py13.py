@@ -0,0 +1,115 @@
+'''
+Loaded mesh, turning
+
+A model from mesh_loader.py (OBJ or PLY: welded, cache-ordered, uint16
+indices when they fit), lit by its normals. Without --model a torus is
+generated and goes through the same weld / reorder steps.
+
+    python glsl_py13.py --model bunny.obj
+    python glsl_py13.py --headless --frames 100
+'''
+
+import argparse
+import math
+import time
+
+import glcore
+from OpenGL.GL import glEnable, glDisable, GL_DEPTH_TEST
+import numpy as np
+
+import gl_program
+import gl_state
+import mesh
+import mesh_loader
+
+
+vertex_shader_text = '''
+#version 410 core
+
+layout(location = 0) in vec3 vPosition;
+layout(location = 1) in vec3 vNormal;
+
+uniform mat4 vModel;
+out vec3 fNormal;
+
+void main(void) {
+    // rotation and uniform scale only: the normal matrix is vModel itself
+    fNormal = mat3(vModel) * vNormal;
+    gl_Position = vModel * vec4(vPosition, 1.0);
+}
+'''
+
+fragment_shader_text = '''
+#version 410 core
+
+in vec3 fNormal;
+out vec4 flagColor;
+
+void main(void) {
+    vec3 light = normalize(vec3(0.4, 0.6, -1.0));
+    float diffuse = max(dot(normalize(fNormal), -light), 0.0);
+    flagColor = vec4(vec3(0.15 + 0.85 * diffuse), 1.0);
+}
+'''
+
+def init_context():
+    glcore.init_context(512, 512, __file__)
+
+def init_shader():
+    global program
+    program = glcore.create_program(vertex_shader_text, fragment_shader_text)
+
+    global shader
+    shader = gl_program.Program(program)
+
+def init_vao(path=None):
+    if path:
+        vertices, indices = mesh_loader.load(path)
+    else:
+        positions, triangles = mesh_loader.torus(96, 48)
+        attributes = {'position': positions, 'normal': mesh_loader.vertex_normals(positions, triangles)}
+        vertices, triangles = mesh_loader.weld(attributes, triangles)
+        triangles = mesh_loader.optimize(triangles, len(vertices))
+        vertices, triangles = mesh_loader.reorder_vertices(vertices, triangles)
+        indices = triangles.reshape(-1).astype(mesh_loader.index_dtype(len(vertices)))
+    print('Mesh : %d vertices, %d triangles, %s indices, ACMR %.3f' % (
+        len(vertices), len(indices) // 3, indices.dtype.name, mesh_loader.acmr(indices)))
+
+    # into the unit sphere
+    positions = vertices['position']
+    low, high = positions.min(axis=0), positions.max(axis=0)
+    global center, scale
+    center = (low + high) / 2
+    scale = 1.6 / max(float(np.linalg.norm(high - low)), 1e-6)
+
+    global model
+    model = mesh.Mesh(vertices, indices)
+    glcore.mark('vao')
+
+def model_matrix(angle):
+    c, s = math.cos(angle), math.sin(angle)
+    # turn about y, tilt about x
+    rotate_y = np.array([[c, 0, s, 0], [0, 1, 0, 0], [-s, 0, c, 0], [0, 0, 0, 1]])
+    tilt = np.array([[1, 0, 0, 0], [0, 0.94, -0.34, 0], [0, 0.34, 0.94, 0], [0, 0, 0, 1]])
+    fit = np.diag([scale, scale, scale, 1.0])
+    fit[:3, 3] = -center * scale
+    return tilt @ rotate_y @ fit
+
+def render():
+    gl_state.use_program(program)
+    shader.set_uniform('vModel', model_matrix(time.perf_counter() - start_time))
+
+    glEnable(GL_DEPTH_TEST)
+    model.draw()
+    glDisable(GL_DEPTH_TEST)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', metavar='PATH', help='OBJ or PLY file; a generated torus if not given')
+    args = glcore.parse_args(parser)
+
+    init_context()
+    init_shader()
+    init_vao(args.model)
+    start_time = time.perf_counter()
+    glcore.run(render, args.frames)
@@ -6,11 +6,15 @@ Open a window that displays a quad with an image on it.
 """
 
 from OpenGL.GL import *
-from OpenGL.GLU import *
 from OpenGL.GLUT import *
-from PIL import Image
 from math import *
 from time import *
+import atexit
+import numpy as np
+
+import frame_profiler
+import image_cache
+import texture_manager
 
 
 class MyApplication:
@@ -19,22 +23,23 @@ class MyApplication:
     def __init__(self):
         self.vao = 0
 
-    def load_texture(self, file_name):
+    def decode_texture(self, file_name):
+        """ BGRA pixels (texture_manager's layout), bottom row first. """
+        # only needed on a cache miss, keep it off the startup path
+        from PIL import Image
+
         image  = Image.open(file_name)
         width  = image.size[0]
         height = image.size[1]
         image_bytes  = image.convert("RGBA").tobytes ( "raw", "RGBA", 0, -1)
-        texture = glGenTextures(1)
+        rgba = np.frombuffer(image_bytes, dtype=np.uint8).reshape(height, width, 4)
+        return rgba[..., [2, 1, 0, 3]]
 
-        glBindTexture     ( GL_TEXTURE_2D, texture )
-        glTexParameterf   ( GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT )
-        glTexParameterf   ( GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT )
-        glTexParameteri   ( GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER,GL_LINEAR )
-        glTexParameteri   ( GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER,GL_LINEAR_MIPMAP_LINEAR )
-
-        gluBuild2DMipmaps ( GL_TEXTURE_2D, GL_RGBA, width, height, GL_RGBA, GL_UNSIGNED_BYTE, image_bytes )
+    def load_texture(self, file_name):
+        pixels = image_cache.load(file_name, 'pil-bgra-bottom-up', lambda: self.decode_texture(file_name))
 
-        return texture
+        # immutable storage, level 0 uploaded once, mipmaps built on the GPU
+        return texture_manager.create(pixels, mipmaps=True, wrap=GL_REPEAT)
 
     def compile_shaders(self):
         """ Get the shaders ready. """
@@ -109,11 +114,14 @@ class MyApplication:
         glClearBufferfv(GL_COLOR, 0, color)
 
         # Tell the computer what to render
-        glUseProgram(self.rendering_program)
-        glDrawArrays(GL_QUADS, 0, 4)
+        with self.profiler.section('render', gpu=True):
+            glUseProgram(self.rendering_program)
+            glDrawArrays(GL_QUADS, 0, 4)
 
         # Display
-        glutSwapBuffers()
+        with self.profiler.section('swap'):
+            glutSwapBuffers()
+        self.profiler.end_frame()
 
     def animate(self):
         glutPostRedisplay()
@@ -136,6 +144,11 @@ class MyApplication:
 
         self.startup()
 
+        # --profile / --profile-json / --trace; glutMainLoop exits the process,
+        # so report from atexit without touching the (by then gone) context
+        self.profiler = frame_profiler.from_args(frame_profiler.parse_known_args())
+        atexit.register(self.profiler.report, wait=False)
+
         glutIdleFunc(self.animate)
         glutDisplayFunc(self.render)
 
@@ -1,9 +1,20 @@
 # https://codelabo.com/posts/20200228182137
 
+import ctypes
+import math
+
 from OpenGL.GL import *
 import glfw
 import numpy as np
 
+from dynamic_buffer import DynamicBuffer
+import frame_profiler
+import gl_state
+import vertex_layout
+
+
+positions = np.array([[0.0, 0.5, 0.0, 1.0], [0.5, -0.5, 0.0, 1.0], [-0.5, -0.5, 0.0, 1.0]], dtype=np.float32)
+
 
 def create_program(vertex_shader_src, fragment_shader_src):
     # 作成したシェーダオブジェクトにソースコードを渡しコンパイルする
@@ -29,14 +40,13 @@ def create_program(vertex_shader_src, fragment_shader_src):
 
 
 def create_vao():
-    indices = np.array([0, 1, 2], dtype=np.uint)
-    positions = np.array([[0.0, 0.5, 0.0, 1.0], [0.5, -0.5, 0.0, 1.0], [-0.5, -0.5, 0.0, 1.0]], dtype=np.float32)
-    colors = np.array([[1.0, 0.0, 0.0, 1.0], [0.0, 1.0, 0.0, 1.0], [0.0, 0.0, 1.0, 1.0]], dtype=np.float32)
+    indices = np.array([0, 1, 2], dtype=np.uint16)
+    # 色は正規化した RGBA バイト (vertex_layout.py)
+    colors = vertex_layout.pack(vertex_layout.COLOR_PACKED, color=[[1.0, 0.0, 0.0, 1.0], [0.0, 1.0, 0.0, 1.0], [0.0, 0.0, 1.0, 1.0]])
 
-    # 座標バッファオブジェクトを作成してデータをGPU側に送る
-    position_vbo = glGenBuffers(1)
-    glBindBuffer(GL_ARRAY_BUFFER, position_vbo)
-    glBufferData(GL_ARRAY_BUFFER, positions.nbytes, positions, GL_STATIC_DRAW)
+    # 座標は毎フレーム書き換える (dynamic_buffer.py)
+    position_buffer = DynamicBuffer(GL_ARRAY_BUFFER, positions.nbytes)
+    position_vbo = position_buffer.buffer
 
     # 色バッファオブジェクトを作成してデータをGPU側に送る
     color_vbo = glGenBuffers(1)
@@ -49,9 +59,8 @@ def create_vao():
     vao = glGenVertexArrays(1)
     glBindVertexArray(vao)
 
-    # 0と1のアトリビュート変数を有効化
+    # 0のアトリビュート変数を有効化 (1は enable_attributes で)
     glEnableVertexAttribArray(0)
-    glEnableVertexAttribArray(1)
 
     # 座標バッファオブジェクトの位置を指定(location = 0)
     glBindBuffer(GL_ARRAY_BUFFER, position_vbo)
@@ -59,7 +68,7 @@ def create_vao():
 
     # 色バッファオブジェクトの位置を指定(location = 1)
     glBindBuffer(GL_ARRAY_BUFFER, color_vbo)
-    glVertexAttribPointer(1, 4, GL_FLOAT, GL_FALSE, 0, None)
+    vertex_layout.enable_attributes(colors.dtype, first_location=1)
 
     # インデックスオブジェクトを作成してデータをGPU側に送る
     index_vbo = glGenBuffers(1)
@@ -69,8 +78,24 @@ def create_vao():
     # バッファオブジェクトとVAOをアンバインド
     glBindBuffer(GL_ARRAY_BUFFER, 0)
     glBindVertexArray(0)
+    # bound directly above
+    gl_state.invalidate()
+
+    return vao, position_buffer
 
-    return vao
+
+def update_positions(vao, position_buffer, angle):
+    ''' Rotate the triangle: new positions into this frame's region of the dynamic buffer. '''
+    c, s = math.cos(angle), math.sin(angle)
+    rotated = positions.copy()
+    rotated[:, 0] = c * positions[:, 0] - s * positions[:, 1]
+    rotated[:, 1] = s * positions[:, 0] + c * positions[:, 1]
+    offset = position_buffer.write(rotated)
+
+    glBindVertexArray(vao)
+    gl_state.bind_buffer(GL_ARRAY_BUFFER, position_buffer.buffer)
+    glVertexAttribPointer(0, 4, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(offset))
+    glBindVertexArray(0)
 
 
 def main():
@@ -118,28 +143,42 @@ void main(void){
 '''
 
     program = create_program(vertex_shader_src, fragment_shader_src)
-    vao = create_vao()
+    vao, position_buffer = create_vao()
+
+    # --profile / --profile-json / --trace
+    profiler = frame_profiler.from_args(frame_profiler.parse_known_args())
 
     while not glfw.window_should_close(window):
-        # バッファを指定色で初期化
-        glClearColor(0, 0, 0, 1)
-        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        with profiler.section('render', gpu=True):
+            # バッファを指定色で初期化
+            glClearColor(0, 0, 0, 1)
+            glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+
+            # シェーダを有効化
+            glUseProgram(program)
 
-        # シェーダを有効化
-        glUseProgram(program)
+            update_positions(vao, position_buffer, glfw.get_time())
 
-        glBindVertexArray(vao)
+            glBindVertexArray(vao)
 
-        # バインドしたVAOを用いて描画
-        glDrawElements(GL_TRIANGLES, 3, GL_UNSIGNED_INT, None)
+            # バインドしたVAOを用いて描画
+            glDrawElements(GL_TRIANGLES, 3, GL_UNSIGNED_SHORT, None)
 
-        glBindVertexArray(0)
+            glBindVertexArray(0)
+            position_buffer.end_frame()
 
         # バッファを入れ替えて画面を更新
-        glfw.swap_buffers(window)
+        with profiler.section('swap'):
+            glfw.swap_buffers(window)
 
         # イベントを受け付けます
-        glfw.poll_events()
+        with profiler.section('poll'):
+            glfw.poll_events()
+        profiler.end_frame()
+
+    profiler.report()
+    profiler.delete()
+    position_buffer.delete()
 
     # ウィンドウを破棄してGLFWを終了
     glfw.destroy_window(window)
@@ -2,11 +2,11 @@
 Triangle (Left top)
 '''
 
-import sys
-from OpenGL.GL import *
-import glfw
+import glcore
+from OpenGL.GL import glDrawArrays, GL_TRIANGLES
 import numpy as np
-import cv2
+
+import gl_state
 
 
 # vertex_shader_text = '''
@@ -54,21 +54,7 @@ void main(void) {
 '''
 
 def init_context():
-    print('Initializing context..')
-    glfw.init()
-
-    glfw.window_hint(glfw.CONTEXT_VERSION_MAJOR, 4)
-    glfw.window_hint(glfw.CONTEXT_VERSION_MINOR, 1)
-    glfw.window_hint(glfw.OPENGL_FORWARD_COMPAT, True)
-    glfw.window_hint(glfw.OPENGL_PROFILE, glfw.OPENGL_CORE_PROFILE)
-
-    global window
-    window = glfw.create_window(640, 480, 'My Window', None, None)
-    glfw.make_context_current(window)
-
-    print('Vendor :', glGetString(GL_VENDOR))
-    print('GPU :', glGetString(GL_RENDERER))
-    print('OpenGL version :', glGetString(GL_VERSION))
+    glcore.init_context(640, 480, 'My Window')
 
 # def init_texture():
 #     print('Initializing texture..')
@@ -95,47 +81,10 @@ def init_context():
 #     return texture
 
 def init_shader():
-    print('Initializing shader..')
-
-    global vertex_shader
-    vertex_shader = glCreateShader(GL_VERTEX_SHADER)
-    glShaderSource(vertex_shader, vertex_shader_text)
-    glCompileShader(vertex_shader)
-    if not glGetShaderiv(vertex_shader, GL_COMPILE_STATUS):
-        print('Vertex shader is not OK')
-        print(glGetShaderInfoLog(vertex_shader))
-        sys.exit(1)
-    else:
-        print('Vertex shader is OK')
-
-    global fragment_shader
-    fragment_shader = glCreateShader(GL_FRAGMENT_SHADER)
-    glShaderSource(fragment_shader, fragment_shader_text)
-    glCompileShader(fragment_shader)
-    if not glGetShaderiv(fragment_shader, GL_COMPILE_STATUS):
-        print('Fragment shader is not OK')
-        print(glGetShaderInfoLog(fragment_shader))
-        sys.exit(1)
-    else:
-        print('Fragment shader is OK')
-
     global program
-    program = glCreateProgram()
-    glAttachShader(program, vertex_shader)
-    glDeleteShader(vertex_shader)
-    glAttachShader(program, fragment_shader)
-    glDeleteShader(fragment_shader)
-    glLinkProgram(program)
-    if not glGetProgramiv(program, GL_LINK_STATUS):
-        print('Shader program is not OK')
-        print(glGetProgramInfoLog(program))
-        sys.exit(1)
-    else:
-        print('Shader program is OK')
+    program = glcore.create_program(vertex_shader_text, fragment_shader_text)
 
 def init_vao():
-    print('Initializing vao..')
-
     vertices = np.array([
         -1.0, -1.0, 0.0,
         -1.0, 1.0, 0.0,
@@ -143,32 +92,17 @@ def init_vao():
         1.0, -1.0, 0.0,
     ], dtype=np.float32)
 
-    colors = np.array([
-        0.0, 0.0,
-        0.0, height,
-        width, height,
-        width, 0.0,
-    ], dtype=np.float32)
-
-    vertex_buffer = glGenBuffers(1)
-    glBindBuffer(GL_ARRAY_BUFFER, vertex_buffer)
-    glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL_STATIC_DRAW)
-
-    global vertex_vao
-    vertex_vao = glGenVertexArrays(1)
-    glBindVertexArray(vertex_vao)
-    glEnableVertexAttribArray(0)
-    glBindBuffer(GL_ARRAY_BUFFER, vertex_vao)
-    glVertexAttribPointer(0, 3, GL_FLOAT, False, 0, None)
+    global vertex_vao, vertex_vbo
+    vertex_vao, (vertex_vbo,) = glcore.create_vao((vertices, 3))
 
 def draw_quad():
-    glBindVertexArray(vertex_vao)
+    gl_state.bind_vertex_array(vertex_vao)
     glDrawArrays(GL_TRIANGLES, 0, 3)
 
 def render():
     # glEnable(GL_TEXTURE)
     # glBindTexture(GL_TEXTURE_2D, 0)
-    glUseProgram(program)
+    gl_state.use_program(program)
 
     # location = glGetUniformLocation(program, 'vTexture')
     # glUniform1i(location, 1)
@@ -176,19 +110,9 @@ def render():
     draw_quad()
 
 if __name__ == '__main__':
+    args = glcore.parse_args()
+
     init_context()
     init_shader()
     init_vao()
-
-    print('Start rendering..')
-    while not glfw.window_should_close(window):
-        glClearColor(0, 0, 0, 1)
-        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-
-        render()
-
-        glfw.swap_buffers(window)
-        glfw.poll_events()
-
-    glfw.destroy_window(window)
-    glfw.terminate()
+    glcore.run(render, args.frames)
@@ -4,11 +4,11 @@ Soft EBO
 [Element Array Bufferによる描画を行う - Qiita](https://qiita.com/y_UM4/items/8b87e82c66c185905553)
 '''
 
-import sys
-from OpenGL.GL import *
-import glfw
+import glcore
+from OpenGL.GL import glDrawElements, GL_TRIANGLES, GL_UNSIGNED_INT, GL_ELEMENT_ARRAY_BUFFER
 import numpy as np
-import cv2
+
+import gl_state
 
 
 vertex_shader_text = '''
@@ -35,21 +35,7 @@ void main(void) {
 '''
 
 def init_context():
-    print('Initializing context..')
-    glfw.init()
-
-    glfw.window_hint(glfw.CONTEXT_VERSION_MAJOR, 4)
-    glfw.window_hint(glfw.CONTEXT_VERSION_MINOR, 1)
-    glfw.window_hint(glfw.OPENGL_FORWARD_COMPAT, True)
-    glfw.window_hint(glfw.OPENGL_PROFILE, glfw.OPENGL_CORE_PROFILE)
-
-    global window
-    window = glfw.create_window(512, 512, __file__, None, None)
-    glfw.make_context_current(window)
-
-    print('Vendor :', glGetString(GL_VENDOR))
-    print('GPU :', glGetString(GL_RENDERER))
-    print('OpenGL version :', glGetString(GL_VERSION))
+    glcore.init_context(512, 512, __file__)
 
 # def init_texture():
 #     print('Initializing texture..')
@@ -70,47 +56,10 @@ def init_context():
 #     # glGenerateMipMap(GL_TEXTURE_2D)
 
 def init_shader():
-    print('Initializing shader..')
-
-    global vertex_shader
-    vertex_shader = glCreateShader(GL_VERTEX_SHADER)
-    glShaderSource(vertex_shader, vertex_shader_text)
-    glCompileShader(vertex_shader)
-    if not glGetShaderiv(vertex_shader, GL_COMPILE_STATUS):
-        print('Vertex shader is not OK')
-        print(glGetShaderInfoLog(vertex_shader))
-        sys.exit(1)
-    else:
-        print('Vertex shader is OK')
-
-    global fragment_shader
-    fragment_shader = glCreateShader(GL_FRAGMENT_SHADER)
-    glShaderSource(fragment_shader, fragment_shader_text)
-    glCompileShader(fragment_shader)
-    if not glGetShaderiv(fragment_shader, GL_COMPILE_STATUS):
-        print('Fragment shader is not OK')
-        print(glGetShaderInfoLog(fragment_shader))
-        sys.exit(1)
-    else:
-        print('Fragment shader is OK')
-
     global program
-    program = glCreateProgram()
-    glAttachShader(program, vertex_shader)
-    glDeleteShader(vertex_shader)
-    glAttachShader(program, fragment_shader)
-    glDeleteShader(fragment_shader)
-    glLinkProgram(program)
-    if not glGetProgramiv(program, GL_LINK_STATUS):
-        print('Shader program is not OK')
-        print(glGetProgramInfoLog(program))
-        sys.exit(1)
-    else:
-        print('Shader program is OK')
+    program = glcore.create_program(vertex_shader_text, fragment_shader_text)
 
 def init_vao():
-    print('Initializing vbo..')
-
     # clockwise
     vertices = np.array([
         1.0, 1.0, 0.0, # right top
@@ -127,39 +76,20 @@ def init_vao():
         # 3, 4, 5,
     ], dtype=np.uint)
 
-
-    global vertex_vbo
-    vertex_vbo = glGenBuffers(1)
-    global index_ebo
-    index_ebo = glGenBuffers(1)
-
-    global vertex_vao
-    vertex_vao = glGenVertexArrays(1)
-    glBindVertexArray(vertex_vao)
-
-    glEnableVertexAttribArray(0)
-
-    glBindBuffer(GL_ARRAY_BUFFER, vertex_vbo)
-    glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL_STATIC_DRAW)
-    glVertexAttribPointer(0, 3, GL_FLOAT, False, 0, None)
-
-    glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, index_ebo)
-    glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, GL_STATIC_DRAW)
-
-    glBindVertexArray(0)
+    global vertex_vao, vertex_vbo, index_ebo
+    vertex_vao, (vertex_vbo, index_ebo) = glcore.create_vao((vertices, 3), indices=indices)
 
 def draw_quad():
-    glBindVertexArray(vertex_vao)
-    glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, index_ebo)
+    gl_state.bind_vertex_array(vertex_vao)
+    gl_state.bind_buffer(GL_ELEMENT_ARRAY_BUFFER, index_ebo)
     # glDrawArrays(GL_TRIANGLES, 0, 6)
      # wip here!
     glDrawElements(GL_TRIANGLES, 6, GL_UNSIGNED_INT, None)
-    glBindVertexArray(0)
 
 def render():
     # glEnable(GL_TEXTURE)
     # glBindTexture(GL_TEXTURE_2D, 0)
-    glUseProgram(program)
+    gl_state.use_program(program)
 
     # glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
     # glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
@@ -173,20 +103,10 @@ def render():
     draw_quad()
 
 if __name__ == '__main__':
+    args = glcore.parse_args()
+
     init_context()
     # init_texture()
     init_shader()
     init_vao()
-
-    print('Start rendering..')
-    while not glfw.window_should_close(window):
-        glClearColor(0, 0, 0, 1)
-        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-
-        render()
-
-        glfw.swap_buffers(window)
-        glfw.poll_events()
-
-    glfw.destroy_window(window)
-    glfw.terminate()
+    glcore.run(render, args.frames)
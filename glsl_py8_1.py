@@ -2,18 +2,80 @@
 [python - How to draw with Vertex Array Objects and glDrawElements in PyOpenGL - Stack Overflow](https://stackoverflow.com/questions/14365484/how-to-draw-with-vertex-array-objects-and-gldrawelements-in-pyopengl)
 
 Thanks @NicolBolas. He motivated me to actually take this code and make it work. Instead of theoritizing:) I have removed vertexArrayObject(it's redundand as we already have VBOs for vertices and indices). So you just bind index and vertex buffers(along with attributes) prior to glDraw* call. And of course very important to pass None(null pointer) to glDrawElements indices instead of 0!
+
+A core profile context has no default vertex array object, so without one
+validation fails ("No vertex array object bound"). The triangle is now a
+mesh.Mesh: buffers and attribute format are recorded into a VAO once, and
+a frame is one VAO bind and one draw call.
+
+    python glsl_py8_1.py
+    python glsl_py8_1.py --measure    # GL/Python calls and CPU time per frame, before and after
 '''
 
+import sys
+import time
+
 from OpenGL.GL import shaders
 from OpenGL.arrays import vbo
 from OpenGL.GL import *
-from OpenGL.raw.GL.ARB.vertex_array_object import glGenVertexArrays, \
-                                                  glBindVertexArray
 import pygame
 
 import numpy as np
 
-def run():
+import frame_profiler
+import gl_program
+import gl_state
+import mesh
+
+
+def draw_bind_every_frame(shader, vertexPositions, indexPositions):
+    ''' The original loop body: buffers and attributes specified again each frame. '''
+    glClear(GL_COLOR_BUFFER_BIT|GL_DEPTH_BUFFER_BIT)
+    glUseProgram(shader)
+
+    indexPositions.bind()
+
+    vertexPositions.bind()
+    glEnableVertexAttribArray(0)
+    glVertexAttribPointer(0, 3, GL_FLOAT, False, 0, None)
+
+    #glDrawArrays(GL_TRIANGLES, 0, 3) #This line still works
+    glDrawElements(GL_TRIANGLES, 3, GL_UNSIGNED_INT, None) #This line does work too!
+
+def draw_mesh(shader, triangle):
+    glClear(GL_COLOR_BUFFER_BIT|GL_DEPTH_BUFFER_BIT)
+    gl_state.use_program(shader)
+    triangle.draw()
+
+def measure(paths, frames):
+    ''' GL calls, Python calls and CPU time per frame of each (label, draw, namespaces). '''
+    print('%-18s %10s %14s %14s' % ('path', 'GL calls', 'Python calls', 'CPU ms/frame'))
+    for label, draw, namespaces in paths:
+        # the other path binds directly
+        gl_state.invalidate()
+
+        # first frame creates and copies the buffers
+        draw()
+        pygame.display.flip()
+
+        with gl_program.GLCallCounter(*namespaces) as counter:
+            draw()
+        pygame.display.flip()
+        python_calls = frame_profiler.count_python_calls(draw)
+        pygame.display.flip()
+
+        elapsed = 0.0
+        for _ in range(frames):
+            start = time.perf_counter()
+            draw()
+            elapsed += time.perf_counter() - start
+            pygame.display.flip()
+            pygame.event.pump()
+
+        print('%-18s %10d %14d %14.4f' % (label, counter.total, python_calls, elapsed / frames * 1000))
+        print('    ' + ', '.join('%s %d' % (name, count) for name, count in sorted(counter.counts.items())))
+
+def run(measure_frames=0):
     pygame.init()
 
     # pygame==2.0.0.dev6
@@ -22,18 +84,18 @@ def run():
     pygame.display.gl_set_attribute(pygame.GL_CONTEXT_PROFILE_MASK, pygame.GL_CONTEXT_PROFILE_CORE)
 
     screen = pygame.display.set_mode((800,600), pygame.OPENGL|pygame.DOUBLEBUF)
+    # new context, nothing is bound
+    gl_state.invalidate()
 
     print('Vendor :', glGetString(GL_VENDOR))
     print('GPU :', glGetString(GL_RENDERER))
     print('OpenGL version :', glGetString(GL_VERSION))
 
-    #Create the VBO
     vertices = np.array([[0,1,0],[-1,-1,0],[1,-1,0]], dtype='f')
-    vertexPositions = vbo.VBO(vertices)
-
-    #Create the index buffer object
     indices = np.array([[0,1,2]], dtype=np.int32)
-    indexPositions = vbo.VBO(indices, target=GL_ELEMENT_ARRAY_BUFFER)
+
+    #Create the VBO, the index buffer object and the VAO that records both
+    triangle = mesh.Mesh(vertices, indices)
 
     #Now create the shaders
     VERTEX_SHADER = shaders.compileShader("""
@@ -54,26 +116,51 @@ def run():
     }
     """, GL_FRAGMENT_SHADER)
 
-'''
-    !! Validation Failed: No vertex array object bound.
-'''
+    # compileProgram validates too, which needs a VAO bound in a core profile
+    gl_state.bind_vertex_array(triangle.vao)
     shader = shaders.compileProgram(VERTEX_SHADER, FRAGMENT_SHADER)
 
-    #The draw loop
-    while True:
-        glClear(GL_COLOR_BUFFER_BIT|GL_DEPTH_BUFFER_BIT)
-        glUseProgram(shader)
-
-        indexPositions.bind()
-
-        vertexPositions.bind()
-        glEnableVertexAttribArray(0);
-        glVertexAttribPointer(0, 3, GL_FLOAT, False, 0, None)
-
-        #glDrawArrays(GL_TRIANGLES, 0, 3) #This line still works
-        glDrawElements(GL_TRIANGLES, 3, GL_UNSIGNED_INT, None) #This line does work too!
-
-        # Show the screen
-        pygame.display.flip()
-
-run()
+    if measure_frames:
+        vertexPositions = vbo.VBO(vertices)
+        indexPositions = vbo.VBO(indices, target=GL_ELEMENT_ARRAY_BUFFER)
+        # the one VAO the old loop needs in a core profile; everything else it respecifies per frame
+        empty_vao = glGenVertexArrays(1)
+        this_module = sys.modules[__name__]
+
+        def before():
+            gl_state.bind_vertex_array(empty_vao)
+            draw_bind_every_frame(shader, vertexPositions, indexPositions)
+
+        measure([
+            ('bind every frame', before, [this_module, vbo.get_implementation()]),
+            ('mesh (VAO)', lambda: draw_mesh(shader, triangle), [this_module, gl_state, mesh]),
+        ], measure_frames)
+
+        vertexPositions.delete()
+        indexPositions.delete()
+        gl_state.delete_vertex_array(empty_vao)
+    else:
+        #The draw loop
+        running = True
+        while running:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+
+            draw_mesh(shader, triangle)
+
+            # Show the screen
+            pygame.display.flip()
+
+    triangle.delete()
+    gl_state.delete_program(shader)
+    pygame.quit()
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='VAO + glDrawElements in a pygame core profile window.')
+    parser.add_argument('--measure', action='store_true', help='print calls and CPU time per frame, per-frame binds vs mesh')
+    parser.add_argument('--frames', type=int, default=1000, help='frames timed with --measure')
+    args = parser.parse_args()
+
+    run(args.frames if args.measure else 0)
@@ -0,0 +1,182 @@
+'''
+## Headless context
+
+Surfaceless OpenGL context rendering into a framebuffer object, for machines
+without a display server. Uses EGL by default (Mesa surfaceless platform or a
+GPU driver) and OSMesa when PYOPENGL_PLATFORM=osmesa, so it also runs on
+llvmpipe with no GPU at all.
+
+Import this module before `from OpenGL.GL import *`, because PyOpenGL picks
+its platform on the first import.
+
+    PYOPENGL_PLATFORM=egl python glsl_py12.py --headless
+    PYOPENGL_PLATFORM=osmesa python glsl_py12.py --headless
+
+Benchmarks and tests take their context from create_context(), which also
+resets gl_state's shadow copy.
+
+    context = headless.create_context(512, 512)                  # GL 4.1 core
+    context = headless.create_context(64, 64, version=(4, 3))    # compute shaders
+    python -m pytest tests                                       # GL tests skip without a context
+
+
+[EGL_KHR_surfaceless_context](https://registry.khronos.org/EGL/extensions/KHR/EGL_KHR_surfaceless_context.txt)
+[EGL_MESA_platform_surfaceless](https://registry.khronos.org/EGL/extensions/MESA/EGL_MESA_platform_surfaceless.txt)
+[OpenGL - Framebuffers](https://open.gl/framebuffers)
+'''
+
+import os
+
+os.environ.setdefault('PYOPENGL_PLATFORM', 'egl')
+# Mesa: do not try to reach an X11/Wayland server
+os.environ.setdefault('EGL_PLATFORM', 'surfaceless')
+
+import ctypes
+from OpenGL.GL import *
+import numpy as np
+
+
+def create_framebuffer(width, height, color_format=GL_RGBA8, depth=True):
+    ''' Framebuffer with renderbuffer attachments, left bound with its viewport set. '''
+    framebuffer = glGenFramebuffers(1)
+    glBindFramebuffer(GL_FRAMEBUFFER, framebuffer)
+
+    color_renderbuffer = glGenRenderbuffers(1)
+    glBindRenderbuffer(GL_RENDERBUFFER, color_renderbuffer)
+    glRenderbufferStorage(GL_RENDERBUFFER, color_format, width, height)
+    glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_RENDERBUFFER, color_renderbuffer)
+
+    depth_renderbuffer = 0
+    if depth:
+        depth_renderbuffer = glGenRenderbuffers(1)
+        glBindRenderbuffer(GL_RENDERBUFFER, depth_renderbuffer)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_DEPTH_COMPONENT24, width, height)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT, GL_RENDERBUFFER, depth_renderbuffer)
+
+    glBindRenderbuffer(GL_RENDERBUFFER, 0)
+
+    status = glCheckFramebufferStatus(GL_FRAMEBUFFER)
+    if status != GL_FRAMEBUFFER_COMPLETE:
+        raise RuntimeError('Framebuffer is not complete: 0x%x' % status)
+
+    glViewport(0, 0, width, height)
+
+    return framebuffer, color_renderbuffer, depth_renderbuffer
+
+def delete_framebuffer(framebuffer, color_renderbuffer, depth_renderbuffer):
+    glDeleteRenderbuffers(1, [color_renderbuffer])
+    if depth_renderbuffer:
+        glDeleteRenderbuffers(1, [depth_renderbuffer])
+    glDeleteFramebuffers(1, [framebuffer])
+
+
+def create_context(width, height, version=(4, 1)):
+    ''' HeadlessContext for a benchmark or test, with gl_state's shadow copy reset to match it. '''
+    import gl_state
+
+    context = HeadlessContext(width, height, version)
+    # new context, nothing is bound
+    gl_state.invalidate()
+    return context
+
+
+class HeadlessContext:
+    ''' GL 4.1 core context (or version, e.g. (4, 3) for compute) with an offscreen RGBA8 + depth framebuffer. '''
+
+    def __init__(self, width, height, version=(4, 1)):
+        self.width = width
+        self.height = height
+        self.version = version
+        self.platform = os.environ['PYOPENGL_PLATFORM']
+
+        if self.platform == 'osmesa':
+            self._create_osmesa_context()
+        else:
+            self._create_egl_context()
+
+        self.framebuffer, self.color_renderbuffer, self.depth_renderbuffer = \
+            create_framebuffer(width, height)
+
+    def _create_egl_context(self):
+        from OpenGL import EGL
+
+        self.display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+        major, minor = EGL.EGLint(), EGL.EGLint()
+        if not EGL.eglInitialize(self.display, ctypes.pointer(major), ctypes.pointer(minor)):
+            raise RuntimeError('eglInitialize failed')
+
+        config_attribs = (EGL.EGLint * 5)(
+            EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+            EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+            EGL.EGL_NONE,
+        )
+        config = EGL.EGLConfig()
+        num_configs = EGL.EGLint()
+        EGL.eglChooseConfig(self.display, config_attribs, ctypes.pointer(config), 1, ctypes.pointer(num_configs))
+        if num_configs.value == 0:
+            raise RuntimeError('No EGL config with desktop OpenGL support')
+
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+
+        context_attribs = (EGL.EGLint * 7)(
+            EGL.EGL_CONTEXT_MAJOR_VERSION, self.version[0],
+            EGL.EGL_CONTEXT_MINOR_VERSION, self.version[1],
+            EGL.EGL_CONTEXT_OPENGL_PROFILE_MASK, EGL.EGL_CONTEXT_OPENGL_CORE_PROFILE_BIT,
+            EGL.EGL_NONE,
+        )
+        self.context = EGL.eglCreateContext(self.display, config, EGL.EGL_NO_CONTEXT, context_attribs)
+        if self.context == EGL.EGL_NO_CONTEXT:
+            raise RuntimeError('eglCreateContext failed')
+
+        # surfaceless: no pbuffer, the framebuffer object is the only target
+        if not EGL.eglMakeCurrent(self.display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, self.context):
+            raise RuntimeError('eglMakeCurrent failed (EGL_KHR_surfaceless_context missing?)')
+
+    def _create_osmesa_context(self):
+        from OpenGL import osmesa
+        from OpenGL import arrays
+
+        attribs = arrays.GLintArray.asArray([
+            osmesa.OSMESA_FORMAT, osmesa.OSMESA_RGBA,
+            osmesa.OSMESA_DEPTH_BITS, 24,
+            osmesa.OSMESA_PROFILE, osmesa.OSMESA_CORE_PROFILE,
+            osmesa.OSMESA_CONTEXT_MAJOR_VERSION, self.version[0],
+            osmesa.OSMESA_CONTEXT_MINOR_VERSION, self.version[1],
+            0,
+        ])
+        self.context = osmesa.OSMesaCreateContextAttribs(attribs, None)
+        if not self.context:
+            raise RuntimeError('OSMesaCreateContextAttribs failed')
+
+        # OSMesa needs a client buffer to make the context current;
+        # we never draw into it, the framebuffer object is the target.
+        self._osmesa_buffer = arrays.GLubyteArray.zeros((1, 1, 4))
+        if not osmesa.OSMesaMakeCurrent(self.context, self._osmesa_buffer, GL_UNSIGNED_BYTE, 1, 1):
+            raise RuntimeError('OSMesaMakeCurrent failed')
+
+    def present(self):
+        ''' Stand-in for swap_buffers: wait until the frame is finished. '''
+        glFinish()
+
+    def bind(self):
+        glBindFramebuffer(GL_FRAMEBUFFER, self.framebuffer)
+        glViewport(0, 0, self.width, self.height)
+
+    def read_pixels(self):
+        ''' RGBA8 pixels of the framebuffer, bottom row first (GL order). '''
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, self.framebuffer)
+        glPixelStorei(GL_PACK_ALIGNMENT, 1)
+        data = glReadPixels(0, 0, self.width, self.height, GL_RGBA, GL_UNSIGNED_BYTE)
+        return np.frombuffer(data, dtype=np.uint8).reshape(self.height, self.width, 4)
+
+    def destroy(self):
+        delete_framebuffer(self.framebuffer, self.color_renderbuffer, self.depth_renderbuffer)
+
+        if self.platform == 'osmesa':
+            from OpenGL import osmesa
+            osmesa.OSMesaDestroyContext(self.context)
+        else:
+            from OpenGL import EGL
+            EGL.eglMakeCurrent(self.display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, EGL.EGL_NO_CONTEXT)
+            EGL.eglDestroyContext(self.display, self.context)
+            EGL.eglTerminate(self.display)
@@ -0,0 +1,166 @@
+'''
+## Decoded image cache
+
+Keeps decoded images on disk as .npy files and memory-maps them on the next
+run, so a restart skips the PNG/JPEG decode. The key hashes the absolute
+path, the file's mtime and size and how it was decoded (cv2 flags, PIL mode);
+editing the image changes the key. The cached array is exactly what the
+scene uploads (BGR top-down for cv2, see image_ingest.py), so the mapped
+pages go straight to glTexImage2D without another copy.
+
+    img = image_cache.imread('lena.png')              # like cv2.imread(path, 1)
+    pixels = image_cache.load(path, 'pil-rgba', decode)
+
+    python image_cache.py    # decode vs mapped load, lena.png and a 4096x4096 PNG
+
+Cache directory: $IMAGE_CACHE or ~/.cache/pyopengltest/images. It is kept
+under $IMAGE_CACHE_SIZE MB (default 1024); the least recently used entries
+are evicted first.
+'''
+
+import hashlib
+import os
+import time
+
+import numpy as np
+
+
+cache_dir = os.environ.get(
+    'IMAGE_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'pyopengltest', 'images'),
+)
+max_bytes = int(float(os.environ.get('IMAGE_CACHE_SIZE', 1024)) * 1024 * 1024)
+
+stats = {'hits': 0, 'misses': 0, 'evicted': 0}
+
+
+def image_key(path, variant):
+    st = os.stat(path)
+    h = hashlib.sha256()
+    for part in (os.path.abspath(path), st.st_mtime_ns, st.st_size, variant):
+        h.update(str(part).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+def entries():
+    ''' (last use, bytes, path) of every cached image, least recently used first. '''
+    if not os.path.isdir(cache_dir):
+        return []
+    found = []
+    for name in os.listdir(cache_dir):
+        if name.endswith('.npy'):
+            path = os.path.join(cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            found.append((st.st_mtime, st.st_size, path))
+    return sorted(found)
+
+def evict(limit=None):
+    ''' Remove least recently used entries until the cache fits in limit bytes. '''
+    limit = max_bytes if limit is None else limit
+    cached = entries()
+    total = sum(size for _, size, _ in cached)
+    for _, size, path in cached:
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        stats['evicted'] += 1
+
+def save(path, pixels):
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        np.save(f, np.ascontiguousarray(pixels))
+    os.replace(tmp_path, path)
+
+def load(path, variant, decode):
+    '''
+    decode()'s array for the image at path, read-only and memory-mapped from
+    the cache when it is there. variant names how decode() decodes.
+    '''
+    cached = os.path.join(cache_dir, image_key(path, variant) + '.npy')
+    try:
+        pixels = np.load(cached, mmap_mode='r')
+    except (OSError, ValueError):
+        pass
+    else:
+        stats['hits'] += 1
+        # mtime is the last use for eviction
+        os.utime(cached)
+        return pixels
+
+    stats['misses'] += 1
+    pixels = decode()
+    if pixels is None:
+        return None
+    if pixels.nbytes <= max_bytes:
+        try:
+            save(cached, pixels)
+            evict()
+        except OSError as e:
+            print('Could not cache decoded image :', e)
+    return pixels
+
+def imread(path, flags=1):
+    ''' cv2.imread through the cache; None if the image cannot be read. '''
+    def decode():
+        import cv2
+        return cv2.imread(path, flags)
+
+    if not os.path.exists(path):
+        return None
+    return load(path, 'cv2-%d' % flags, decode)
+
+def clear_cache():
+    for _, _, path in entries():
+        os.remove(path)
+
+
+def benchmark(paths, repeat):
+    print('%-24s %12s %12s %12s' % ('image', 'size', 'decode ms', 'mapped ms'))
+    for path in paths:
+        decode_times = []
+        mapped_times = []
+        for _ in range(repeat):
+            clear_cache()
+
+            start = time.perf_counter()
+            img = imread(path)
+            decode_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            img = imread(path)
+            # touch every page (rows are at most 4 KB apart here), as the upload will
+            int(img[:, ::1024].sum())
+            mapped_times.append(time.perf_counter() - start)
+
+        print('%-24s %12s %12.2f %12.2f' % (
+            os.path.basename(path), '%dx%d' % img.shape[1::-1], min(decode_times) * 1000, min(mapped_times) * 1000))
+
+    print('Cache hits %(hits)d, misses %(misses)d, evicted %(evicted)d' % stats)
+
+if __name__ == '__main__':
+    import argparse
+    import tempfile
+    parser = argparse.ArgumentParser(description='Image decode vs memory-mapped cache load.')
+    parser.add_argument('images', nargs='*', help='default: lena.png and a generated 4096x4096 PNG')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # keep the user's cache out of it
+        cache_dir = os.path.join(tmp, 'cache')
+        paths = args.images
+        if not paths:
+            import cv2
+            large = os.path.join(tmp, 'large.png')
+            y, x = np.mgrid[0:4096, 0:4096]
+            cv2.imwrite(large, np.dstack([x % 256, y % 256, (x ^ y) % 256]).astype(np.uint8))
+            paths = ['lena.png', large]
+        benchmark(paths, args.repeat)
@@ -0,0 +1,160 @@
+'''
+## Image ingest
+
+Uploads cv2 images as they come out of cv2.imread: BGR, top row first. The
+old path, cv2.cvtColor(cv2.flip(img, 0), cv2.COLOR_BGR2RGB), made two
+full-size temporaries per image. Here the channel order is left to the
+upload (GL_BGR / GL_BGRA) and the scenes flip v in texture coordinates
+instead, so the default path copies nothing on our side.
+
+Transfer layouts:
+
+    bgr   cv2's buffer as is, GL_BGR; unpack alignment from the row stride
+    bgra  one cv2.cvtColor to 4 bytes/pixel, GL_BGRA, always 4-byte aligned
+    rgba  one cv2.cvtColor to 4 bytes/pixel, GL_RGBA
+    rgb   one BGR2RGB copy, GL_RGB (the old channel order, for comparison)
+
+All of them keep cv2's row order; only the benchmark's 'flip+rgb' row does
+the old flip as well.
+
+The layout is the one the driver prefers for RGBA8 textures when it can be
+queried (GL_TEXTURE_IMAGE_FORMAT, GL 4.3), otherwise bgr; $IMAGE_INGEST_LAYOUT
+overrides it.
+
+    python image_ingest.py    # bytes copied and upload time per layout, headless
+
+[Common Mistakes - OpenGL Wiki (Texture upload and pixel reads)](https://www.khronos.org/opengl/wiki/Common_Mistakes#Texture_upload_and_pixel_reads)
+[Pixel Transfer - OpenGL Wiki (Pixel layout)](https://www.khronos.org/opengl/wiki/Pixel_Transfer#Pixel_layout)
+'''
+
+import os
+import time
+
+if __name__ == '__main__':
+    import headless
+
+from OpenGL.GL import *
+import numpy as np
+
+
+LAYOUTS = ('bgr', 'bgra', 'rgba', 'rgb')
+
+_preferred_layout = None
+
+
+def row_alignment(img):
+    ''' Largest GL_UNPACK_ALIGNMENT (8, 4, 2, 1) the rows and the buffer satisfy. '''
+    stride = img.strides[0]
+    address = img.__array_interface__['data'][0]
+    for alignment in (8, 4, 2):
+        if stride % alignment == 0 and address % alignment == 0:
+            return alignment
+    return 1
+
+def preferred_layout():
+    global _preferred_layout
+    if os.environ.get('IMAGE_INGEST_LAYOUT'):
+        return os.environ['IMAGE_INGEST_LAYOUT']
+    if _preferred_layout is None:
+        _preferred_layout = 'bgr'
+        version = (glGetString(GL_VERSION) or b'0.0').split()[0].split(b'.')
+        if (int(version[0]), int(version[1])) >= (4, 3):
+            value = np.zeros(1, dtype=np.int32)
+            glGetInternalformativ(GL_TEXTURE_2D, GL_RGBA8, GL_TEXTURE_IMAGE_FORMAT, 1, value)
+            _preferred_layout = {GL_BGRA: 'bgra', GL_RGBA: 'rgba'}.get(int(value[0]), 'bgr')
+    return _preferred_layout
+
+def prepare(img, layout=None):
+    ''' (pixels, format, alignment, bytes copied) for uploading a cv2 image, rows top-down. '''
+    import cv2
+
+    layout = layout or preferred_layout()
+    if layout == 'bgr' or img.shape[2:] == (4,):
+        # as decoded; 4 channels are BGRA (IMREAD_UNCHANGED) whatever the layout
+        # a view, not a copy, when img is contiguous (also for image_cache's memmaps)
+        pixels = np.ascontiguousarray(img)
+        copied = 0 if img.flags.c_contiguous else pixels.nbytes
+        pixel_format = GL_BGRA if img.shape[2:] == (4,) else GL_BGR
+        return pixels, pixel_format, row_alignment(pixels), copied
+    if layout == 'bgra':
+        pixels = cv2.cvtColor(img, cv2.COLOR_BGR2BGRA)
+        return pixels, GL_BGRA, 4, pixels.nbytes
+    if layout == 'rgba':
+        pixels = cv2.cvtColor(img, cv2.COLOR_BGR2RGBA)
+        return pixels, GL_RGBA, 4, pixels.nbytes
+    if layout == 'rgb':
+        pixels = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        return pixels, GL_RGB, row_alignment(pixels), pixels.nbytes
+    raise RuntimeError('unknown ingest layout %r (one of %s)' % (layout, ', '.join(LAYOUTS)))
+
+def upload(img, layout=None, internal_format=GL_RGBA8, sub=False):
+    '''
+    glTexImage2D (or glTexSubImage2D with sub) of a cv2 image into the texture
+    bound to GL_TEXTURE_2D on the active unit. Returns the bytes copied on the CPU.
+    '''
+    pixels, pixel_format, alignment, copied = prepare(img, layout)
+    height, width = img.shape[:2]
+
+    glPixelStorei(GL_UNPACK_ALIGNMENT, alignment)
+    if sub:
+        glTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0, width, height, pixel_format, GL_UNSIGNED_BYTE, pixels)
+    else:
+        glTexImage2D(GL_TEXTURE_2D, 0, internal_format, width, height, 0, pixel_format, GL_UNSIGNED_BYTE, pixels)
+    return copied
+
+
+def legacy_prepare(img):
+    ''' What the scenes did before: flip + BGR2RGB, alignment 1. '''
+    import cv2
+    flipped = cv2.flip(img, 0)
+    pixels = cv2.cvtColor(flipped, cv2.COLOR_BGR2RGB)
+    return pixels, GL_RGB, 1, flipped.nbytes + pixels.nbytes
+
+def benchmark(sizes, repeat):
+    import gl_state
+
+    context = headless.create_context(64, 64)
+    print('Preferred layout :', preferred_layout())
+
+    texture = glGenTextures(1)
+    gl_state.bind_texture(GL_TEXTURE_2D, texture, unit=GL_TEXTURE0)
+
+    print('%11s %-8s %6s %14s %14s %10s %10s' % (
+        'image', 'layout', 'align', 'copied bytes', 'upload bytes', 'prep ms', 'upload ms'))
+    for size in sizes:
+        img = np.random.randint(0, 256, (size, size, 3), dtype=np.uint8)
+        for layout in ('flip+rgb',) + LAYOUTS:
+            prepare_times = []
+            upload_times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                if layout == 'flip+rgb':
+                    pixels, pixel_format, alignment, copied = legacy_prepare(img)
+                else:
+                    pixels, pixel_format, alignment, copied = prepare(img, layout)
+                prepared = time.perf_counter()
+
+                glPixelStorei(GL_UNPACK_ALIGNMENT, alignment)
+                glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA8, size, size, 0, pixel_format, GL_UNSIGNED_BYTE, pixels)
+                glFinish()
+                uploaded = time.perf_counter()
+
+                prepare_times.append(prepared - start)
+                upload_times.append(uploaded - prepared)
+
+            print('%11s %-8s %6d %14d %14d %10.3f %10.3f' % (
+                '%dx%d' % (size, size), layout, alignment, copied, pixels.nbytes,
+                min(prepare_times) * 1000, min(upload_times) * 1000))
+
+    gl_state.delete_texture(texture)
+    context.destroy()
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Bytes copied and upload time per transfer layout.')
+    # 1023: rows of 3069 bytes, only 1-byte aligned as BGR
+    parser.add_argument('--sizes', type=int, nargs='+', default=[512, 1023, 2048, 4096])
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    benchmark(args.sizes, args.repeat)
@@ -0,0 +1,105 @@
+'''
+## Mesh
+
+Vertex buffer, index buffer and the vertex array object that records how
+they are read. The buffer bindings and attribute formats are set up once,
+when the mesh is made; drawing is one VAO bind and one draw call instead of
+binding buffers and re-specifying every attribute each frame.
+
+    triangle = mesh.Mesh(vertices, indices)                    # float32 rows, location 0
+    quad = mesh.Mesh(vertices, attributes=[(0, 3), (1, 2)])    # xyz + uv interleaved
+    quad = mesh.Mesh(vertex_layout.pack(vertex_layout.POSITION_TEXCOORD_PACKED, position=xyz, texcoord=uv))
+    triangle.draw()
+
+    python glsl_py8_1.py --measure    # per-frame calls and CPU time, before/after (pygame)
+
+[Vertex Specification - OpenGL Wiki (Vertex Array Object)](https://www.khronos.org/opengl/wiki/Vertex_Specification#Vertex_Array_Object)
+'''
+
+import ctypes
+
+from OpenGL.GL import *
+import numpy as np
+
+import gl_state
+import vertex_layout
+
+
+INDEX_TYPES = {
+    np.dtype(np.uint8): GL_UNSIGNED_BYTE,
+    np.dtype(np.uint16): GL_UNSIGNED_SHORT,
+    np.dtype(np.uint32): GL_UNSIGNED_INT,
+}
+
+
+class Mesh:
+
+    def __init__(self, vertices, indices=None, attributes=None, mode=GL_TRIANGLES, usage=GL_STATIC_DRAW):
+        '''
+        vertices has one row of float32 values per vertex. attributes are
+        (location, components) in the order they are packed in a row; by
+        default the whole row is attribute 0. A structured array (see
+        vertex_layout.py) brings its own attributes: its fields, locations
+        0, 1, ...
+        '''
+        structured = np.asarray(vertices).dtype.names is not None
+        if structured:
+            if attributes is not None:
+                raise RuntimeError('a structured vertex array takes its attributes from its dtype')
+            vertices = np.ascontiguousarray(vertices)
+        else:
+            vertices = np.ascontiguousarray(vertices, dtype=np.float32)
+            vertices = vertices.reshape(len(vertices), -1)
+            row = vertices.shape[1]
+            if attributes is None:
+                attributes = [(0, row)]
+            if sum(components for _, components in attributes) != row:
+                raise RuntimeError('attributes %r do not add up to %d floats per vertex' % (attributes, row))
+
+        self.mode = mode
+        self.vertex_count = len(vertices)
+
+        self.vao = glGenVertexArrays(1)
+        gl_state.bind_vertex_array(self.vao)
+
+        self.vbo = glGenBuffers(1)
+        gl_state.bind_buffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices, usage)
+
+        if structured:
+            vertex_layout.enable_attributes(vertices.dtype)
+        else:
+            stride = vertices.strides[0]
+            offset = 0
+            for location, components in attributes:
+                glEnableVertexAttribArray(location)
+                glVertexAttribPointer(location, components, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(offset))
+                offset += components * vertices.itemsize
+
+        self.ebo = None
+        if indices is not None:
+            indices = np.ascontiguousarray(indices).reshape(-1)
+            if indices.dtype not in INDEX_TYPES:
+                indices = indices.astype(np.uint32)
+            self.index_type = INDEX_TYPES[indices.dtype]
+            self.index_count = len(indices)
+
+            # recorded in the VAO
+            self.ebo = glGenBuffers(1)
+            gl_state.bind_buffer(GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+            glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, usage)
+
+        gl_state.bind_vertex_array(0)
+
+    def draw(self):
+        gl_state.bind_vertex_array(self.vao)
+        if self.ebo is None:
+            glDrawArrays(self.mode, 0, self.vertex_count)
+        else:
+            glDrawElements(self.mode, self.index_count, self.index_type, None)
+
+    def delete(self):
+        gl_state.delete_buffer(self.vbo)
+        if self.ebo is not None:
+            gl_state.delete_buffer(self.ebo)
+        gl_state.delete_vertex_array(self.vao)
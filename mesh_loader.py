@@ -0,0 +1,473 @@
+'''
+## Mesh loader
+
+OBJ and PLY (ascii or binary) models as a vertex_layout structured array
+and an index array, ready for mesh.Mesh:
+
+    position    float32 x 3     location 0
+    normal      float32 x 3     location 1 (area-weighted smooth normals if the file has none)
+    texcoord    float32 x 2     location 2, if the file has them
+    color       uint8 x 4       location 2 or 3, PLY vertex colours if present
+
+The numbers are parsed in bulk: all lines of a kind are joined and handed to
+NumPy at once, binary PLY elements are read with np.frombuffer. Polygons
+are fanned into triangles. Vertices with identical attributes are welded
+(OBJ corners referencing the same v/vt/vn and duplicated PLY vertices alike)
+and degenerate triangles dropped. Triangles are then reordered for the
+post-transform vertex cache (Tipsify), vertices by first use, and indices
+are uint16 whenever there are at most 65536 vertices.
+
+    vertices, indices = mesh_loader.load('bunny.obj')
+    model = mesh.Mesh(vertices, indices)
+
+    python mesh_loader.py bunny.obj dragon.ply    # load time, memory and ACMR per model
+    python mesh_loader.py                         # a generated 500k-triangle soup
+    python glsl_py13.py --model bunny.obj
+
+ACMR (average cache miss ratio) is vertex shader runs per triangle with a
+FIFO cache: 3 without any reuse, 0.5 is the limit for a regular grid.
+
+[Fast Triangle Reordering for Vertex Locality and Reduced Overdraw (Sander, Nehab, Barczak 2007)](https://gfx.cs.princeton.edu/pubs/Sander_2007_%3ETR/tipsy.pdf)
+[Wavefront .obj file - Wikipedia](https://en.wikipedia.org/wiki/Wavefront_.obj_file)
+[PLY - Polygon File Format (Paul Bourke)](http://paulbourke.net/dataformats/ply/)
+'''
+
+import collections
+import os
+import re
+import time
+
+import numpy as np
+
+import vertex_layout
+
+
+CACHE_SIZE = 16
+
+PLY_TYPES = {
+    'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1',
+    'short': 'i2', 'int16': 'i2', 'ushort': 'u2', 'uint16': 'u2',
+    'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+    'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8',
+}
+
+PLY_TEXCOORDS = (('u', 'v'), ('s', 't'), ('texture_u', 'texture_v'))
+
+
+def triangulate(corners, counts):
+    ''' Polygon corners (flat, `counts[i]` per polygon) fanned into (T, 3) triangles. '''
+    counts = np.asarray(counts, dtype=np.int64)
+    if len(counts) and counts.min() < 3:
+        raise RuntimeError('polygon with fewer than 3 corners')
+    starts = np.cumsum(counts) - counts
+    triangle_counts = counts - 2
+    first = np.repeat(starts, triangle_counts)
+    # 1, 2, ... within each polygon
+    step = np.arange(triangle_counts.sum()) - np.repeat(np.cumsum(triangle_counts) - triangle_counts, triangle_counts) + 1
+    return np.stack([corners[first], corners[first + step], corners[first + step + 1]], axis=1)
+
+def numbers(lines, dtype=np.float32):
+    ''' The whitespace-separated numbers of all lines, as one array. '''
+    return np.array(' '.join(lines).split(), dtype=dtype)
+
+def obj_index(index, count):
+    ''' 1-based, negative relative to the end, 0 for missing (-> -1) '''
+    return np.where(index > 0, index - 1, np.where(index < 0, count + index, -1))
+
+def parse_obj(text):
+    ''' (attributes per corner, triangles) of OBJ text; materials and groups are ignored. '''
+    def lines(kind):
+        return re.findall(r'^%s[ \t]+(.*?)\s*$' % kind, text, re.M)
+
+    def columns(kind, width):
+        rows = lines(kind)
+        if not rows:
+            return None
+        values = numbers(rows)
+        ncol = len(rows[0].split())
+        if len(values) != ncol * len(rows):
+            raise RuntimeError('%r lines do not all have %d values' % (kind, ncol))
+        return values.reshape(-1, ncol)[:, :width]
+
+    positions = columns('v', 3)
+    texcoords = columns('vt', 2)
+    normals = columns('vn', 3)
+    if positions is None:
+        raise RuntimeError('no vertices')
+
+    faces = lines('f')
+    if not faces:
+        raise RuntimeError('no faces')
+    counts = [len(face.split()) for face in faces]
+    # v, v/vt, v//vn or v/vt/vn: the same for every corner
+    slots = faces[0].split()[0].replace('//', '/0/').count('/') + 1
+    indices = numbers([face.replace('//', '/0/').replace('/', ' ') for face in faces], dtype=np.int64)
+    if len(indices) != sum(counts) * slots:
+        raise RuntimeError('faces mix v, v/vt and v/vt/vn corners')
+    indices = indices.reshape(-1, slots)
+
+    corners = triangulate(np.arange(len(indices)), counts).reshape(-1)
+    position_index = obj_index(indices[corners, 0], len(positions))
+    attributes = collections.OrderedDict(position=positions[position_index])
+
+    if normals is not None and slots == 3:
+        normal_index = obj_index(indices[corners, 2], len(normals))
+        if (normal_index < 0).any():
+            raise RuntimeError('some corners have no normal')
+        attributes['normal'] = normals[normal_index]
+    else:
+        # shared by value: a soup repeats a position under a new index for every corner
+        unique, shared = np.unique(positions + 0.0, axis=0, return_inverse=True)
+        shared = shared.reshape(-1)[position_index]
+        attributes['normal'] = vertex_normals(unique, shared.reshape(-1, 3))[shared]
+
+    if texcoords is not None and slots >= 2:
+        texcoord_index = obj_index(indices[corners, 1], len(texcoords))
+        attributes['texcoord'] = np.where(texcoord_index[:, None] >= 0, texcoords[texcoord_index], 0)
+
+    return attributes, np.arange(len(corners)).reshape(-1, 3)
+
+def ply_header(data):
+    ''' (format, [(element, count, [(property, type, list count type or None)])], body offset) '''
+    end = data.find(b'end_header')
+    if not data.startswith(b'ply') or end < 0:
+        raise RuntimeError('not a PLY file')
+    body = data.index(b'\n', end) + 1
+
+    format_ = None
+    elements = []
+    for line in data[:end].decode('ascii').splitlines():
+        words = line.split()
+        if not words:
+            continue
+        if words[0] == 'format':
+            format_ = words[1]
+        elif words[0] == 'element':
+            elements.append((words[1], int(words[2]), []))
+        elif words[0] == 'property':
+            if words[1] == 'list':
+                elements[-1][2].append((words[4], PLY_TYPES[words[3]], PLY_TYPES[words[2]]))
+            else:
+                elements[-1][2].append((words[2], PLY_TYPES[words[1]], None))
+    if format_ not in ('ascii', 'binary_little_endian', 'binary_big_endian'):
+        raise RuntimeError('unknown PLY format %r' % format_)
+    return format_, elements, body
+
+def ply_records(properties, length, byte_order):
+    ''' Record dtype of an element, list properties taken as `length` long. '''
+    fields = []
+    for name, type_, count_type in properties:
+        if count_type is None:
+            fields.append((name, byte_order + type_))
+        else:
+            fields.append((name + '_count', byte_order + count_type))
+            fields.append((name, byte_order + type_, (length,)))
+    return np.dtype(fields)
+
+def read_ply_binary(data, offset, count, properties, byte_order):
+    ''' (records, offset after them); lists of varying length are walked record by record. '''
+    lists = [p for p in properties if p[2] is not None]
+    length = 0
+    if lists and count:
+        # the first record's first list sets the length tried for all
+        before = ply_records(properties[:properties.index(lists[0])], 0, byte_order).itemsize
+        length = int(np.frombuffer(data, byte_order + lists[0][2], 1, offset + before)[0])
+    dtype = ply_records(properties, length, byte_order)
+    if offset + count * dtype.itemsize <= len(data):
+        records = np.frombuffer(data, dtype, count, offset)
+        if not lists or all((records[name + '_count'] == length).all() for name, _, _ in lists):
+            return records, offset + count * dtype.itemsize
+    if len(lists) != 1 or lists[0] is not properties[-1]:
+        raise RuntimeError('PLY lists of varying length are only read as the last property')
+
+    # polygons of mixed sizes: record by record
+    scalars = ply_records(properties[:-1], 0, byte_order)
+    name, type_, count_type = properties[-1]
+    count_dtype = np.dtype(byte_order + count_type)
+    item_dtype = np.dtype(byte_order + type_)
+    items, counts = [], []
+    for _ in range(count):
+        offset += scalars.itemsize
+        n = int(np.frombuffer(data, count_dtype, 1, offset)[0])
+        offset += count_dtype.itemsize
+        items.append(np.frombuffer(data, item_dtype, n, offset))
+        offset += n * item_dtype.itemsize
+        counts.append(n)
+    return {name: np.concatenate(items), name + '_count': np.array(counts)}, offset
+
+def read_ply_ascii(tokens, position, count, properties):
+    ''' (records, token position after them), same shape as read_ply_binary's. '''
+    lists = [p for p in properties if p[2] is not None]
+    if not lists:
+        width = len(properties)
+        table = np.array(tokens[position:position + count * width], dtype=np.float64).reshape(count, width)
+        return {name: table[:, i] for i, (name, _, _) in enumerate(properties)}, position + count * width
+    if len(lists) != 1 or lists[0] is not properties[-1]:
+        raise RuntimeError('PLY lists are only read as the last property')
+
+    name = lists[0][0]
+    scalars = len(properties) - 1
+    length = int(tokens[position + scalars]) if count else 0
+    width = scalars + 1 + length
+    table = np.array(tokens[position:position + count * width], dtype=np.float64)
+    if len(table) == count * width:
+        table = table.reshape(count, width)
+        if (table[:, scalars] == length).all():
+            return {name: table[:, scalars + 1:].astype(np.int64), name + '_count': table[:, scalars]}, position + count * width
+
+    # polygons of mixed sizes
+    items, counts = [], []
+    for _ in range(count):
+        position += scalars
+        n = int(tokens[position])
+        items.append(np.array(tokens[position + 1:position + 1 + n], dtype=np.int64))
+        counts.append(n)
+        position += 1 + n
+    return {name: np.concatenate(items), name + '_count': np.array(counts)}, position
+
+def record_fields(records):
+    ''' field names of read_ply_binary / read_ply_ascii records (structured array or dict) '''
+    return records.dtype.names if isinstance(records, np.ndarray) else tuple(records)
+
+def parse_ply(data):
+    ''' (attributes per vertex, triangles) of a PLY file's bytes; elements other than vertex and face are skipped. '''
+    format_, elements, offset = ply_header(data)
+    byte_order = '<' if format_ == 'binary_little_endian' else '>'
+    if format_ == 'ascii':
+        tokens = data[offset:].decode('ascii').split()
+        offset = 0
+
+    found = {}
+    for element, count, properties in elements:
+        if format_ == 'ascii':
+            records, offset = read_ply_ascii(tokens, offset, count, properties)
+        else:
+            records, offset = read_ply_binary(data, offset, count, properties, byte_order)
+        if element in ('vertex', 'face'):
+            found[element] = records
+
+    if 'vertex' not in found or 'face' not in found:
+        raise RuntimeError('PLY file without vertex or face element')
+    vertex, face = found['vertex'], found['face']
+
+    positions = np.stack([vertex['x'], vertex['y'], vertex['z']], axis=1).astype(np.float32)
+    names = [name for name in ('vertex_indices', 'vertex_index') if name in record_fields(face)]
+    if not names:
+        raise RuntimeError('PLY faces without vertex_indices')
+    counts = np.asarray(face[names[0] + '_count'], dtype=np.int64)
+    triangles = triangulate(np.asarray(face[names[0]], dtype=np.int64).reshape(-1), counts)
+
+    fields = record_fields(vertex)
+    attributes = collections.OrderedDict(position=positions)
+    if {'nx', 'ny', 'nz'} <= set(fields):
+        attributes['normal'] = np.stack([vertex['nx'], vertex['ny'], vertex['nz']], axis=1).astype(np.float32)
+    else:
+        attributes['normal'] = vertex_normals(positions, triangles)
+    for u, v in PLY_TEXCOORDS:
+        if u in fields and v in fields:
+            attributes['texcoord'] = np.stack([vertex[u], vertex[v]], axis=1).astype(np.float32)
+            break
+    if {'red', 'green', 'blue'} <= set(fields):
+        alpha = vertex['alpha'] if 'alpha' in fields else np.full(len(positions), 255)
+        attributes['color'] = np.stack([vertex['red'], vertex['green'], vertex['blue'], alpha], axis=1) / 255.0
+
+    return attributes, triangles
+
+def vertex_normals(positions, triangles):
+    ''' Area-weighted smooth normals. '''
+    a, b, c = (positions[triangles[:, i]] for i in range(3))
+    face = np.cross(b - a, c - a)
+    normals = np.zeros_like(positions, dtype=np.float64)
+    for i in range(3):
+        np.add.at(normals, triangles[:, i], face)
+    length = np.linalg.norm(normals, axis=1, keepdims=True)
+    return (normals / np.maximum(length, 1e-20)).astype(np.float32)
+
+def read(path):
+    ''' (attributes, triangles) as parsed, before welding. '''
+    with open(path, 'rb') as f:
+        data = f.read()
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.obj':
+        return parse_obj(data.decode('utf-8', errors='replace'))
+    if extension == '.ply':
+        return parse_ply(data)
+    raise RuntimeError('unknown model format %r (obj or ply)' % extension)
+
+def vertex_dtype(attributes):
+    fields = [('position', np.float32, 3), ('normal', np.float32, 3)]
+    if 'texcoord' in attributes:
+        fields.append(('texcoord', np.float32, 2))
+    if 'color' in attributes:
+        fields.append(('color', np.uint8, 4))
+    return vertex_layout.vertex_dtype(*fields)
+
+def weld(attributes, triangles):
+    ''' (vertices, triangles): one vertex per distinct attribute record, degenerate triangles dropped. '''
+    # -0.0 and 0.0 would not weld
+    values = {name: value + 0.0 for name, value in attributes.items()}
+    vertices = vertex_layout.pack(vertex_dtype(attributes), **values)
+    records = vertices.view(np.dtype((np.void, vertices.dtype.itemsize)))
+    _, first, remap = np.unique(records, return_index=True, return_inverse=True)
+    triangles = remap.reshape(-1)[triangles]
+    keep = (triangles[:, 0] != triangles[:, 1]) & (triangles[:, 1] != triangles[:, 2]) & (triangles[:, 0] != triangles[:, 2])
+    return vertices[first], triangles[keep]
+
+def optimize(triangles, vertex_count, cache_size=CACHE_SIZE):
+    ''' Triangles reordered for a FIFO post-transform cache of cache_size (Tipsify). '''
+    triangles = np.asarray(triangles)
+    flat = triangles.reshape(-1)
+    # vertex -> its triangles, as offsets into one list
+    adjacency = (np.argsort(flat, kind='stable') // 3).tolist()
+    starts = np.concatenate([[0], np.cumsum(np.bincount(flat, minlength=vertex_count))]).tolist()
+    live = np.bincount(flat, minlength=vertex_count).tolist()
+    corners = triangles.tolist()
+
+    cache_time = [0] * vertex_count
+    emitted = [False] * len(corners)
+    dead_end = []
+    order = []
+    stamp = cache_size + 1
+    cursor = 0
+
+    fanning = 0 if corners else -1
+    while fanning >= 0:
+        candidates = []
+        for t in adjacency[starts[fanning]:starts[fanning + 1]]:
+            if emitted[t]:
+                continue
+            emitted[t] = True
+            order.append(t)
+            for v in corners[t]:
+                dead_end.append(v)
+                candidates.append(v)
+                live[v] -= 1
+                if stamp - cache_time[v] > cache_size:
+                    cache_time[v] = stamp
+                    stamp += 1
+
+        # the candidate that stays in the cache longest and still has triangles
+        fanning, best = -1, -1
+        for v in candidates:
+            if live[v] > 0:
+                priority = 0
+                if stamp - cache_time[v] + 2 * live[v] <= cache_size:
+                    priority = stamp - cache_time[v]
+                if priority > best:
+                    fanning, best = v, priority
+        if fanning < 0:
+            while dead_end:
+                v = dead_end.pop()
+                if live[v] > 0:
+                    fanning = v
+                    break
+        if fanning < 0:
+            while cursor < vertex_count:
+                if live[cursor] > 0:
+                    fanning = cursor
+                    break
+                cursor += 1
+
+    return triangles[order]
+
+def reorder_vertices(vertices, triangles):
+    ''' Vertices in the order the triangles first use them (unused ones dropped), and the triangles remapped. '''
+    flat = triangles.reshape(-1)
+    used, first = np.unique(flat, return_index=True)
+    order = used[np.argsort(first)]
+    remap = np.empty(len(vertices), dtype=np.int64)
+    remap[order] = np.arange(len(order))
+    return vertices[order], remap[flat].reshape(triangles.shape)
+
+def index_dtype(vertex_count):
+    return np.uint16 if vertex_count <= 65536 else np.uint32
+
+def acmr(indices, cache_size=CACHE_SIZE):
+    ''' Vertex shader runs per triangle with a FIFO cache of cache_size entries. '''
+    cache = collections.deque()
+    cached = set()
+    misses = 0
+    for v in np.asarray(indices).reshape(-1).tolist():
+        if v not in cached:
+            misses += 1
+            if len(cache) == cache_size:
+                cached.discard(cache.popleft())
+            cache.append(v)
+            cached.add(v)
+    return misses / max(np.asarray(indices).size // 3, 1)
+
+def load(path, optimize_cache=True, cache_size=CACHE_SIZE):
+    ''' (vertices, indices): structured vertex array and flat uint16/uint32 indices. '''
+    attributes, triangles = read(path)
+    vertices, triangles = weld(attributes, triangles)
+    if optimize_cache:
+        triangles = optimize(triangles, len(vertices), cache_size)
+    vertices, triangles = reorder_vertices(vertices, triangles)
+    return vertices, triangles.reshape(-1).astype(index_dtype(len(vertices)))
+
+
+def torus(rings, sides, major=1.0, minor=0.4):
+    ''' (positions, triangles) of a torus grid. '''
+    u, v = np.meshgrid(np.linspace(0, 2 * np.pi, rings, endpoint=False), np.linspace(0, 2 * np.pi, sides, endpoint=False), indexing='ij')
+    positions = np.stack([
+        (major + minor * np.cos(v)) * np.cos(u),
+        (major + minor * np.cos(v)) * np.sin(u),
+        minor * np.sin(v),
+    ], axis=-1).reshape(-1, 3).astype(np.float32)
+    i, j = np.meshgrid(np.arange(rings), np.arange(sides), indexing='ij')
+    a = i * sides + j
+    b = ((i + 1) % rings) * sides + j
+    c = ((i + 1) % rings) * sides + (j + 1) % sides
+    d = i * sides + (j + 1) % sides
+    triangles = np.concatenate([np.stack([a, b, c], -1).reshape(-1, 3), np.stack([a, c, d], -1).reshape(-1, 3)])
+    return positions, triangles
+
+def write_soup(path, positions, triangles, rng):
+    ''' OBJ with every triangle's corners written out separately, in random order: work for the welder and the optimiser. '''
+    triangles = triangles[rng.permutation(len(triangles))]
+    with open(path, 'w') as f:
+        np.savetxt(f, positions[triangles.reshape(-1)], fmt='v %.6f %.6f %.6f')
+        np.savetxt(f, np.arange(1, triangles.size + 1).reshape(-1, 3), fmt='f %d %d %d')
+
+def benchmark(paths, cache_size):
+    print('%-24s %10s %18s %6s %10s %9s %9s %9s %9s %7s %7s' % (
+        'model', 'triangles', 'vertices read/used', 'index', 'MB (soup)',
+        'parse ms', 'weld ms', 'order ms', 'total ms', 'ACMR', 'after'))
+    for path in paths:
+        start = time.perf_counter()
+        attributes, triangles = read(path)
+        parsed = time.perf_counter()
+        corner_count = len(attributes['position'])
+        vertices, triangles = weld(attributes, triangles)
+        welded = time.perf_counter()
+        before = acmr(triangles, cache_size)
+        timed = time.perf_counter()
+        optimized = optimize(triangles, len(vertices), cache_size)
+        vertices, optimized = reorder_vertices(vertices, optimized)
+        indices = optimized.reshape(-1).astype(index_dtype(len(vertices)))
+        ordered = time.perf_counter()
+        after = acmr(indices, cache_size)
+
+        soup = len(triangles) * 3 * (vertices.dtype.itemsize + 4)
+        print('%-24s %10d %18s %6s %10s %9.1f %9.1f %9.1f %9.1f %7.3f %7.3f' % (
+            os.path.basename(path)[:24], len(triangles), '%d/%d' % (corner_count, len(vertices)),
+            indices.dtype.name, '%.1f (%.1f)' % ((vertices.nbytes + indices.nbytes) / 2**20, soup / 2**20),
+            (parsed - start) * 1000, (welded - parsed) * 1000, (ordered - timed) * 1000,
+            (ordered - start - (timed - welded)) * 1000, before, after))
+
+if __name__ == '__main__':
+    import argparse
+    import tempfile
+    parser = argparse.ArgumentParser(description='Load time, memory and vertex cache efficiency of OBJ/PLY models.')
+    parser.add_argument('paths', nargs='*', help='models; a generated torus soup if none')
+    parser.add_argument('--rings', type=int, default=512, help='generated torus: rings x sides x 2 triangles')
+    parser.add_argument('--sides', type=int, default=512)
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE, help='FIFO post-transform cache entries')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = args.paths
+        if not paths:
+            paths = [os.path.join(directory, 'torus%dx%d.obj' % (args.rings, args.sides))]
+            write_soup(paths[0], *torus(args.rings, args.sides), np.random.default_rng(0))
+        benchmark(paths, args.cache_size)
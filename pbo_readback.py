@@ -0,0 +1,195 @@
+'''
+## Asynchronous readback
+
+glReadPixels into client memory waits until the GPU has finished the frame.
+Reading into a GL_PIXEL_PACK_BUFFER instead only queues a copy; a fence is
+inserted behind it and the buffer is mapped N-1 frames later, by which time
+the copy has normally finished. With a ring of N buffers the CPU gets frame
+k while frame k+N-1 is being drawn.
+
+    readback = pbo_readback.PixelReadback(width, height, depth=3)
+    while ...:
+        draw_frame()
+        frame = readback.read()    # frame from depth-1 reads ago, or None
+        if frame is not None:
+            ...                    # NumPy view, valid until the next read()
+        swap / present
+    for frame in readback.finish():
+        ...
+
+Frames are bottom row first (GL order), like HeadlessContext.read_pixels.
+
+    python pbo_readback.py    # synchronous vs PBO ring, headless glsl_py12.py
+
+[Pixel Buffer Object - OpenGL Wiki](https://www.khronos.org/opengl/wiki/Pixel_Buffer_Object)
+[Sync Object - OpenGL Wiki](https://www.khronos.org/opengl/wiki/Sync_Object)
+'''
+
+import ctypes
+import time
+
+if __name__ == '__main__':
+    import headless
+
+from OpenGL.GL import *
+import numpy as np
+
+
+FORMAT_COMPONENTS = {GL_RGBA: 4, GL_BGRA: 4, GL_RGB: 3, GL_BGR: 3, GL_RED: 1}
+
+# how long to wait for a fence that is not signalled yet, in ns
+WAIT_TIMEOUT = 1000000000
+
+
+def mapped_view(pointer, shape):
+    ''' uint8 NumPy array over memory returned by glMapBufferRange '''
+    address = pointer if isinstance(pointer, int) else ctypes.cast(pointer, ctypes.c_void_p).value
+    if not address:
+        raise RuntimeError('glMapBufferRange failed')
+    size = int(np.prod(shape))
+    return np.frombuffer((ctypes.c_ubyte * size).from_address(address), dtype=np.uint8).reshape(shape)
+
+
+class PixelReadback:
+
+    def __init__(self, width, height, depth=3, pixel_format=GL_RGBA):
+        if depth < 2:
+            raise RuntimeError('a readback ring needs at least 2 buffers')
+
+        self.width = width
+        self.height = height
+        self.depth = depth
+        self.pixel_format = pixel_format
+        self.components = FORMAT_COMPONENTS[pixel_format]
+        self.size = width * height * self.components
+
+        self.buffers = [int(b) for b in np.atleast_1d(glGenBuffers(depth))]
+        for buffer in self.buffers:
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, buffer)
+            glBufferData(GL_PIXEL_PACK_BUFFER, self.size, None, GL_STREAM_READ)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+
+        self.fences = [None] * depth
+        self.index = 0          # slot the next read() writes
+        self.mapped = None      # slot handed out by the last read()
+
+        # fences that had not signalled when their frame was due
+        self.stalls = 0
+        self.frames = 0
+
+    def _unmap(self):
+        if self.mapped is not None:
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, self.buffers[self.mapped])
+            glUnmapBuffer(GL_PIXEL_PACK_BUFFER)
+            self.mapped = None
+
+    def _map(self, slot):
+        ''' Wait for the slot's fence and map it as a read-only NumPy view. '''
+        fence = self.fences[slot]
+        if glClientWaitSync(fence, 0, 0) not in (GL_ALREADY_SIGNALED, GL_CONDITION_SATISFIED):
+            self.stalls += 1
+            if glClientWaitSync(fence, GL_SYNC_FLUSH_COMMANDS_BIT, WAIT_TIMEOUT) == GL_WAIT_FAILED:
+                raise RuntimeError('glClientWaitSync failed')
+        glDeleteSync(fence)
+        self.fences[slot] = None
+
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, self.buffers[slot])
+        pointer = glMapBufferRange(GL_PIXEL_PACK_BUFFER, 0, self.size, GL_MAP_READ_BIT)
+        frame = mapped_view(pointer, (self.height, self.width, self.components))
+        self.mapped = slot
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+
+        frame.flags.writeable = False
+        return frame
+
+    def read(self):
+        '''
+        Queue a copy of the current read framebuffer and return the frame queued
+        depth-1 calls ago (None until the ring has filled).
+        '''
+        # the slot we are about to overwrite is the one handed out last time
+        self._unmap()
+
+        slot = self.index
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, self.buffers[slot])
+        glPixelStorei(GL_PACK_ALIGNMENT, 1)
+        glReadPixels(0, 0, self.width, self.height, self.pixel_format, GL_UNSIGNED_BYTE, ctypes.c_void_p(0))
+        self.fences[slot] = glFenceSync(GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+
+        self.index = (slot + 1) % self.depth
+        if self.fences[self.index] is None:
+            return None
+        self.frames += 1
+        return self._map(self.index)
+
+    def finish(self):
+        ''' Copies of the frames still in flight, oldest first. '''
+        self._unmap()
+        frames = []
+        for i in range(self.depth):
+            slot = (self.index + i) % self.depth
+            if self.fences[slot] is not None:
+                frames.append(self._map(slot).copy())
+                self._unmap()
+                self.frames += 1
+        return frames
+
+    def delete(self):
+        self._unmap()
+        for fence in self.fences:
+            if fence is not None:
+                glDeleteSync(fence)
+        self.fences = [None] * self.depth
+        glDeleteBuffers(len(self.buffers), self.buffers)
+        self.buffers = []
+
+
+def benchmark(sizes, depths, frames):
+    import glsl_py12
+
+    results = []
+    for size in sizes:
+        context = headless.create_context(size, size)
+        glsl_py12.init_texture()
+        glsl_py12.init_shader()
+        glsl_py12.init_vao()
+        glsl_py12.init_params()
+        glsl_py12.set_params(glsl_py12.DEFAULT_K, (size, size), (size / 2, size / 2))
+
+        glsl_py12.draw_frame()
+        context.read_pixels()
+
+        start = time.perf_counter()
+        for _ in range(frames):
+            glsl_py12.draw_frame()
+            frame = context.read_pixels()
+        sync_time = (time.perf_counter() - start) / frames
+        results.append((size, 'sync', sync_time, 0))
+
+        for depth in depths:
+            readback = PixelReadback(size, size, depth)
+            start = time.perf_counter()
+            for _ in range(frames):
+                glsl_py12.draw_frame()
+                frame = readback.read()
+            readback.finish()
+            elapsed = (time.perf_counter() - start) / frames
+            results.append((size, 'pbo x%d' % depth, elapsed, readback.stalls))
+            readback.delete()
+
+        context.destroy()
+
+    print('%6s %8s %12s %12s %8s' % ('size', 'readback', 'ms/frame', 'frames/sec', 'stalls'))
+    for size, label, t, stalls in results:
+        print('%6d %8s %12.3f %12.1f %8d' % (size, label, t * 1000, 1 / t, stalls))
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Synchronous glReadPixels vs a PBO ring, on the glsl_py12.py fisheye.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1024, 2048])
+    parser.add_argument('--depths', type=int, nargs='+', default=[2, 3, 4])
+    parser.add_argument('--frames', type=int, default=200)
+    args = parser.parse_args()
+
+    benchmark(args.sizes, args.depths, args.frames)
@@ -0,0 +1,388 @@
+'''
+## Post-processing chain
+
+A graph of full-screen passes (undistort -> colour correct -> sharpen ->
+downscale, ...). Every pass but the last renders into an intermediate
+texture + framebuffer taken from a pool keyed by (width, height, format).
+A target goes back to the pool as soon as the last pass reading it has been
+drawn, so the next pass of the same size and format reuses it: for a chain
+that is ping-pong between two targets, and in general GPU memory is bounded
+by the graph's peak live set rather than its number of passes.
+
+Pass shaders get the vertex shader below: vTexCoord 0..1 over the target
+(bottom row first, as intermediate targets are stored), vFragmentPosition
+-1..1 as in glsl_py9-12. Inputs are bound to units 0, 1, ... as `vTexture`,
+`vTexture1`, ...; `vTexelSize` is 1 / the size of the first input.
+
+    graph = postprocess.PassGraph()
+    graph.add('undistort', glsl_py12.fragment_shader_text, size=(S, S))
+    graph.add('color', postprocess.color_correct_shader_text, uniforms={'vSaturation': 1.2})
+    graph.add('sharpen', postprocess.sharpen_shader_text)
+    graph.add('downscale', postprocess.downscale_shader_text, scale=0.5)
+    graph.run(texture, (width, height), framebuffer=0, viewport=(0, 0, w, h))
+
+    python postprocess.py                  # per-pass time and target memory, headless
+    python glsl_py12.py --chain            # the chain above on the fisheye scene
+
+[OpenGL - Framebuffers](https://open.gl/framebuffers)
+[FrameGraph: Extensible Rendering Architecture in Frostbite (GDC 2017)](https://www.gdcvault.com/play/1024612/FrameGraph-Extensible-Rendering-Architecture-in)
+'''
+
+import collections
+import time
+
+if __name__ == '__main__':
+    import headless
+
+from OpenGL.GL import *
+import numpy as np
+
+import frame_profiler
+import gl_program
+import gl_state
+import program_cache
+import texture_manager
+
+
+# bytes per texel of the formats targets are made in
+FORMAT_BYTES = {
+    GL_RGBA8: 4,
+    GL_RGBA16F: 8,
+    GL_RGBA32F: 16,
+    GL_R8: 1,
+    GL_RG16F: 4,
+}
+
+vertex_shader_text = '''
+#version 410 core
+
+out vec2 vTexCoord;
+out vec3 vFragmentPosition;
+
+void main(void) {
+    // one triangle over the whole target, no vertex buffer
+    vec2 p = vec2((gl_VertexID << 1) & 2, gl_VertexID & 2);
+    vTexCoord = p;
+    vFragmentPosition = vec3(p * 2.0 - 1.0, 0.0);
+    gl_Position = vec4(p * 2.0 - 1.0, 0.0, 1.0);
+}
+'''
+
+color_correct_shader_text = '''
+#version 410 core
+
+uniform sampler2D vTexture;
+uniform float vExposure;      // stops
+uniform float vContrast;
+uniform float vSaturation;
+uniform float vGamma;
+in vec2 vTexCoord;
+out vec4 flagColor;
+
+void main(void) {
+    vec4 color = texture(vTexture, vTexCoord);
+    vec3 c = color.rgb * exp2(vExposure);
+    c = (c - 0.5) * vContrast + 0.5;
+    float luma = dot(c, vec3(0.2126, 0.7152, 0.0722));
+    c = mix(vec3(luma), c, vSaturation);
+    flagColor = vec4(pow(clamp(c, 0.0, 1.0), vec3(1.0 / vGamma)), color.a);
+}
+'''
+
+COLOR_CORRECT_DEFAULTS = {'vExposure': 0.0, 'vContrast': 1.1, 'vSaturation': 1.2, 'vGamma': 1.0}
+
+sharpen_shader_text = '''
+#version 410 core
+
+uniform sampler2D vTexture;
+uniform vec2 vTexelSize;
+uniform float vAmount;
+in vec2 vTexCoord;
+out vec4 flagColor;
+
+void main(void) {
+    // unsharp mask with the 4 direct neighbours
+    vec4 center = texture(vTexture, vTexCoord);
+    vec4 blur = (texture(vTexture, vTexCoord + vec2(vTexelSize.x, 0.0))
+               + texture(vTexture, vTexCoord - vec2(vTexelSize.x, 0.0))
+               + texture(vTexture, vTexCoord + vec2(0.0, vTexelSize.y))
+               + texture(vTexture, vTexCoord - vec2(0.0, vTexelSize.y))) * 0.25;
+    flagColor = clamp(center + (center - blur) * vAmount, 0.0, 1.0);
+}
+'''
+
+SHARPEN_DEFAULTS = {'vAmount': 0.8}
+
+downscale_shader_text = '''
+#version 410 core
+
+uniform sampler2D vTexture;
+uniform vec2 vTexelSize;
+in vec2 vTexCoord;
+out vec4 flagColor;
+
+void main(void) {
+    // 4 bilinear taps between texels: a 4x4 box for a 2x reduction
+    vec2 d = vTexelSize;
+    flagColor = (texture(vTexture, vTexCoord + vec2(-d.x, -d.y))
+               + texture(vTexture, vTexCoord + vec2(d.x, -d.y))
+               + texture(vTexture, vTexCoord + vec2(-d.x, d.y))
+               + texture(vTexture, vTexCoord + vec2(d.x, d.y))) * 0.25;
+}
+'''
+
+
+class RenderTarget:
+
+    def __init__(self, width, height, internal_format=GL_RGBA8):
+        self.width = width
+        self.height = height
+        self.internal_format = internal_format
+        self.bytes = width * height * FORMAT_BYTES.get(internal_format, 4)
+
+        self.texture = glGenTextures(1)
+        gl_state.bind_texture(GL_TEXTURE_2D, self.texture, unit=GL_TEXTURE0)
+        texture_manager.allocate(width, height, 1, internal_format)
+        gl_state.tex_parameter(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        gl_state.tex_parameter(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        gl_state.tex_parameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+        gl_state.tex_parameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+
+        self.framebuffer = glGenFramebuffers(1)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.framebuffer)
+        glFramebufferTexture2D(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_TEXTURE_2D, self.texture, 0)
+        status = glCheckFramebufferStatus(GL_FRAMEBUFFER)
+        if status != GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError('Render target framebuffer is not complete: 0x%x' % status)
+
+    def delete(self):
+        glDeleteFramebuffers(1, [self.framebuffer])
+        gl_state.delete_texture(self.texture)
+
+
+class TargetPool:
+    ''' Render targets by (width, height, format); released ones are handed out again. '''
+
+    def __init__(self):
+        self.free = collections.defaultdict(list)
+        self.targets = []
+        self.allocations = 0
+        self.reuses = 0
+
+    def acquire(self, width, height, internal_format=GL_RGBA8):
+        free = self.free[(width, height, internal_format)]
+        if free:
+            self.reuses += 1
+            return free.pop()
+        target = RenderTarget(width, height, internal_format)
+        self.targets.append(target)
+        self.allocations += 1
+        return target
+
+    def release(self, target):
+        self.free[(target.width, target.height, target.internal_format)].append(target)
+
+    def allocated_bytes(self):
+        return sum(target.bytes for target in self.targets)
+
+    def delete(self):
+        for target in self.targets:
+            target.delete()
+        self.targets = []
+        self.free.clear()
+
+
+class Pass:
+
+    def __init__(self, name, fragment_shader_text, inputs, size, scale, internal_format, uniforms):
+        self.name = name
+        self.inputs = inputs
+        self.size = size
+        self.scale = scale
+        self.internal_format = internal_format
+        self.uniforms = dict(uniforms or {})
+
+        self.program = program_cache.create_program(vertex_shader_text, fragment_shader_text)
+        self.shader = gl_program.Program(self.program)
+
+    def output_size(self, input_size):
+        if self.size is not None:
+            return tuple(self.size)
+        return max(int(input_size[0] * self.scale), 1), max(int(input_size[1] * self.scale), 1)
+
+
+class PassGraph:
+
+    def __init__(self, pool=None):
+        self.pool = pool or TargetPool()
+        self.passes = []
+        # the full-screen triangle has no attributes, but core profiles need a VAO bound
+        self.vao = glGenVertexArrays(1)
+
+    def add(self, name, fragment_shader_text, inputs=None, size=None, scale=1.0, internal_format=GL_RGBA8, uniforms=None):
+        '''
+        inputs are names of earlier passes or 'source' (default: the previous
+        pass, or the source for the first). The output is `size`, else the
+        first input's size times `scale`. Returns the Pass.
+        '''
+        names = {p.name for p in self.passes} | {'source'}
+        if name in names:
+            raise RuntimeError('pass %r already exists' % name)
+        if inputs is None:
+            inputs = [self.passes[-1].name if self.passes else 'source']
+        for input_name in inputs:
+            if input_name not in names:
+                raise RuntimeError('pass %r reads %r, which is not an earlier pass' % (name, input_name))
+
+        render_pass = Pass(name, fragment_shader_text, list(inputs), size, scale, internal_format, uniforms)
+        self.passes.append(render_pass)
+        return render_pass
+
+    def last_uses(self):
+        ''' pass index after which each output is no longer read '''
+        last = {}
+        for index, render_pass in enumerate(self.passes):
+            for input_name in render_pass.inputs:
+                last[input_name] = index
+        return last
+
+    def sizes(self, source_size):
+        sizes = {'source': tuple(source_size)}
+        for render_pass in self.passes:
+            sizes[render_pass.name] = render_pass.output_size(sizes[render_pass.inputs[0]])
+        return sizes
+
+    def peak_bytes(self, source_size):
+        '''
+        Target memory the graph needs at once, and what one target per pass
+        would take; the last pass is taken to draw into a framebuffer.
+        '''
+        sizes = self.sizes(source_size)
+        last = self.last_uses()
+        live, peak, total = {}, 0, 0
+        for index, render_pass in enumerate(self.passes[:-1]):
+            width, height = sizes[render_pass.name]
+            live[render_pass.name] = width * height * FORMAT_BYTES.get(render_pass.internal_format, 4)
+            total += live[render_pass.name]
+            peak = max(peak, sum(live.values()))
+            for input_name in render_pass.inputs:
+                if last.get(input_name) == index:
+                    live.pop(input_name, None)
+            if render_pass.name not in last:
+                live.pop(render_pass.name)
+        return peak, total
+
+    def run(self, source, source_size, framebuffer=None, viewport=None, profiler=None):
+        '''
+        Draws every pass. With a framebuffer the last pass goes there (into
+        viewport, default its size); without, its pooled target is returned
+        and the caller releases it to graph.pool. With a profiler each pass
+        is a section (CPU and GPU time) named after it; not inside another
+        GPU section, timer queries do not nest.
+        '''
+        profiler = profiler or frame_profiler.NullProfiler()
+        textures = {'source': source}
+        sizes = {'source': tuple(source_size)}
+        targets = {}
+        last = self.last_uses()
+
+        gl_state.bind_vertex_array(self.vao)
+        for index, render_pass in enumerate(self.passes):
+            width, height = render_pass.output_size(sizes[render_pass.inputs[0]])
+            final = index == len(self.passes) - 1
+
+            if final and framebuffer is not None:
+                glBindFramebuffer(GL_FRAMEBUFFER, framebuffer)
+                glViewport(*(viewport or (0, 0, width, height)))
+            else:
+                target = self.pool.acquire(width, height, render_pass.internal_format)
+                targets[render_pass.name] = target
+                glBindFramebuffer(GL_FRAMEBUFFER, target.framebuffer)
+                glViewport(0, 0, width, height)
+
+            with profiler.section(render_pass.name, gpu=True):
+                gl_state.use_program(render_pass.program)
+                for unit, input_name in enumerate(render_pass.inputs):
+                    gl_state.bind_texture(GL_TEXTURE_2D, textures[input_name], unit=GL_TEXTURE0 + unit)
+                    render_pass.shader.set_uniform('vTexture%s' % (unit or ''), unit)
+                first_width, first_height = sizes[render_pass.inputs[0]]
+                render_pass.shader.set_uniform('vTexelSize', (1.0 / first_width, 1.0 / first_height))
+                for name, value in render_pass.uniforms.items():
+                    render_pass.shader.set_uniform(name, value)
+                glDrawArrays(GL_TRIANGLES, 0, 3)
+
+            sizes[render_pass.name] = (width, height)
+            if render_pass.name in targets:
+                textures[render_pass.name] = targets[render_pass.name].texture
+            # read for the last time: free for the passes still to come
+            for input_name in render_pass.inputs:
+                if last.get(input_name) == index and input_name in targets:
+                    self.pool.release(targets.pop(input_name))
+            # read by no pass at all: otherwise a new target would be taken every frame
+            if not final and render_pass.name not in last:
+                self.pool.release(targets.pop(render_pass.name))
+
+        return targets.get(self.passes[-1].name)
+
+    def delete(self):
+        for render_pass in self.passes:
+            render_pass.shader.delete()
+        gl_state.delete_vertex_array(self.vao)
+        self.pool.delete()
+
+
+def fisheye_chain(size, downscale=True, pool=None):
+    ''' glsl_py12's undistort (FisheyeParams block bound), colour correct, sharpen and a 2x downscale. '''
+    import glsl_py12
+
+    graph = PassGraph(pool)
+    undistort = graph.add('undistort', glsl_py12.fragment_shader_text, size=size)
+    glsl_py12.bind_params_block(undistort.program)
+    graph.add('color', color_correct_shader_text, uniforms=COLOR_CORRECT_DEFAULTS)
+    graph.add('sharpen', sharpen_shader_text, uniforms=SHARPEN_DEFAULTS)
+    if downscale:
+        graph.add('downscale', downscale_shader_text, scale=0.5)
+    return graph
+
+def benchmark(size, frames):
+    import glsl_py12
+
+    context = headless.create_context(size // 2, size // 2)
+
+    img = np.random.randint(0, 256, (size, size, 3), dtype=np.uint8)
+    source = texture_manager.create(img, wrap=GL_CLAMP_TO_BORDER)
+
+    graph = fisheye_chain((size, size))
+    glsl_py12.init_params(graph.passes[0].program)
+    glsl_py12.set_params(glsl_py12.DEFAULT_K, (size, size), (size / 2, size / 2))
+
+    profiler = frame_profiler.FrameProfiler(queries=4 * len(graph.passes))
+    start = time.perf_counter()
+    for _ in range(frames):
+        graph.run(source, (size, size), framebuffer=context.framebuffer, viewport=(0, 0, size // 2, size // 2), profiler=profiler)
+        context.present()
+        profiler.end_frame()
+        gl_state.end_frame()
+    glFinish()
+    elapsed = (time.perf_counter() - start) / frames
+
+    peak, total = graph.peak_bytes((size, size))
+    print('%d passes on %dx%d, %d frames' % (len(graph.passes), size, size, frames))
+    profiler.report()
+    print('Frame : %.3f ms' % (elapsed * 1000))
+    print('Targets : %d allocated, %d reuses, %.1f MB (peak live set %.1f MB, one per pass %.1f MB)' % (
+        graph.pool.allocations, graph.pool.reuses, graph.pool.allocated_bytes() / 2**20, peak / 2**20, total / 2**20))
+
+    profiler.delete()
+    graph.delete()
+    gl_state.delete_texture(source)
+    context.destroy()
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Per-pass timing and render target memory of the post-processing chain.')
+    parser.add_argument('--size', type=int, default=2048, help='input and undistorted image are size x size')
+    parser.add_argument('--frames', type=int, default=100)
+    args = parser.parse_args()
+
+    benchmark(args.size, args.frames)
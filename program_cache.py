@@ -0,0 +1,236 @@
+'''
+## Program binary cache
+
+Links a shader program once and keeps the driver's binary on disk. The key
+hashes the vertex and fragment source, the #defines and the driver's
+vendor/renderer/version strings; on a hit the program is restored with
+glProgramBinary, and if the driver rejects the binary (driver update,
+different GPU) it silently falls back to compiling from source.
+
+    program = program_cache.create_program(vertex_shader_text, fragment_shader_text)
+    program = program_cache.create_compute_program(compute_shader_text, defines)    # GL 4.3+
+
+    python program_cache.py    # cold vs warm startup
+
+Cache directory: $PROGRAM_CACHE or ~/.cache/pyopengltest/programs
+
+Mesa keeps its own shader cache; set MESA_SHADER_CACHE_DISABLE=true to see
+the real cold numbers.
+
+[Shader Compilation - OpenGL Wiki (Binary upload)](https://www.khronos.org/opengl/wiki/Shader_Compilation#Binary_upload)
+'''
+
+import hashlib
+import os
+import struct
+import time
+
+if __name__ == '__main__':
+    import headless
+
+from OpenGL.GL import *
+from OpenGL.error import GLError
+import numpy as np
+
+
+cache_dir = os.environ.get(
+    'PROGRAM_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'pyopengltest', 'programs'),
+)
+
+stats = {'hits': 0, 'misses': 0, 'rejected': 0}
+
+
+def apply_defines(src, defines):
+    ''' Insert #define lines right after the #version line. '''
+    if not defines:
+        return src
+    lines = ['#define %s %s' % (name, value) for name, value in sorted(defines.items())]
+    head, sep, tail = src.lstrip().partition('\n')
+    if head.startswith('#version'):
+        return head + sep + '\n'.join(lines) + '\n' + tail
+    return '\n'.join(lines) + '\n' + src
+
+def program_key(vertex_shader_src, fragment_shader_src, defines=None, geometry_shader_src=None):
+    stages = [('vertex', vertex_shader_src), ('fragment', fragment_shader_src)]
+    if geometry_shader_src:
+        stages.append(('geometry', geometry_shader_src))
+    return _key(stages, defines)
+
+def compute_program_key(compute_shader_src, defines=None):
+    return _key([('compute', compute_shader_src)], defines)
+
+def _key(stages, defines):
+    ''' stages are (stage name, source); the names keep programs of different stages apart. '''
+    h = hashlib.sha256()
+    for name in (GL_VENDOR, GL_RENDERER, GL_VERSION):
+        h.update(glGetString(name) or b'')
+        h.update(b'\0')
+    for stage, src in stages:
+        h.update(('%s\0%s\0' % (stage, src)).encode('utf-8'))
+    for name, value in sorted((defines or {}).items()):
+        h.update(('%s=%s\0' % (name, value)).encode('utf-8'))
+    return h.hexdigest()
+
+def compile_program(vertex_shader_src, fragment_shader_src, defines=None, retrievable=False, geometry_shader_src=None):
+    stages = [(GL_VERTEX_SHADER, vertex_shader_src), (GL_FRAGMENT_SHADER, fragment_shader_src)]
+    if geometry_shader_src:
+        stages.append((GL_GEOMETRY_SHADER, geometry_shader_src))
+    return link_program(stages, defines, retrievable)
+
+def compile_compute_program(compute_shader_src, defines=None, retrievable=False):
+    ''' GL 4.3+ '''
+    return link_program([(GL_COMPUTE_SHADER, compute_shader_src)], defines, retrievable)
+
+def link_program(stages, defines=None, retrievable=False):
+    ''' stages: [(shader type, source)] '''
+    program = glCreateProgram()
+    for shader_type, src in stages:
+        shader = glCreateShader(shader_type)
+        glShaderSource(shader, apply_defines(src, defines))
+        glCompileShader(shader)
+        if not glGetShaderiv(shader, GL_COMPILE_STATUS):
+            log = glGetShaderInfoLog(shader)
+            glDeleteShader(shader)
+            glDeleteProgram(program)
+            raise RuntimeError(log)
+        glAttachShader(program, shader)
+        glDeleteShader(shader)
+
+    if retrievable:
+        glProgramParameteri(program, GL_PROGRAM_BINARY_RETRIEVABLE_HINT, GL_TRUE)
+
+    glLinkProgram(program)
+    if not glGetProgramiv(program, GL_LINK_STATUS):
+        log = glGetProgramInfoLog(program)
+        glDeleteProgram(program)
+        raise RuntimeError(log)
+    return program
+
+def binary_supported():
+    return glGetIntegerv(GL_NUM_PROGRAM_BINARY_FORMATS) > 0
+
+def save_binary(program, path):
+    length = glGetProgramiv(program, GL_PROGRAM_BINARY_LENGTH)
+    if not length:
+        return
+    binary = np.empty(length, dtype=np.uint8)
+    written = np.zeros(1, dtype=np.int32)
+    binary_format = np.zeros(1, dtype=np.uint32)
+    glGetProgramBinary(program, length, written, binary_format, binary)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(struct.pack('<I', int(binary_format[0])))
+        f.write(binary[:int(written[0])].tobytes())
+    os.replace(tmp_path, path)
+
+def load_binary(path):
+    ''' Program restored from the cache file, or None if the driver rejects it. '''
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) <= 4:
+        return None
+    binary_format, = struct.unpack('<I', data[:4])
+    binary = np.frombuffer(data, dtype=np.uint8, offset=4)
+
+    program = glCreateProgram()
+    try:
+        glProgramBinary(program, binary_format, binary, binary.size)
+    except GLError:
+        glDeleteProgram(program)
+        return None
+    if not glGetProgramiv(program, GL_LINK_STATUS):
+        glDeleteProgram(program)
+        return None
+    return program
+
+def create_program(vertex_shader_src, fragment_shader_src, defines=None, geometry_shader_src=None):
+    def build(retrievable):
+        return compile_program(vertex_shader_src, fragment_shader_src, defines, retrievable, geometry_shader_src)
+    if not binary_supported():
+        return _cached(None, build)
+    return _cached(program_key(vertex_shader_src, fragment_shader_src, defines, geometry_shader_src), build)
+
+def create_compute_program(compute_shader_src, defines=None):
+    def build(retrievable):
+        return compile_compute_program(compute_shader_src, defines, retrievable)
+    if not binary_supported():
+        return _cached(None, build)
+    return _cached(compute_program_key(compute_shader_src, defines), build)
+
+def _cached(key, build):
+    ''' Program restored from the binary under key, else build(retrievable) and saved there. '''
+    if key is None:
+        stats['misses'] += 1
+        return build(False)
+
+    path = os.path.join(cache_dir, key + '.bin')
+    if os.path.exists(path):
+        program = load_binary(path)
+        if program is not None:
+            stats['hits'] += 1
+            return program
+        stats['rejected'] += 1
+        os.remove(path)
+
+    stats['misses'] += 1
+    program = build(True)
+    try:
+        save_binary(program, path)
+    except (GLError, OSError) as e:
+        print('Could not cache program binary :', e)
+    return program
+
+def clear_cache():
+    if not os.path.isdir(cache_dir):
+        return
+    for name in os.listdir(cache_dir):
+        if name.endswith('.bin'):
+            os.remove(os.path.join(cache_dir, name))
+
+
+def benchmark(repeat):
+    import glsl_py12
+    import fisheye_lut
+
+    context = headless.create_context(64, 64)
+    print('Program binary formats :', glGetIntegerv(GL_NUM_PROGRAM_BINARY_FORMATS))
+
+    programs = {
+        'glsl_py12': (glsl_py12.vertex_shader_text, glsl_py12.fragment_shader_text),
+        'fisheye_lut bake': (fisheye_lut.bake_vertex_shader_text, fisheye_lut.bake_fragment_shader_text),
+    }
+
+    print('%-20s %12s %12s' % ('program', 'cold ms', 'warm ms'))
+    for name, (vertex_shader_src, fragment_shader_src) in programs.items():
+        cold_times = []
+        warm_times = []
+        for _ in range(repeat):
+            clear_cache()
+
+            start = time.perf_counter()
+            program = create_program(vertex_shader_src, fragment_shader_src)
+            glFinish()
+            cold_times.append(time.perf_counter() - start)
+            glDeleteProgram(program)
+
+            start = time.perf_counter()
+            program = create_program(vertex_shader_src, fragment_shader_src)
+            glFinish()
+            warm_times.append(time.perf_counter() - start)
+            glDeleteProgram(program)
+
+        print('%-20s %12.2f %12.2f' % (name, min(cold_times) * 1000, min(warm_times) * 1000))
+
+    print('Cache hits %(hits)d, misses %(misses)d, rejected %(rejected)d' % stats)
+    context.destroy()
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Cold vs warm program creation time.')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    benchmark(args.repeat)
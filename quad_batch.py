@@ -0,0 +1,229 @@
+'''
+## Instanced quad batch
+
+Draws any number of quads (sprites) with one glDrawElementsInstanced. The
+unit quad of glsl_py6/glsl_py8 (4 corners, 6 uint16 indices) lives in a
+static buffer; position, size, rotation, colour and texture rectangle of
+every quad go into an instance buffer (vertex attribute divisor 1) that is
+re-filled each frame from a NumPy structured array. The buffer is orphaned
+before the update, so the driver never waits for last frame's draw.
+
+    batch = quad_batch.QuadBatch(texture=texture_manager.load('lena.png', mipmaps=True))
+    quads = quad_batch.quads(10000)
+    quads['position'] = ...    # pixels, quad centre
+    quads['size'] = ...        # pixels
+    quads['angle'] = ...       # radians
+    quads['color'] = ...       # RGBA bytes, multiplies the texture
+    quads['rect'] = ...        # u0 v0 u1 v1 of the image, top left origin
+    batch.draw(quads, viewport=(width, height))
+
+    python quad_batch.py    # frame time from 100 to 100k quads, instanced vs a draw per quad, headless
+
+[Vertex Rendering - OpenGL Wiki (Instancing)](https://www.khronos.org/opengl/wiki/Vertex_Rendering#Instancing)
+[Buffer Object Streaming - OpenGL Wiki (Buffer re-specification)](https://www.khronos.org/opengl/wiki/Buffer_Object_Streaming#Buffer_re-specification)
+'''
+
+import time
+
+if __name__ == '__main__':
+    import headless
+
+from OpenGL.GL import *
+import numpy as np
+
+import gl_program
+import gl_state
+import program_cache
+import texture_manager
+import vertex_layout
+
+
+INSTANCE_DTYPE = np.dtype([
+    ('position', np.float32, 2),
+    ('size', np.float32, 2),
+    ('angle', np.float32),
+    ('color', np.uint8, 4),
+    ('rect', np.float32, 4),
+])
+
+vertex_shader_text = '''
+#version 410 core
+
+layout(location = 0) in vec2 vCorner;     // unit quad, 0..1
+layout(location = 1) in vec2 iPosition;   // centre, pixels
+layout(location = 2) in vec2 iSize;       // pixels
+layout(location = 3) in float iAngle;     // radians
+layout(location = 4) in vec4 iColor;
+layout(location = 5) in vec4 iRect;       // u0 v0 u1 v1, top left origin
+
+uniform vec2 vViewport;
+out vec2 vTextureCoord;
+out vec4 vColor;
+
+void main(void) {
+    vec2 local = (vCorner - 0.5) * iSize;
+    float c = cos(iAngle);
+    float s = sin(iAngle);
+    vec2 p = iPosition + vec2(c * local.x - s * local.y, s * local.x + c * local.y);
+    gl_Position = vec4(p / vViewport * 2.0 - 1.0, 0.0, 1.0);
+
+    // the image is uploaded top row first: the bottom corners take v1
+    vTextureCoord = vec2(mix(iRect.x, iRect.z, vCorner.x), mix(iRect.w, iRect.y, vCorner.y));
+    vColor = iColor;
+}
+'''
+
+fragment_shader_text = '''
+#version 410 core
+
+uniform sampler2D vTexture;
+in vec2 vTextureCoord;
+in vec4 vColor;
+out vec4 flagColor;
+
+void main(void) {
+    flagColor = texture(vTexture, vTextureCoord) * vColor;
+}
+'''
+
+
+def quads(count):
+    ''' count quads: white, whole image, not rotated, zero size; fill in the rest. '''
+    instances = np.zeros(count, dtype=INSTANCE_DTYPE)
+    instances['color'] = 255
+    instances['rect'] = (0.0, 0.0, 1.0, 1.0)
+    return instances
+
+
+class QuadBatch:
+
+    def __init__(self, capacity=1024, texture=None):
+        self.program = program_cache.create_program(vertex_shader_text, fragment_shader_text)
+        self.shader = gl_program.Program(self.program)
+
+        if texture is None:
+            # plain coloured quads: sample a 1x1 white texture
+            texture = texture_manager.create(np.full((1, 1, 3), 255, dtype=np.uint8))
+        self.texture = texture
+
+        corners = np.array([0, 0, 1, 0, 0, 1, 1, 1], dtype=np.float32)
+        indices = np.array([0, 1, 2, 2, 1, 3], dtype=np.uint16)
+
+        self.vao = glGenVertexArrays(1)
+        gl_state.bind_vertex_array(self.vao)
+
+        self.corner_vbo = glGenBuffers(1)
+        gl_state.bind_buffer(GL_ARRAY_BUFFER, self.corner_vbo)
+        glBufferData(GL_ARRAY_BUFFER, corners.nbytes, corners, GL_STATIC_DRAW)
+        glEnableVertexAttribArray(0)
+        glVertexAttribPointer(0, 2, GL_FLOAT, False, 0, None)
+
+        self.ebo = glGenBuffers(1)
+        gl_state.bind_buffer(GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, GL_STATIC_DRAW)
+
+        self.capacity = capacity
+        self.instance_vbo = glGenBuffers(1)
+        gl_state.bind_buffer(GL_ARRAY_BUFFER, self.instance_vbo)
+        glBufferData(GL_ARRAY_BUFFER, capacity * INSTANCE_DTYPE.itemsize, None, GL_STREAM_DRAW)
+        # fields are attributes 1-5 in order, the colour bytes normalized
+        vertex_layout.enable_attributes(INSTANCE_DTYPE, first_location=1, divisor=1)
+
+        gl_state.bind_vertex_array(0)
+
+    def upload(self, instances):
+        gl_state.bind_buffer(GL_ARRAY_BUFFER, self.instance_vbo)
+        if len(instances) > self.capacity:
+            self.capacity = max(len(instances), self.capacity * 2)
+        # orphan: a new store while the GPU may still read last frame's
+        glBufferData(GL_ARRAY_BUFFER, self.capacity * INSTANCE_DTYPE.itemsize, None, GL_STREAM_DRAW)
+        glBufferSubData(GL_ARRAY_BUFFER, 0, instances.nbytes, instances)
+
+    def draw(self, instances, viewport):
+        ''' Every quad of the INSTANCE_DTYPE array in one draw call. '''
+        if not len(instances):
+            return
+        self.upload(np.ascontiguousarray(instances, dtype=INSTANCE_DTYPE))
+
+        gl_state.use_program(self.program)
+        self.shader.set_uniform('vTexture', 0)
+        self.shader.set_uniform('vViewport', tuple(viewport))
+        gl_state.bind_texture(GL_TEXTURE_2D, self.texture, unit=GL_TEXTURE0)
+        gl_state.bind_vertex_array(self.vao)
+        glDrawElementsInstanced(GL_TRIANGLES, 6, GL_UNSIGNED_SHORT, None, len(instances))
+
+    def delete(self):
+        gl_state.delete_buffer(self.corner_vbo, self.ebo, self.instance_vbo)
+        gl_state.delete_vertex_array(self.vao)
+        gl_state.delete_program(self.program)
+
+
+def random_quads(count, width, height, rng):
+    instances = quads(count)
+    instances['position'] = rng.uniform((0, 0), (width, height), (count, 2))
+    instances['size'] = rng.uniform(4, 32, (count, 1))
+    instances['angle'] = rng.uniform(0, 2 * np.pi, count)
+    instances['color'] = rng.integers(64, 256, (count, 4))
+    # one cell of a 4x4 atlas each
+    cells = rng.integers(0, 4, (count, 2)) / 4.0
+    instances['rect'] = np.hstack([cells, cells + 0.25])
+    return instances
+
+def animate(instances, velocities, width, height, dt):
+    position = instances['position'] + velocities * dt
+    # bounce off the edges
+    out = (position < 0) | (position > (width, height))
+    velocities[out] *= -1
+    instances['position'] = np.clip(position, 0, (width, height))
+    instances['angle'] += dt
+
+def benchmark(counts, frames, max_single, size):
+    context = headless.create_context(size, size)
+
+    batch = QuadBatch(texture=texture_manager.load('lena.png', mipmaps=True))
+    rng = np.random.default_rng(0)
+
+    print('%8s %-12s %12s %10s %12s' % ('quads', 'mode', 'ms/frame', 'FPS', 'draw calls'))
+    for count in counts:
+        instances = random_quads(count, size, size, rng)
+        velocities = rng.uniform(-100, 100, (count, 2)).astype(np.float32)
+
+        modes = [('instanced', lambda: batch.draw(instances, (size, size)))]
+        if count <= max_single:
+            def one_by_one():
+                # one small buffer update and one draw call per object, same shader and buffers
+                batch.draw(instances[:1], (size, size))
+                for i in range(1, count):
+                    glBufferSubData(GL_ARRAY_BUFFER, 0, INSTANCE_DTYPE.itemsize, instances[i:i + 1])
+                    glDrawElementsInstanced(GL_TRIANGLES, 6, GL_UNSIGNED_SHORT, None, 1)
+            modes.append(('draw per quad', one_by_one))
+
+        for label, draw in modes:
+            draw()
+            context.present()
+
+            start = time.perf_counter()
+            for _ in range(frames):
+                animate(instances, velocities, size, size, 1 / 60)
+                gl_state.clear_color(0, 0, 0, 1)
+                glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+                draw()
+                context.present()
+            elapsed = (time.perf_counter() - start) / frames
+            print('%8d %-12s %12.3f %10.1f %12d' % (
+                count, label, elapsed * 1000, 1 / elapsed, 1 if label == 'instanced' else count))
+
+    batch.delete()
+    texture_manager.delete_all()
+    context.destroy()
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Frame time of the instanced quad batch, up to 100k quads.')
+    parser.add_argument('--counts', type=int, nargs='+', default=[100, 1000, 10000, 100000])
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--max-single', type=int, default=10000, help='largest count also drawn with one call per quad')
+    parser.add_argument('--size', type=int, default=1024, help='framebuffer is size x size')
+    args = parser.parse_args()
+
+    benchmark(args.counts, args.frames, args.max_single, args.size)
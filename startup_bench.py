@@ -0,0 +1,194 @@
+'''
+## Startup benchmark
+
+Runs every demo headless for a single frame, several times over, and reports
+how the time from process start to the first presented frame splits between
+interpreter startup, imports, context creation, image decode, texture upload,
+shader compile and the first draw (phases are marked by glcore.py).
+
+    python startup_bench.py
+    python startup_bench.py --repeat 10 --json startup.json --csv startup.csv
+    python startup_bench.py --software glsl_py9.py glsl_py12.py    # Mesa llvmpipe
+    python startup_bench.py --cold                                # no program/shader/image caches
+    python startup_bench.py --baseline startup.json               # compare against an earlier run
+
+Scripts that are not built on glcore.py (glsl_py0, glsl_py2, glsl_py3,
+glsl_py8_1) have no headless mode and are reported as skipped.
+'''
+
+import csv
+import glob
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def script_order(path):
+    # glsl_py8_1 between glsl_py8 and glsl_py9, glsl_py10 after glsl_py9
+    return [int(n) for n in re.findall(r'\d+', os.path.basename(path))]
+
+def list_scripts():
+    return sorted(glob.glob('glsl_py*.py'), key=script_order)
+
+def supports_headless(path):
+    with open(path, encoding='utf-8') as f:
+        return 'import glcore' in f.read()
+
+def run_once(script, env, timeout):
+    ''' glcore's phase report for one `script --headless --frames 1` run. '''
+    fd, phase_file = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    env = dict(env, GLCORE_PHASE_FILE=phase_file, GLCORE_LAUNCH_TIME=repr(time.time()))
+    try:
+        result = subprocess.run(
+            [sys.executable, script, '--headless', '--frames', '1'],
+            env=env, capture_output=True, text=True, timeout=timeout,
+        )
+        if result.returncode != 0 or os.path.getsize(phase_file) == 0:
+            output = (result.stderr or result.stdout).strip().splitlines()
+            raise RuntimeError('exit code %d: %s' % (result.returncode, output[-1] if output else 'no output'))
+        with open(phase_file) as f:
+            return json.load(f)
+    finally:
+        os.remove(phase_file)
+
+def durations(report):
+    ''' Seconds spent in each phase, in the order they happened, plus the total. '''
+    phases = {'interpreter': report.get('interpreter', 0.0)}
+    previous = 0.0
+    for phase, t in report['phases'].items():
+        phases['first draw' if phase == 'first frame' else phase] = t - previous
+        previous = t
+    phases['total'] = phases['interpreter'] + report['phases']['first frame']
+    return phases
+
+def summarize(samples):
+    ''' min/median/mean/max/stdev per phase, in seconds '''
+    phases = []
+    for sample in samples:
+        phases += [phase for phase in sample if phase not in phases]
+
+    stats = {}
+    for phase in phases:
+        values = [sample[phase] for sample in samples if phase in sample]
+        stats[phase] = {
+            'min': min(values),
+            'median': statistics.median(values),
+            'mean': statistics.mean(values),
+            'max': max(values),
+            'stdev': statistics.stdev(values) if len(values) > 1 else 0.0,
+        }
+    return stats
+
+def benchmark(scripts, repeat, cold=False, software=False, timeout=60):
+    env = dict(os.environ)
+    if software:
+        env['LIBGL_ALWAYS_SOFTWARE'] = '1'
+    if cold:
+        env['MESA_SHADER_CACHE_DISABLE'] = 'true'
+
+    results = []
+    for script in scripts:
+        result = {'script': os.path.basename(script)}
+        results.append(result)
+        if not supports_headless(script):
+            result['skipped'] = 'no headless mode (not built on glcore.py)'
+            print('%-14s skipped, %s' % (result['script'], result['skipped']))
+            continue
+
+        samples = []
+        try:
+            if not cold:
+                # fill the program binary and image caches, as on any second start
+                run_once(script, env, timeout)
+            for _ in range(repeat):
+                if cold:
+                    with tempfile.TemporaryDirectory() as cache_dir:
+                        report = run_once(script, dict(env, PROGRAM_CACHE=cache_dir, IMAGE_CACHE=cache_dir), timeout)
+                else:
+                    report = run_once(script, env, timeout)
+                samples.append(durations(report))
+        except (RuntimeError, subprocess.TimeoutExpired) as e:
+            result['error'] = str(e)
+            print('%-14s failed, %s' % (result['script'], e))
+            continue
+
+        result['renderer'] = report['renderer']
+        result['samples'] = samples
+        result['stats'] = summarize(samples)
+
+        print('%-14s %8.1f ms  (%s)' % (
+            result['script'],
+            result['stats']['total']['median'] * 1000,
+            ', '.join('%s %.1f' % (phase, s['median'] * 1000)
+                      for phase, s in result['stats'].items() if phase != 'total'),
+        ))
+
+    return results
+
+def write_csv(path, results):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['script', 'phase', 'min_ms', 'median_ms', 'mean_ms', 'max_ms', 'stdev_ms', 'runs'])
+        for result in results:
+            for phase, s in result.get('stats', {}).items():
+                writer.writerow([result['script'], phase] + [
+                    '%.3f' % (s[key] * 1000) for key in ('min', 'median', 'mean', 'max', 'stdev')
+                ] + [len(result['samples'])])
+
+def compare(results, baseline_path, threshold):
+    ''' Scripts whose median time to first frame grew by more than threshold. '''
+    with open(baseline_path) as f:
+        baseline = {r['script']: r for r in json.load(f)['results'] if 'stats' in r}
+
+    regressions = []
+    print('%-14s %10s %10s %8s' % ('script', 'base ms', 'now ms', 'change'))
+    for result in results:
+        if 'stats' not in result or result['script'] not in baseline:
+            continue
+        before = baseline[result['script']]['stats']['total']['median']
+        now = result['stats']['total']['median']
+        change = now / before - 1
+        flag = ' <-- slower' if change > threshold else ''
+        print('%-14s %10.1f %10.1f %+7.1f%%%s' % (result['script'], before * 1000, now * 1000, change * 100, flag))
+        if flag:
+            regressions.append(result['script'])
+    return regressions
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Time to first frame of each demo, run headless.')
+    parser.add_argument('scripts', nargs='*', help='default: every glsl_py*.py')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--cold', action='store_true', help='empty program binary and image caches and no Mesa shader cache on every run')
+    parser.add_argument('--software', action='store_true', help='LIBGL_ALWAYS_SOFTWARE=1 (llvmpipe on Mesa)')
+    parser.add_argument('--timeout', type=float, default=60, help='seconds per run')
+    parser.add_argument('--json', help='write samples and statistics here')
+    parser.add_argument('--csv', help='write per-phase statistics here')
+    parser.add_argument('--baseline', help='JSON from an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='relative slowdown reported as a regression')
+    args = parser.parse_args()
+
+    results = benchmark(args.scripts or list_scripts(), args.repeat, args.cold, args.software, args.timeout)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'repeat': args.repeat,
+                'cold': args.cold,
+                'software': args.software,
+                'python': sys.version.split()[0],
+                'results': results,
+            }, f, indent=2)
+    if args.csv:
+        write_csv(args.csv, results)
+
+    failed = [r['script'] for r in results if 'error' in r]
+    regressions = compare(results, args.baseline, args.threshold) if args.baseline else []
+    if failed or regressions:
+        sys.exit(1)
@@ -0,0 +1,51 @@
+'''
+Most of these tests need NumPy and PyOpenGL and are skipped without them;
+the ones marked by the `gl` fixture also need a headless GL context (EGL or
+OSMesa, see headless.py) and are skipped where none can be created.
+
+    python -m pytest tests
+    PYOPENGL_PLATFORM=osmesa python -m pytest tests
+'''
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# keep the tests' program binaries and decoded images out of the user's caches
+cache_root = tempfile.mkdtemp(prefix='pyopengltest-')
+os.environ['PROGRAM_CACHE'] = os.path.join(cache_root, 'programs')
+os.environ['IMAGE_CACHE'] = os.path.join(cache_root, 'images')
+os.environ['FISHEYE_LUT_CACHE'] = os.path.join(cache_root, 'fisheye_lut')
+
+try:
+    # before anything imports OpenGL.GL: it picks the platform
+    import headless
+except ImportError:
+    headless = None
+
+
+@pytest.fixture(scope='session')
+def gl():
+    ''' A headless GL core context shared by the session: 4.3 (compute shaders) where there is one, else 4.1. '''
+    if headless is None:
+        pytest.skip('PyOpenGL and NumPy are needed for GL tests')
+    for version in ((4, 3), (4, 1)):
+        try:
+            context = headless.create_context(64, 64, version)
+            break
+        except Exception as e:
+            error = e
+    else:
+        pytest.skip('no headless GL context: %s' % error)
+    yield context
+    context.destroy()
+
+@pytest.fixture
+def gl43(gl):
+    if gl.version < (4, 3):
+        pytest.skip('compute shaders need GL 4.3')
+    return gl
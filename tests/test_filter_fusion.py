@@ -0,0 +1,95 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('OpenGL.GL')
+
+import filter_fusion
+
+
+def pass_names(chain, fuse=True):
+    return [[name for _, name, _ in stages] for stages in filter_fusion.group(chain, fuse)]
+
+def test_pointwise_and_remaps_fuse():
+    chain = [('fisheye', {}), ('swizzle', {}), ('color', {}), ('fisheye', {}), ('vignette', {})]
+    assert pass_names(chain) == [['fisheye', 'swizzle', 'color', 'fisheye', 'vignette']]
+
+def test_kernel_starts_a_pass():
+    chain = [('color', {}), ('sharpen', {}), ('vignette', {}), ('fisheye', {})]
+    assert pass_names(chain) == [['color'], ['sharpen', 'vignette', 'fisheye']]
+
+def test_unfused_pass_per_filter():
+    chain = [('fisheye', {}), ('swizzle', {}), ('sharpen', {})]
+    assert pass_names(chain, fuse=False) == [['fisheye'], ['swizzle'], ['sharpen']]
+
+def test_unknown_filter():
+    with pytest.raises(RuntimeError):
+        filter_fusion.group([('blur', {})])
+
+def test_parameters_per_stage():
+    stages = filter_fusion.group([('color', {'contrast': 0.9}), ('color', {})])[0]
+    values = filter_fusion.uniforms(stages)
+    assert values['f0_contrast'] == 0.9
+    assert values['f1_contrast'] == filter_fusion.filters['color'].parameters['contrast'][1]
+
+    text = filter_fusion.fragment_shader(stages, flip=True)
+    assert 'uniform float f0_contrast;' in text and 'uniform float f1_contrast;' in text
+    assert '$' not in text
+
+def test_generated_shader_reused():
+    stages = filter_fusion.group([('swizzle', {}), ('vignette', {'strength': 0.1})])[0]
+    text = filter_fusion.fragment_shader(stages, flip=False)
+    hits = filter_fusion.generated_stats['hits']
+    # other values, same layout: same shader
+    other = filter_fusion.group([('swizzle', {}), ('vignette', {'strength': 0.9})])[0]
+    assert filter_fusion.fragment_shader(other, flip=False) is text
+    assert filter_fusion.generated_stats['hits'] == hits + 1
+    assert filter_fusion.fragment_shader(other, flip=True) != text
+
+def test_remap_after_pointwise_masks_outside():
+    stages = filter_fusion.group([('color', {}), ('fisheye', {})])[0]
+    body = filter_fusion.fragment_shader(stages, flip=True).split('void main(void) {')[1]
+    # the colour filter runs first, then what the remap reads outside of is black again
+    assert body.index('f0_color(color') < body.index('if (outside(uv1))')
+
+
+# fused and unfused on the GPU
+
+WIDTH, HEIGHT = 64, 48
+
+CHAINS = [
+    [('fisheye', {'k': (0.1, 0.01, 0.0, 0.0)}), ('swizzle', {}), ('coordinate_color', {})],
+    [('color', {'contrast': 0.9}), ('fisheye', {}), ('vignette', {})],
+    [('color', {}), ('sharpen', {}), ('vignette', {})],
+]
+
+def render(graph, source, target):
+    graph.run(source, (WIDTH, HEIGHT), framebuffer=target.framebuffer, viewport=(0, 0, WIDTH, HEIGHT))
+    filter_fusion.glFinish()
+    filter_fusion.glBindFramebuffer(filter_fusion.GL_READ_FRAMEBUFFER, target.framebuffer)
+    data = filter_fusion.glReadPixels(0, 0, WIDTH, HEIGHT, filter_fusion.GL_RGBA, filter_fusion.GL_UNSIGNED_BYTE)
+    return np.frombuffer(data, dtype=np.uint8).reshape(HEIGHT, WIDTH, 4).astype(np.int16)
+
+@pytest.mark.parametrize('chain', CHAINS, ids=lambda chain: '+'.join(name for name, _ in chain))
+def test_fused_matches_unfused(gl, chain):
+    import gl_state
+    import postprocess
+    import texture_manager
+
+    # smooth, so resampling the unfused intermediates changes little
+    y, x = np.mgrid[0:HEIGHT, 0:WIDTH]
+    img = np.dstack([x * 255 // WIDTH, y * 255 // HEIGHT, (x + y) * 255 // (WIDTH + HEIGHT)]).astype(np.uint8)
+    source = texture_manager.create(img, wrap=filter_fusion.GL_CLAMP_TO_BORDER)
+    target = postprocess.RenderTarget(WIDTH, HEIGHT)
+
+    fused = filter_fusion.build(chain, fuse=True)
+    unfused = filter_fusion.build(chain, fuse=False)
+    try:
+        difference = np.abs(render(fused, source, target) - render(unfused, source, target)).max(axis=2)
+    finally:
+        fused.delete()
+        unfused.delete()
+        target.delete()
+        gl_state.delete_texture(source)
+
+    # intermediates are RGBA8: a few levels of rounding, nothing more
+    assert np.count_nonzero(difference > 4) <= difference.size * 0.01
@@ -0,0 +1,52 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('OpenGL.GL')
+
+from OpenGL.GL import GL_CLAMP_TO_BORDER
+
+import fisheye_compute
+import fisheye_cpu
+import gl_state
+import glsl_py12
+import postprocess
+import texture_manager
+
+
+SOURCE = 64
+OUTPUT = 32
+K = (0.1, 0.01, 0.0, 0.0)
+
+@pytest.mark.parametrize('shared_tile', [False, True], ids=['texture', 'shared tile'])
+def test_warp_matches_cpu(gl43, shared_tile):
+    # grey ramp across: bilinear filtering reproduces it exactly away from the edges
+    ramp = np.arange(SOURCE, dtype=np.uint8) * 4
+    img = np.repeat(np.tile(ramp, (SOURCE, 1))[:, :, None], 3, axis=2)
+    source = texture_manager.create(img, wrap=GL_CLAMP_TO_BORDER)
+    target = postprocess.RenderTarget(OUTPUT, OUTPUT)
+    warp = fisheye_compute.FisheyeCompute(local_size=(8, 8), shared_tile=shared_tile)
+    glsl_py12.init_params(warp.program)
+    try:
+        glsl_py12.set_params(K, (OUTPUT, OUTPUT), (OUTPUT / 2, OUTPUT / 2))
+        warp.dispatch(source, target)
+        pixels = fisheye_compute.read_texture(target).astype(np.float64)
+    finally:
+        warp.delete()
+        target.delete()
+        gl_state.delete_buffer(glsl_py12.params_ubo)
+        gl_state.delete_texture(source)
+
+    # both bottom row first
+    u, v = fisheye_cpu.texture_coordinates(K, OUTPUT, OUTPUT, (OUTPUT, OUTPUT))
+    # inside the image circle (NaN outside) and a texel in from the source's edges, where the border blends in
+    inside = np.all([(c * SOURCE > 1.0) & (c * SOURCE < SOURCE - 1.0) for c in (u, v)], axis=0)
+    assert inside.sum() > OUTPUT * OUTPUT / 2
+    expected = 4 * (u * SOURCE - 0.5)
+    assert np.abs(pixels[..., 0][inside] - expected[inside]).max() <= 2.0
+    # outside the image circle: opaque black
+    corners = pixels[[0, 0, -1, -1], [0, -1, 0, -1]]
+    np.testing.assert_array_equal(corners, [[0, 0, 0, 255]] * 4)
+
+def test_workgroup_limit(gl43):
+    with pytest.raises(RuntimeError):
+        fisheye_compute.FisheyeCompute(local_size=(4096, 4096))
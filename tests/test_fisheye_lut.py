@@ -0,0 +1,37 @@
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('OpenGL.GL')
+
+import fisheye_cpu
+import fisheye_lut
+
+
+K = (0.1, 0.01, 0.0, 0.0)
+
+def test_bake_matches_cpu(gl):
+    width, height = 48, 32
+    size, center = (40, 30), (22, 15)
+    lut = fisheye_lut.bake_lut(K, width, height, size, center)
+    assert lut.shape == (height, width, 2) and lut.dtype == np.float32
+
+    u, v = fisheye_cpu.texture_coordinates(K, width, height, size, center)
+    y, x = np.mgrid[0:height, 0:width] + 0.5
+    n = np.hypot((x - center[0]) / size[0] * 2.0, (y - center[1]) / size[1] * 2.0)
+    # r = atan(n / sqrt(1 - n^2)) is steep at the rim, where float32 and float64 part
+    inside = n < 0.95
+    outside = n > 1.05
+    assert inside.any() and outside.any()
+    np.testing.assert_allclose(lut[..., 0][inside], u[inside], atol=1e-3)
+    np.testing.assert_allclose(lut[..., 1][inside], v[inside], atol=1e-3)
+    # outside the image circle: far off the texture
+    assert (lut[outside] < -1.0).all()
+
+def test_load_or_bake_caches(gl):
+    lut = fisheye_lut.load_or_bake_lut(K, 16, 16)
+    path = fisheye_lut.cache_path(K, 16, 16, (16, 16), (8, 8))
+    assert os.path.exists(path)
+    np.testing.assert_array_equal(np.load(path), lut)
+    np.testing.assert_array_equal(fisheye_lut.load_or_bake_lut(K, 16, 16), lut)
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('OpenGL.GL')
+
+from OpenGL.GL import *
+
+import frame_profiler
+
+
+def test_gpu_times(gl, tmp_path):
+    profiler = frame_profiler.FrameProfiler(queries=2, json_path=str(tmp_path / 'frames.json'), trace_path=str(tmp_path / 'trace.json'))
+    if not profiler.gpu:
+        profiler.delete()
+        pytest.skip('no GL_TIME_ELAPSED queries in this context')
+    gl.bind()
+    try:
+        for _ in range(5):
+            with profiler.section('render', gpu=True):
+                glClear(GL_COLOR_BUFFER_BIT)
+            profiler.end_frame()
+        stats = profiler.report()
+    finally:
+        profiler.delete()
+
+    # every frame got a GPU time, or was dropped with both queries in flight, or its time was impossible
+    assert stats['gpu render']['count'] + profiler.gpu_dropped + profiler.gpu_invalid == 5
+    assert stats['gpu render']['count'] >= 1
+    # a clear of a 64x64 target, nowhere near a second
+    assert 0.0 <= stats['gpu render']['max'] < 1000.0
+    assert stats['render']['count'] == 5
+    assert stats['frame']['count'] == 5
+
+    with open(str(tmp_path / 'frames.json')) as f:
+        assert 'gpu render' in json.load(f)['series']
+    with open(str(tmp_path / 'trace.json')) as f:
+        tracks = {event['tid'] for event in json.load(f)['traceEvents'] if event['ph'] == 'X'}
+    assert tracks == {frame_profiler.CPU_TRACK, frame_profiler.GPU_TRACK}
+
+def test_null_profiler():
+    profiler = frame_profiler.from_args(None)
+    with profiler.section('render', gpu=True):
+        pass
+    profiler.end_frame()
+    assert not profiler.report()
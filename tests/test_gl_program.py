@@ -0,0 +1,94 @@
+import types
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('OpenGL.GL')
+
+from OpenGL.GL import *
+
+import gl_program
+import program_cache
+
+
+VERTEX = '''#version 410 core
+void main(void) {
+    gl_Position = vec4(0.0, 0.0, 0.0, 1.0);
+}
+'''
+
+FRAGMENT = '''#version 410 core
+uniform float vWeights[3];
+uniform vec2 vOffsets[2];
+uniform sampler2DShadow vShadow;
+uniform isampler3D vVolume;
+uniform usampler2DArray vLayers;
+uniform uvec2 vCount;
+out vec4 flagColor;
+void main(void) {
+    float w = vWeights[0] + vWeights[1] + vWeights[2] + vOffsets[0].x + vOffsets[1].y;
+    float s = texture(vShadow, vec3(0.5));
+    ivec4 v = texture(vVolume, vec3(0.5));
+    uvec4 l = texture(vLayers, vec3(0.5));
+    flagColor = vec4(w, s, float(v.x) + float(l.x), float(vCount.x + vCount.y));
+}
+'''
+
+
+def test_opaque_types():
+    for uniform_type in (GL_SAMPLER_2D_SHADOW, GL_INT_SAMPLER_3D, GL_UNSIGNED_INT_SAMPLER_3D,
+                         GL_INT_SAMPLER_2D_ARRAY, GL_UNSIGNED_INT_SAMPLER_2D_ARRAY):
+        assert uniform_type in gl_program.SAMPLER_TYPES
+    assert GL_IMAGE_2D in gl_program.IMAGE_TYPES
+    assert GL_UNSIGNED_INT_IMAGE_2D_ARRAY in gl_program.IMAGE_TYPES
+
+@pytest.fixture
+def shader(gl):
+    shader = gl_program.Program(program_cache.create_program(VERTEX, FRAGMENT))
+    yield shader
+    shader.delete()
+
+def uniform_values(shader, name, count, get=glGetUniformfv, dtype=np.float32):
+    values = np.zeros(count, dtype=dtype)
+    get(shader.program, glGetUniformLocation(shader.program, name), values)
+    return values
+
+def test_array_uniforms(shader):
+    assert shader.uniforms['vWeights'].size == 3
+    assert shader.set_uniform('vWeights', (0.25, 0.5, 0.75))
+    assert not shader.set_uniform('vWeights', [0.25, 0.5, 0.75])
+    for i, expected in enumerate((0.25, 0.5, 0.75)):
+        assert uniform_values(shader, 'vWeights[%d]' % i, 1)[0] == expected
+
+    # nested, one element per vec2
+    assert shader.set_uniform('vOffsets', [(1.0, 2.0), (3.0, 4.0)])
+    np.testing.assert_array_equal(uniform_values(shader, 'vOffsets[1]', 2), [3.0, 4.0])
+
+def test_array_uniform_needs_every_element(shader):
+    with pytest.raises(RuntimeError):
+        shader.set_uniform('vWeights', (1.0, 2.0))
+    with pytest.raises(RuntimeError):
+        shader.set_uniform('vWeights', 1.0)
+    # nothing was cached by the failed sets
+    assert 'vWeights' not in shader.values
+
+def test_sampler_units(shader):
+    for unit, name in enumerate(('vShadow', 'vVolume', 'vLayers'), 1):
+        assert shader.set_uniform(name, unit)
+        assert uniform_values(shader, name, 1, glGetUniformiv, np.int32)[0] == unit
+
+def test_unsigned_vector(shader):
+    assert shader.set_uniform('vCount', (3, 4))
+    np.testing.assert_array_equal(uniform_values(shader, 'vCount', 2, glGetUniformuiv, np.uint32), [3, 4])
+
+def test_call_counter():
+    finish = lambda: None
+    module = types.SimpleNamespace(glFinish=finish, glFlush=lambda: None, name='not counted')
+
+    with gl_program.GLCallCounter(module) as counter:
+        module.glFinish()
+        module.glFinish()
+        module.glFlush()
+    assert counter.total == 3
+    assert counter.counts == {'glFinish': 2, 'glFlush': 1}
+    assert module.glFinish is finish
@@ -0,0 +1,66 @@
+import pytest
+
+pytest.importorskip('OpenGL.GL')
+
+import gl_state
+
+
+@pytest.fixture
+def state(monkeypatch):
+    ''' A fresh GLState recording the GL calls it makes instead of making them. '''
+    calls = []
+    for name in ('glBindTexture', 'glActiveTexture', 'glTexParameteri', 'glBindBuffer', 'glUseProgram',
+                 'glBindVertexArray', 'glDeleteTextures', 'glDeleteBuffers', 'glDeleteVertexArrays', 'glDeleteProgram'):
+        monkeypatch.setattr(gl_state, name, lambda *args, name=name: calls.append((name,) + args))
+    state = gl_state.GLState()
+    state.calls = calls
+    return state
+
+def names(calls):
+    return [call[0] for call in calls]
+
+
+def test_redundant_binds_elided(state):
+    assert state.bind_texture(gl_state.GL_TEXTURE_2D, 5, unit=gl_state.GL_TEXTURE0)
+    assert not state.bind_texture(gl_state.GL_TEXTURE_2D, 5, unit=gl_state.GL_TEXTURE0)
+    assert names(state.calls) == ['glActiveTexture', 'glBindTexture']
+    assert state.elided == 2
+
+def test_deleted_texture_name_is_bound_again(state):
+    state.bind_texture(gl_state.GL_TEXTURE_2D, 5, unit=gl_state.GL_TEXTURE0)
+    state.tex_parameter(gl_state.GL_TEXTURE_2D, gl_state.GL_TEXTURE_MIN_FILTER, gl_state.GL_LINEAR)
+    state.delete_texture(5)
+    del state.calls[:]
+
+    # GL hands the name out again for the next texture
+    assert state.bind_texture(gl_state.GL_TEXTURE_2D, 5, unit=gl_state.GL_TEXTURE0)
+    assert state.tex_parameter(gl_state.GL_TEXTURE_2D, gl_state.GL_TEXTURE_MIN_FILTER, gl_state.GL_LINEAR)
+    assert names(state.calls) == ['glBindTexture', 'glTexParameteri']
+
+def test_deleted_buffer_name_is_bound_again(state):
+    state.bind_vertex_array(1)
+    state.bind_buffer(gl_state.GL_ARRAY_BUFFER, 7)
+    state.bind_buffer(gl_state.GL_ELEMENT_ARRAY_BUFFER, 8)
+    state.delete_buffer(7, 8)
+    del state.calls[:]
+
+    assert state.bind_buffer(gl_state.GL_ARRAY_BUFFER, 7)
+    assert state.bind_buffer(gl_state.GL_ELEMENT_ARRAY_BUFFER, 8)
+    assert names(state.calls) == ['glBindBuffer', 'glBindBuffer']
+
+def test_deleted_vertex_array_and_program(state):
+    state.bind_vertex_array(3)
+    state.use_program(4)
+    state.delete_vertex_array(3)
+    state.delete_program(4)
+    del state.calls[:]
+
+    assert state.bind_vertex_array(3)
+    assert state.use_program(4)
+    assert names(state.calls) == ['glBindVertexArray', 'glUseProgram']
+
+def test_delete_keeps_other_bindings(state):
+    state.bind_texture(gl_state.GL_TEXTURE_2D, 5, unit=gl_state.GL_TEXTURE0)
+    state.bind_texture(gl_state.GL_TEXTURE_2D, 6, unit=gl_state.GL_TEXTURE1)
+    state.delete_texture(5)
+    assert not state.bind_texture(gl_state.GL_TEXTURE_2D, 6, unit=gl_state.GL_TEXTURE1)
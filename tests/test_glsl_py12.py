@@ -0,0 +1,44 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('OpenGL.GL')
+
+from OpenGL.GL import *
+
+import gl_state
+import glsl_py12
+import program_cache
+
+
+def test_params_data_std140():
+    data = glsl_py12.params_data((0.1, 0.2, 0.3, 0.4), (640, 480), (320, 250))
+    assert data.dtype == np.float32
+    assert data.nbytes == 32
+    raw = data.tobytes()
+    # vK at 0, vSize at 16, vCenter at 24
+    np.testing.assert_array_equal(np.frombuffer(raw[0:16], np.float32), np.float32([0.1, 0.2, 0.3, 0.4]))
+    np.testing.assert_array_equal(np.frombuffer(raw[16:24], np.float32), [640, 480])
+    np.testing.assert_array_equal(np.frombuffer(raw[24:32], np.float32), [320, 250])
+
+def test_params_block_layout(gl):
+    program = program_cache.create_program(glsl_py12.vertex_shader_text, glsl_py12.fragment_shader_text)
+    block = glGetUniformBlockIndex(program, 'FisheyeParams')
+    assert block != GL_INVALID_INDEX
+
+    size = np.zeros(1, dtype=np.int32)
+    glGetActiveUniformBlockiv(program, block, GL_UNIFORM_BLOCK_DATA_SIZE, size)
+    assert size[0] == glsl_py12.params_data((0, 0, 0, 0), (1, 1), (0, 0)).nbytes
+
+    offsets = {}
+    for index in range(glGetProgramiv(program, GL_ACTIVE_UNIFORMS)):
+        name = glGetActiveUniform(program, index)[0].decode()
+        indices = np.array([index], dtype=np.uint32)
+        block_index = np.zeros(1, dtype=np.int32)
+        offset = np.zeros(1, dtype=np.int32)
+        glGetActiveUniformsiv(program, 1, indices, GL_UNIFORM_BLOCK_INDEX, block_index)
+        glGetActiveUniformsiv(program, 1, indices, GL_UNIFORM_OFFSET, offset)
+        if block_index[0] == block:
+            offsets[name] = int(offset[0])
+    assert offsets == {'vK': 0, 'vSize': 16, 'vCenter': 24}
+
+    gl_state.delete_program(program)
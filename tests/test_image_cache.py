@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import image_cache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_cache, 'cache_dir', str(tmp_path / 'cache'))
+    monkeypatch.setattr(image_cache, 'max_bytes', 1 << 20)
+    monkeypatch.setattr(image_cache, 'stats', {'hits': 0, 'misses': 0, 'evicted': 0})
+    return image_cache
+
+def image_file(tmp_path, name, content=b'image'):
+    path = str(tmp_path / name)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return path
+
+def test_miss_then_mapped_hit(cache, tmp_path):
+    path = image_file(tmp_path, 'a.png')
+    pixels = np.arange(48, dtype=np.uint8).reshape(4, 4, 3)
+    decoded = []
+
+    def decode():
+        decoded.append(path)
+        return pixels
+
+    np.testing.assert_array_equal(cache.load(path, 'test', decode), pixels)
+    cached = cache.load(path, 'test', decode)
+    np.testing.assert_array_equal(cached, pixels)
+    assert isinstance(cached, np.memmap)
+    assert len(decoded) == 1
+    assert cache.stats['hits'] == 1 and cache.stats['misses'] == 1
+
+def test_failed_decode_is_not_cached(cache, tmp_path):
+    path = image_file(tmp_path, 'broken.png')
+    assert cache.load(path, 'test', lambda: None) is None
+    assert cache.entries() == []
+
+def test_key_follows_file_and_variant(tmp_path):
+    path = image_file(tmp_path, 'a.png')
+    key = image_cache.image_key(path, 'cv2-1')
+    assert image_cache.image_key(path, 'cv2-1') == key
+    assert image_cache.image_key(path, 'pil-rgba') != key
+
+    image_file(tmp_path, 'a.png', b'edited image')
+    assert image_cache.image_key(path, 'cv2-1') != key
+
+def test_evict_least_recently_used(cache, tmp_path):
+    pixels = np.zeros(1000, dtype=np.uint8)
+    paths = [image_file(tmp_path, '%d.png' % i, b'%d' % i) for i in range(3)]
+    for path in paths:
+        cache.load(path, 'test', lambda: pixels)
+    cached = {os.path.basename(path): os.path.join(cache.cache_dir, cache.image_key(path, 'test') + '.npy') for path in paths}
+
+    # least recently used first: 1, 0, 2
+    for age, name in enumerate(['2.png', '0.png', '1.png']):
+        os.utime(cached[name], (1000 - age, 1000 - age))
+
+    entry_bytes = os.path.getsize(cached['0.png'])
+    cache.evict(2 * entry_bytes)
+    assert not os.path.exists(cached['1.png'])
+    assert os.path.exists(cached['0.png']) and os.path.exists(cached['2.png'])
+
+    cache.evict(entry_bytes)
+    assert not os.path.exists(cached['0.png'])
+    assert os.path.exists(cached['2.png'])
+    assert cache.stats['evicted'] == 2
+
+def test_hit_counts_as_use(cache, tmp_path):
+    path = image_file(tmp_path, 'a.png')
+    cache.load(path, 'test', lambda: np.zeros(16, dtype=np.uint8))
+    cached = os.path.join(cache.cache_dir, cache.image_key(path, 'test') + '.npy')
+    os.utime(cached, (1000, 1000))
+
+    cache.load(path, 'test', lambda: None)
+    assert os.path.getmtime(cached) > 1000
@@ -0,0 +1,87 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('OpenGL.GL')
+
+import mesh_loader
+
+
+QUAD_OBJ = '''
+v 0 0 0
+v 1 0 0
+v 1 1 0
+v 0 1 0
+vn 0 0 1
+f 1//1 2//1 3//1 4//1
+'''
+
+def test_triangulate_fans():
+    corners = np.arange(9)
+    triangles = mesh_loader.triangulate(corners, [4, 5])
+    np.testing.assert_array_equal(triangles, [[0, 1, 2], [0, 2, 3], [4, 5, 6], [4, 6, 7], [4, 7, 8]])
+
+def test_triangulate_rejects_lines():
+    with pytest.raises(RuntimeError):
+        mesh_loader.triangulate(np.arange(2), [2])
+
+def test_obj_quad_welds():
+    attributes, triangles = mesh_loader.parse_obj(QUAD_OBJ)
+    # per corner before welding
+    assert len(attributes['position']) == 6
+    assert len(triangles) == 2
+    vertices, welded = mesh_loader.weld(attributes, triangles)
+    assert len(vertices) == 4
+    assert welded.shape == (2, 3)
+    # the corners still land on the same positions
+    np.testing.assert_array_equal(vertices['position'][welded], attributes['position'][triangles])
+
+def test_weld_drops_degenerate():
+    positions = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0], [1, 0, 0]], dtype=np.float32)
+    attributes = {'position': positions, 'normal': np.zeros_like(positions)}
+    # vertex 3 duplicates vertex 1, so the second triangle collapses
+    vertices, triangles = mesh_loader.weld(attributes, np.array([[0, 1, 2], [0, 1, 3]]))
+    assert len(vertices) == 3
+    assert len(triangles) == 1
+
+def test_weld_negative_zero():
+    positions = np.array([[0.0, 0, 0], [-0.0, 0, 0], [1, 0, 0], [0, 1, 0]], dtype=np.float32)
+    attributes = {'position': positions, 'normal': np.zeros_like(positions)}
+    vertices, _ = mesh_loader.weld(attributes, np.array([[0, 2, 3], [1, 2, 3]]))
+    assert len(vertices) == 3
+
+def test_optimize_keeps_triangles():
+    positions, triangles = mesh_loader.torus(24, 12)
+    optimized = mesh_loader.optimize(triangles, len(positions))
+    assert sorted(map(tuple, optimized.tolist())) == sorted(map(tuple, triangles.tolist()))
+    assert mesh_loader.acmr(optimized) < mesh_loader.acmr(triangles[np.random.default_rng(0).permutation(len(triangles))])
+
+def test_reorder_vertices_first_use():
+    vertices = np.arange(5) * 10
+    triangles = np.array([[3, 1, 4], [1, 0, 3]])
+    reordered, remapped = mesh_loader.reorder_vertices(vertices, triangles)
+    # unused vertex 2 is dropped
+    np.testing.assert_array_equal(reordered, [30, 10, 40, 0])
+    np.testing.assert_array_equal(remapped, [[0, 1, 2], [1, 3, 0]])
+    np.testing.assert_array_equal(reordered[remapped], vertices[triangles])
+
+def test_index_dtype():
+    assert mesh_loader.index_dtype(65536) == np.uint16
+    assert mesh_loader.index_dtype(65537) == np.uint32
+
+def test_acmr():
+    assert mesh_loader.acmr([0, 1, 2, 3, 4, 5]) == 3
+    assert mesh_loader.acmr([0, 1, 2, 2, 1, 3]) == 2
+
+def test_load_soup(tmp_path):
+    positions, triangles = mesh_loader.torus(16, 8)
+    path = str(tmp_path / 'soup.obj')
+    mesh_loader.write_soup(path, positions, triangles, np.random.default_rng(0))
+
+    vertices, indices = mesh_loader.load(path)
+    # generated normals are shared by value, so every corner welds back
+    assert len(vertices) == len(positions)
+    assert indices.dtype == np.uint16
+    assert len(indices) == triangles.size
+    # indices in first-use order
+    _, first = np.unique(indices, return_index=True)
+    assert np.all(np.diff(first) > 0)
@@ -0,0 +1,39 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('OpenGL.GL')
+
+import gl_state
+import postprocess
+import texture_manager
+
+
+def graph_with_unread_pass():
+    graph = postprocess.PassGraph()
+    graph.add('unread', postprocess.color_correct_shader_text, uniforms=postprocess.COLOR_CORRECT_DEFAULTS)
+    graph.add('sharpen', postprocess.sharpen_shader_text, inputs=['source'], uniforms=postprocess.SHARPEN_DEFAULTS)
+    graph.add('color', postprocess.color_correct_shader_text, uniforms=postprocess.COLOR_CORRECT_DEFAULTS)
+    return graph
+
+def test_unread_pass_target_is_reused(gl):
+    source = texture_manager.create(np.zeros((16, 16, 3), dtype=np.uint8))
+    graph = graph_with_unread_pass()
+    try:
+        for _ in range(3):
+            graph.pool.release(graph.run(source, (16, 16)))
+        # unread and sharpen share one target once unread is done, color takes another
+        assert graph.pool.allocations == 2
+        assert len(graph.pool.targets) == 2
+    finally:
+        graph.delete()
+        gl_state.delete_texture(source)
+
+def test_peak_bytes_drops_unread_pass(gl):
+    graph = graph_with_unread_pass()
+    try:
+        peak, total = graph.peak_bytes((16, 16))
+        # the last pass draws into a framebuffer; the other two are never live together
+        assert total == 2 * 16 * 16 * 4
+        assert peak == 16 * 16 * 4
+    finally:
+        graph.delete()
@@ -0,0 +1,77 @@
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('OpenGL.GL')
+
+import gl_state
+import program_cache
+
+
+VERTEX = '''#version 410 core
+void main(void) {
+    gl_Position = vec4(0.0, 0.0, 0.0, 1.0);
+}
+'''
+
+FRAGMENT = '''#version 410 core
+out vec4 flagColor;
+void main(void) {
+    flagColor = vec4(COLOR);
+}
+'''
+
+
+def test_apply_defines_after_version():
+    src = program_cache.apply_defines(FRAGMENT, {'COLOR': '1.0', 'A': 2})
+    lines = src.splitlines()
+    assert lines[0] == '#version 410 core'
+    # sorted, so the same defines always give the same source
+    assert lines[1:3] == ['#define A 2', '#define COLOR 1.0']
+    assert lines[3:] == FRAGMENT.splitlines()[1:]
+
+def test_apply_defines_without_version():
+    assert program_cache.apply_defines('void main() {}', {'X': 1}) == '#define X 1\nvoid main() {}'
+
+def test_apply_defines_none():
+    assert program_cache.apply_defines(FRAGMENT, None) is FRAGMENT
+    assert program_cache.apply_defines(FRAGMENT, {}) is FRAGMENT
+
+@pytest.fixture
+def driver(monkeypatch):
+    strings = {program_cache.GL_VENDOR: b'vendor', program_cache.GL_RENDERER: b'renderer', program_cache.GL_VERSION: b'4.1'}
+    monkeypatch.setattr(program_cache, 'glGetString', strings.get)
+    return strings
+
+def test_program_key(driver):
+    key = program_cache.program_key(VERTEX, FRAGMENT, {'COLOR': 1})
+    assert key == program_cache.program_key(VERTEX, FRAGMENT, {'COLOR': 1})
+    assert key != program_cache.program_key(VERTEX, FRAGMENT, {'COLOR': 0})
+    assert key != program_cache.program_key(VERTEX, FRAGMENT)
+    assert key != program_cache.program_key(FRAGMENT, VERTEX, {'COLOR': 1})
+    assert key != program_cache.program_key(VERTEX, FRAGMENT, {'COLOR': 1}, geometry_shader_src=VERTEX)
+
+def test_program_key_follows_the_driver(driver):
+    key = program_cache.program_key(VERTEX, FRAGMENT)
+    driver[program_cache.GL_VERSION] = b'4.6'
+    assert program_cache.program_key(VERTEX, FRAGMENT) != key
+
+def test_compute_key_apart_from_vertex_fragment(driver):
+    assert program_cache.compute_program_key(VERTEX) != program_cache.program_key('compute', VERTEX)
+    assert program_cache.compute_program_key(VERTEX) == program_cache.compute_program_key(VERTEX)
+    # a geometry stage is not a vertex + fragment pair with one more source
+    assert program_cache.program_key(VERTEX, FRAGMENT, geometry_shader_src='x') != program_cache.program_key(VERTEX, FRAGMENT + '\0x')
+
+def test_create_program_warm(gl):
+    before = dict(program_cache.stats)
+    defines = {'COLOR': 0.5}
+    cold = program_cache.create_program(VERTEX, FRAGMENT, defines)
+    warm = program_cache.create_program(VERTEX, FRAGMENT, defines)
+    try:
+        if program_cache.binary_supported():
+            assert program_cache.stats['misses'] == before['misses'] + 1
+            assert program_cache.stats['hits'] == before['hits'] + 1
+        else:
+            assert program_cache.stats['misses'] == before['misses'] + 2
+    finally:
+        gl_state.delete_program(cold)
+        gl_state.delete_program(warm)
@@ -0,0 +1,55 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('OpenGL.GL')
+
+import vertex_layout
+from vertex_layout import GL_FLOAT, GL_HALF_FLOAT, GL_UNSIGNED_BYTE, GL_UNSIGNED_SHORT
+
+
+def offsets(dtype):
+    return [dtype.fields[name][1] for name in dtype.names]
+
+def test_position_texcoord():
+    dtype = vertex_layout.POSITION_TEXCOORD
+    assert dtype.itemsize == 20
+    assert offsets(dtype) == [0, 12]
+    assert vertex_layout.attributes(dtype) == [(3, GL_FLOAT, False, 0), (2, GL_FLOAT, False, 12)]
+
+def test_position_texcoord_packed():
+    dtype = vertex_layout.POSITION_TEXCOORD_PACKED
+    # 6 bytes of half floats, padded to the 4-byte boundary
+    assert dtype.itemsize == 12
+    assert offsets(dtype) == [0, 8]
+    assert vertex_layout.attributes(dtype) == [(3, GL_HALF_FLOAT, False, 0), (2, GL_UNSIGNED_SHORT, True, 8)]
+
+def test_color_packed():
+    dtype = vertex_layout.COLOR_PACKED
+    assert dtype.itemsize == 4
+    assert vertex_layout.attributes(dtype) == [(4, GL_UNSIGNED_BYTE, True, 0)]
+
+def test_alignment():
+    dtype = vertex_layout.vertex_dtype(('a', np.uint8, 1), ('b', np.float32, 1), ('c', np.uint8, 3), align=4)
+    assert offsets(dtype) == [0, 4, 8]
+    assert dtype.itemsize == 12
+    assert vertex_layout.vertex_dtype(('a', np.uint8, 1), ('b', np.uint8, 1), align=1).itemsize == 2
+
+def test_unsupported_type():
+    with pytest.raises(RuntimeError):
+        vertex_layout.attributes(vertex_layout.vertex_dtype(('position', np.float64, 3)))
+
+def test_pack_normalizes_integers():
+    vertices = vertex_layout.pack(
+        vertex_layout.POSITION_TEXCOORD_PACKED,
+        position=[[0.5, -1.0, 2.0], [0.0, 0.0, 0.0]],
+        texcoord=[[0.0, 1.0], [0.5, 2.0]],
+    )
+    assert vertices['position'].dtype == np.float16
+    np.testing.assert_array_equal(vertices['position'][0], [0.5, -1.0, 2.0])
+    # 0..1 over the full range, clamped
+    np.testing.assert_array_equal(vertices['texcoord'], [[0, 65535], [32768, 65535]])
+
+def test_pack_signed():
+    dtype = vertex_layout.vertex_dtype(('normal', np.int16, 3))
+    vertices = vertex_layout.pack(dtype, normal=[[-1.0, 0.0, 1.0]])
+    np.testing.assert_array_equal(vertices['normal'], [[-32767, 0, 32767]])
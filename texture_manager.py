@@ -0,0 +1,184 @@
+'''
+## Texture manager
+
+Creates the image textures of every scene. Storage is allocated once at its
+final size with glTexStorage2D (immutable, all mip levels), level 0 is
+uploaded through image_ingest.py and the rest of the chain is filtered on
+the GPU with glGenerateMipmap. gluBuild2DMipmaps, which glsl_py2 used,
+rescales non-power-of-two images to a power of two and filters every level
+on the CPU, then uploads each one.
+
+Textures loaded from a file are shared: loading the same file with the same
+options again returns the texture already made.
+
+    texture = texture_manager.create(img, mipmaps=True, wrap=GL_REPEAT)
+    texture = texture_manager.load('lena.png')
+    texture_manager.delete_all()
+
+    python texture_manager.py    # load time and texture memory vs gluBuild2DMipmaps, headless
+
+[Texture Storage - OpenGL Wiki (Immutable storage)](https://www.khronos.org/opengl/wiki/Texture_Storage#Immutable_storage)
+[Common Mistakes - OpenGL Wiki (Automatic mipmap generation)](https://www.khronos.org/opengl/wiki/Common_Mistakes#Automatic_mipmap_generation)
+'''
+
+import os
+import time
+
+if __name__ == '__main__':
+    import headless
+
+from OpenGL.GL import *
+import numpy as np
+
+import gl_state
+import image_ingest
+
+
+# (path, options) -> texture, see load
+textures = {}
+
+stats = {'created': 0, 'shared': 0, 'texels': 0}
+
+
+def mip_levels(width, height):
+    ''' Levels of a full chain down to 1x1. '''
+    return max(width, height).bit_length()
+
+def allocate(width, height, levels, internal_format=GL_RGBA8):
+    ''' Storage for the texture bound to GL_TEXTURE_2D. '''
+    if glTexStorage2D:
+        glTexStorage2D(GL_TEXTURE_2D, levels, internal_format, width, height)
+    else:
+        # GL 4.1 (macOS) has no ARB_texture_storage; same allocation, mutable
+        for level in range(levels):
+            glTexImage2D(GL_TEXTURE_2D, level, internal_format,
+                         max(width >> level, 1), max(height >> level, 1), 0, GL_BGRA, GL_UNSIGNED_BYTE, None)
+    # also keeps a single-level texture complete whatever the min filter
+    gl_state.tex_parameter(GL_TEXTURE_2D, GL_TEXTURE_MAX_LEVEL, levels - 1)
+
+def create(img, mipmaps=False, min_filter=None, mag_filter=GL_LINEAR, wrap=None, unit=GL_TEXTURE0, layout=None):
+    '''
+    RGBA8 texture of a cv2-style image (H x W x 3 BGR or H x W x 4 BGRA), bound
+    to unit. min_filter defaults to trilinear with mipmaps and linear without;
+    wrap is left at the GL default when None.
+    '''
+    height, width = img.shape[:2]
+    levels = mip_levels(width, height) if mipmaps else 1
+
+    texture = glGenTextures(1)
+    gl_state.bind_texture(GL_TEXTURE_2D, texture, unit=unit)
+    allocate(width, height, levels)
+
+    if min_filter is None:
+        min_filter = GL_LINEAR_MIPMAP_LINEAR if mipmaps else GL_LINEAR
+    gl_state.tex_parameter(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, min_filter)
+    if mag_filter is not None:
+        gl_state.tex_parameter(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, mag_filter)
+    if wrap is not None:
+        # https://open.gl/textures
+        gl_state.tex_parameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, wrap)
+        gl_state.tex_parameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, wrap)
+
+    image_ingest.upload(img, layout, sub=True)
+    if levels > 1:
+        glGenerateMipmap(GL_TEXTURE_2D)
+
+    stats['created'] += 1
+    stats['texels'] += texels(width, height, levels)
+    return texture
+
+def load(path, **options):
+    ''' create() for an image file (decoded through image_cache), shared per path and options. '''
+    import image_cache
+
+    key = (path, tuple(sorted(options.items())))
+    if key in textures:
+        stats['shared'] += 1
+        gl_state.bind_texture(GL_TEXTURE_2D, textures[key], unit=options.get('unit', GL_TEXTURE0))
+        return textures[key]
+
+    img = image_cache.imread(path)
+    if img is None:
+        raise RuntimeError('cannot read image %r' % path)
+    textures[key] = create(img, **options)
+    return textures[key]
+
+def delete_all():
+    if textures:
+        gl_state.delete_texture(*textures.values())
+    textures.clear()
+
+def texels(width, height, levels):
+    return sum(max(width >> level, 1) * max(height >> level, 1) for level in range(levels))
+
+def texture_bytes(texture):
+    ''' Bytes of every allocated level, as the driver reports them (RGBA8 assumed). '''
+    gl_state.bind_texture(GL_TEXTURE_2D, texture, unit=GL_TEXTURE0)
+    total = 0
+    level = 0
+    while True:
+        width = glGetTexLevelParameteriv(GL_TEXTURE_2D, level, GL_TEXTURE_WIDTH)
+        height = glGetTexLevelParameteriv(GL_TEXTURE_2D, level, GL_TEXTURE_HEIGHT)
+        if not width or not height:
+            return total, level
+        total += int(width) * int(height) * 4
+        level += 1
+
+def resident_bytes():
+    ''' Resident set size of this process (Linux), 0 where /proc is not there. '''
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return 0
+
+
+def benchmark(sizes, repeat):
+    from OpenGL.GLU import gluBuild2DMipmaps
+
+    context = headless.create_context(64, 64)
+
+    print('%11s %-10s %10s %7s %11s %14s %12s' % (
+        'image', 'mipmaps', 'load ms', 'levels', 'level 0', 'texture bytes', 'RSS delta'))
+    for size in sizes:
+        # what glsl_py2 hands to GLU: RGBA, bottom row first
+        rgba = np.random.randint(0, 256, (size, size, 4), dtype=np.uint8)
+
+        def glu():
+            texture = glGenTextures(1)
+            gl_state.bind_texture(GL_TEXTURE_2D, texture, unit=GL_TEXTURE0)
+            gluBuild2DMipmaps(GL_TEXTURE_2D, GL_RGBA, size, size, GL_RGBA, GL_UNSIGNED_BYTE, rgba)
+            return texture
+
+        def storage():
+            return create(rgba, mipmaps=True)
+
+        for label, make in (('glu', glu), ('storage', storage)):
+            times = []
+            for _ in range(repeat):
+                rss = resident_bytes()
+                start = time.perf_counter()
+                texture = make()
+                glFinish()
+                times.append(time.perf_counter() - start)
+                # a software renderer keeps the texture itself in process memory
+                rss = resident_bytes() - rss
+                nbytes, levels = texture_bytes(texture)
+                level0 = '%dx%d' % (glGetTexLevelParameteriv(GL_TEXTURE_2D, 0, GL_TEXTURE_WIDTH),
+                                    glGetTexLevelParameteriv(GL_TEXTURE_2D, 0, GL_TEXTURE_HEIGHT))
+                gl_state.delete_texture(texture)
+
+            print('%11s %-10s %10.2f %7d %11s %14d %12d' % (
+                '%dx%d' % (size, size), label, min(times) * 1000, levels, level0, nbytes, rss))
+
+    context.destroy()
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='gluBuild2DMipmaps vs glTexStorage2D + glGenerateMipmap.')
+    # 1000: GLU rescales it to 1024 first
+    parser.add_argument('--sizes', type=int, nargs='+', default=[256, 1000, 2048, 4096])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    benchmark(args.sizes, args.repeat)
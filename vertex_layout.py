@@ -0,0 +1,197 @@
+'''
+## Vertex layouts
+
+Vertex attributes described by a NumPy structured dtype: one field per
+attribute, in location order. A vertex array is then one interleaved buffer,
+and the glVertexAttribPointer type, stride and offsets all come from the
+dtype. Integer fields are normalized, so packed formats are a matter of
+field types:
+
+    float16     half-float positions                    GL_HALF_FLOAT
+    uint16      texcoords 0..1 (int16 for -1..1)        GL_UNSIGNED_SHORT, normalized
+    uint8 x 4   colours                                 GL_UNSIGNED_BYTE, normalized
+
+Fields start on 4-byte boundaries, which is what most vertex fetch hardware
+wants.
+
+    vertices = vertex_layout.pack(vertex_layout.POSITION_TEXCOORD_PACKED, position=xyz, texcoord=uv)
+    quad = mesh.Mesh(vertices)                              # location 0 position, 1 texcoord
+    vertex_layout.enable_attributes(vertices.dtype)        # or by hand, for the bound GL_ARRAY_BUFFER
+
+    python vertex_layout.py    # bytes per vertex and vertices/sec fetched per layout, headless
+
+[Vertex Specification Best Practices - OpenGL Wiki](https://www.khronos.org/opengl/wiki/Vertex_Specification_Best_Practices)
+'''
+
+import ctypes
+import time
+
+if __name__ == '__main__':
+    import headless
+
+from OpenGL.GL import *
+import numpy as np
+
+
+GL_TYPES = {
+    np.dtype(np.float32): GL_FLOAT,
+    np.dtype(np.float16): GL_HALF_FLOAT,
+    np.dtype(np.int8): GL_BYTE,
+    np.dtype(np.uint8): GL_UNSIGNED_BYTE,
+    np.dtype(np.int16): GL_SHORT,
+    np.dtype(np.uint16): GL_UNSIGNED_SHORT,
+}
+
+
+def vertex_dtype(*fields, align=4):
+    ''' Structured dtype from (name, numpy type, components) fields, each starting on an `align`-byte boundary. '''
+    names, formats, offsets = [], [], []
+    offset = 0
+    for name, base, components in fields:
+        field = np.dtype((base, (components,))) if components > 1 else np.dtype(base)
+        offset = -(-offset // align) * align
+        names.append(name)
+        formats.append(field)
+        offsets.append(offset)
+        offset += field.itemsize
+    itemsize = -(-offset // align) * align
+    return np.dtype({'names': names, 'formats': formats, 'offsets': offsets, 'itemsize': itemsize})
+
+POSITION_TEXCOORD = vertex_dtype(('position', np.float32, 3), ('texcoord', np.float32, 2))
+# 12 bytes instead of 20
+POSITION_TEXCOORD_PACKED = vertex_dtype(('position', np.float16, 3), ('texcoord', np.uint16, 2))
+COLOR_PACKED = vertex_dtype(('color', np.uint8, 4))
+
+
+def attributes(dtype):
+    ''' (components, GL type, normalized, byte offset) per field, in field order. '''
+    result = []
+    for name in dtype.names:
+        field, offset = dtype.fields[name][:2]
+        if field.base not in GL_TYPES:
+            raise RuntimeError('vertex field %r has unsupported type %s' % (name, field.base))
+        components = int(np.prod(field.shape)) if field.shape else 1
+        result.append((components, GL_TYPES[field.base], field.base.kind in 'iu', offset))
+    return result
+
+def enable_attributes(dtype, first_location=0, divisor=0):
+    ''' Point locations first_location, ... at the fields of the bound GL_ARRAY_BUFFER, records of `dtype`. '''
+    for location, (components, gl_type, normalized, offset) in enumerate(attributes(dtype), first_location):
+        glEnableVertexAttribArray(location)
+        glVertexAttribPointer(location, components, gl_type, normalized, dtype.itemsize, ctypes.c_void_p(offset))
+        if divisor:
+            glVertexAttribDivisor(location, divisor)
+
+def pack(dtype, **values):
+    '''
+    Array of `dtype` from float values per field. Integer fields take 0..1
+    (unsigned) or -1..1 (signed), scaled to their full range.
+    '''
+    count = len(next(iter(values.values())))
+    vertices = np.zeros(count, dtype=dtype)
+    for name, value in values.items():
+        base = dtype.fields[name][0].base
+        if base.kind in 'iu':
+            info = np.iinfo(base)
+            value = np.clip(np.rint(np.asarray(value, dtype=np.float64) * info.max), info.min, info.max)
+        vertices[name] = value
+    return vertices
+
+
+benchmark_vertex_shader_text = '''
+#version 410 core
+
+layout(location = 0) in vec3 vPosition;
+layout(location = 1) in vec2 vTexCoord;
+layout(location = 2) in vec4 vColor;
+out vec4 fColor;
+
+void main(void) {
+    // every attribute is used, so none is optimised away
+    fColor = vColor * vec4(vTexCoord, 1.0, 1.0);
+    gl_Position = vec4(vPosition, 1.0);
+}
+'''
+
+benchmark_fragment_shader_text = '''
+#version 410 core
+
+in vec4 fColor;
+out vec4 flagColor;
+
+void main(void) {
+    flagColor = fColor;
+}
+'''
+
+BENCHMARK_LAYOUTS = {
+    'interleaved': vertex_dtype(('position', np.float32, 3), ('texcoord', np.float32, 2), ('color', np.float32, 4)),
+    'packed': vertex_dtype(('position', np.float16, 3), ('texcoord', np.uint16, 2), ('color', np.uint8, 4)),
+}
+
+def grid(side):
+    ''' side x side vertices over the viewport: position, texcoord and colour, as floats. '''
+    u, v = np.meshgrid(np.linspace(0, 1, side, dtype=np.float32), np.linspace(0, 1, side, dtype=np.float32))
+    u, v = u.reshape(-1), v.reshape(-1)
+    position = np.stack([u * 2 - 1, v * 2 - 1, np.zeros_like(u)], axis=1)
+    texcoord = np.stack([u, v], axis=1)
+    color = np.stack([u, v, 1 - u, np.ones_like(u)], axis=1)
+    return position, texcoord, color
+
+def benchmark(side, frames):
+    import glcore
+    import gl_state
+    import program_cache
+
+    context = headless.create_context(64, 64)
+
+    program = program_cache.create_program(benchmark_vertex_shader_text, benchmark_fragment_shader_text)
+    gl_state.use_program(program)
+
+    position, texcoord, color = grid(side)
+    count = len(position)
+
+    layouts = [('separate float', sum(a.nbytes for a in (position, texcoord, color)) // count,
+                lambda: glcore.create_vao((position, 3), (texcoord, 2), (color, 4)))]
+    for label, dtype in BENCHMARK_LAYOUTS.items():
+        def create(dtype=dtype):
+            vertices = pack(dtype, position=position, texcoord=texcoord, color=color)
+            vao = glGenVertexArrays(1)
+            gl_state.bind_vertex_array(vao)
+            vbo = glGenBuffers(1)
+            gl_state.bind_buffer(GL_ARRAY_BUFFER, vbo)
+            glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL_STATIC_DRAW)
+            enable_attributes(dtype)
+            return vao, [vbo]
+        layouts.append((label, dtype.itemsize, create))
+
+    print('%d vertices, drawn as points' % count)
+    print('%-16s %10s %10s %10s %16s' % ('layout', 'bytes/vtx', 'MB', 'ms/frame', 'vertices/sec'))
+    for label, size, create in layouts:
+        vao, buffers = create()
+        gl_state.bind_vertex_array(vao)
+        glDrawArrays(GL_POINTS, 0, count)
+        glFinish()
+
+        start = time.perf_counter()
+        for _ in range(frames):
+            glDrawArrays(GL_POINTS, 0, count)
+        glFinish()
+        elapsed = (time.perf_counter() - start) / frames
+        print('%-16s %10d %10.1f %10.3f %16.0f' % (label, size, size * count / 2**20, elapsed * 1000, count / elapsed))
+
+        gl_state.bind_vertex_array(0)
+        gl_state.delete_buffer(*buffers)
+        gl_state.delete_vertex_array(vao)
+
+    gl_state.delete_program(program)
+    context.destroy()
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Memory and vertex fetch rate of separate, interleaved and packed layouts.')
+    parser.add_argument('--side', type=int, default=1024, help='the mesh is side x side vertices')
+    parser.add_argument('--frames', type=int, default=50)
+    args = parser.parse_args()
+
+    benchmark(args.side, args.frames)
@@ -0,0 +1,254 @@
+'''
+## Streaming video texture
+
+Feeds camera or video frames into one texture, every frame. The texture is
+allocated once (glTexStorage2D, immutable) and updated with glTexSubImage2D
+from alternating GL_PIXEL_UNPACK_BUFFERs: while the GPU still pulls frame N
+out of one buffer, frame N+1 is copied into the other, so neither side waits
+on the other. The buffer is mapped with GL_MAP_INVALIDATE_BUFFER_BIT and the
+frame is copied into it as decoded, top row first, like image_ingest.py: no
+cv2.flip/cvtColor temporaries (the BGR frame is uploaded as GL_BGR, flip=True
+reverses the rows during the copy for scenes that want them bottom-up).
+
+    python glsl_py12.py --video 0                  # camera 0
+    python glsl_py12.py --video clip.mp4
+    python glsl_py12.py --video frames/            # directory of images or .npy frames
+    python glsl_py12.py --headless --video synthetic --video-size 3840 2160
+
+    python video_texture.py    # sustained FPS at 1080p and 4K, headless
+
+[Pixel Buffer Object - OpenGL Wiki](https://www.khronos.org/opengl/wiki/Pixel_Buffer_Object)
+[OpenGL Pixel Buffer Object (PBO) - songho.ca](http://www.songho.ca/opengl/gl_pbo.html)
+'''
+
+import ctypes
+import glob
+import itertools
+import os
+import time
+
+if __name__ == '__main__':
+    import headless
+
+from OpenGL.GL import *
+import numpy as np
+
+import gl_state
+from pbo_readback import mapped_view
+
+
+def synthetic_frames(width, height, count=8):
+    ''' A few precomputed moving-gradient frames, so throughput excludes decode. '''
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    frames = []
+    for i in range(count):
+        shift = i * 255 / count
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        frame[..., 0] = (x + shift) % 256
+        frame[..., 1] = (y + shift) % 256
+        frame[..., 2] = (x + y) / 2
+        frames.append(frame)
+    return itertools.cycle(frames)
+
+def capture_frames(source, loop=True):
+    import cv2
+
+    camera = isinstance(source, int)
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise RuntimeError('cannot open video source %r' % (source,))
+    try:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                if camera or not loop:
+                    return
+                capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ok, frame = capture.read()
+                if not ok:
+                    return
+            yield frame
+    finally:
+        capture.release()
+
+def file_frames(paths, loop=True):
+    ''' Images (decoded with cv2) or raw .npy frames (memory-mapped). '''
+    import cv2
+
+    while True:
+        for path in paths:
+            if path.endswith('.npy'):
+                yield np.load(path, mmap_mode='r')
+            else:
+                yield cv2.imread(path, 1)
+        if not loop:
+            return
+
+def open_source(spec, size=(1920, 1080), loop=True):
+    '''
+    Frames (H x W x 3 uint8 BGR, top row first) from 'synthetic', a camera
+    index, a directory or glob of frame files, or a video file / URL.
+    '''
+    if spec == 'synthetic':
+        return synthetic_frames(*size)
+    if spec.isdigit():
+        return capture_frames(int(spec))
+    if os.path.isdir(spec):
+        spec = os.path.join(spec, '*')
+    paths = sorted(glob.glob(spec))
+    if len(paths) > 1 or (paths and paths[0].endswith('.npy')):
+        return file_frames(paths, loop)
+    return capture_frames(spec, loop)
+
+
+class StreamingTexture:
+    ''' RGBA8 texture of a fixed size, updated from BGR frames through a ring of unpack buffers. '''
+
+    def __init__(self, width, height, buffers=2, unit=GL_TEXTURE0, wrap=None, flip=False):
+        self.width = width
+        self.height = height
+        self.unit = unit
+        self.flip = flip
+        self.size = width * height * 3
+
+        self.texture = glGenTextures(1)
+        gl_state.bind_texture(GL_TEXTURE_2D, self.texture, unit=unit)
+        if glTexStorage2D:
+            glTexStorage2D(GL_TEXTURE_2D, 1, GL_RGBA8, width, height)
+        else:
+            # GL 4.1 (macOS) has no ARB_texture_storage; same allocation, mutable
+            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA8, width, height, 0, GL_BGR, GL_UNSIGNED_BYTE, None)
+            gl_state.tex_parameter(GL_TEXTURE_2D, GL_TEXTURE_MAX_LEVEL, 0)
+        gl_state.tex_parameter(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        gl_state.tex_parameter(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        if wrap is not None:
+            gl_state.tex_parameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, wrap)
+            gl_state.tex_parameter(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, wrap)
+
+        self.buffers = [int(b) for b in np.atleast_1d(glGenBuffers(buffers))]
+        for buffer in self.buffers:
+            gl_state.bind_buffer(GL_PIXEL_UNPACK_BUFFER, buffer)
+            glBufferData(GL_PIXEL_UNPACK_BUFFER, self.size, None, GL_STREAM_DRAW)
+        gl_state.bind_buffer(GL_PIXEL_UNPACK_BUFFER, 0)
+        self.index = 0
+
+        self.frames = 0
+        self.copy_time = 0.0
+
+    def update(self, frame):
+        if frame.shape != (self.height, self.width, 3):
+            raise RuntimeError('frame is %r, texture is %dx%d BGR' % (frame.shape, self.width, self.height))
+
+        buffer = self.buffers[self.index]
+        self.index = (self.index + 1) % len(self.buffers)
+
+        gl_state.bind_buffer(GL_PIXEL_UNPACK_BUFFER, buffer)
+        # invalidate: the driver may hand out fresh memory instead of waiting for the GPU
+        pointer = glMapBufferRange(GL_PIXEL_UNPACK_BUFFER, 0, self.size, GL_MAP_WRITE_BIT | GL_MAP_INVALIDATE_BUFFER_BIT)
+        start = time.perf_counter()
+        view = mapped_view(pointer, (self.height, self.width, 3))
+        # flipping costs nothing while copying anyway
+        np.copyto(view, frame[::-1] if self.flip else frame)
+        self.copy_time += time.perf_counter() - start
+        glUnmapBuffer(GL_PIXEL_UNPACK_BUFFER)
+
+        gl_state.bind_texture(GL_TEXTURE_2D, self.texture, unit=self.unit)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        glTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0, self.width, self.height, GL_BGR, GL_UNSIGNED_BYTE, ctypes.c_void_p(0))
+        # later client-memory uploads must not read from the buffer
+        gl_state.bind_buffer(GL_PIXEL_UNPACK_BUFFER, 0)
+        self.frames += 1
+
+    def delete(self):
+        gl_state.delete_buffer(*self.buffers)
+        gl_state.delete_texture(self.texture)
+
+
+class VideoTexture(StreamingTexture):
+    ''' StreamingTexture fed from open_source(); the first frame decides the size. '''
+
+    def __init__(self, spec, size=(1920, 1080), loop=True, **kwargs):
+        print('Opening video source', spec)
+        self.source = open_source(spec, size, loop)
+        first = next(self.source, None)
+        if first is None:
+            raise RuntimeError('video source %r has no frames' % (spec,))
+        height, width = first.shape[:2]
+        super().__init__(width, height, **kwargs)
+        self.update(first)
+        self.decode_time = 0.0
+        self.ended = False
+
+    def next_frame(self):
+        ''' Upload the next frame; False (and the last frame stays) once the source ends. '''
+        if self.ended:
+            return False
+        start = time.perf_counter()
+        frame = next(self.source, None)
+        self.decode_time += time.perf_counter() - start
+        if frame is None:
+            self.ended = True
+            return False
+        self.update(frame)
+        return True
+
+    def print_stats(self):
+        if self.frames:
+            print('Video : %d frames %dx%d, decode %.3f ms, copy to PBO %.3f ms per frame' % (
+                self.frames, self.width, self.height,
+                self.decode_time / self.frames * 1000, self.copy_time / self.frames * 1000))
+
+
+def benchmark(sizes, frames, source=None):
+    import glsl_py12
+    import image_ingest
+
+    print('%10s %-10s %12s %10s' % ('input', 'upload', 'ms/frame', 'FPS'))
+    for width, height in sizes:
+        context = headless.create_context(glsl_py12.S, glsl_py12.S)
+        glsl_py12.init_shader()
+        glsl_py12.init_vao()
+        glsl_py12.init_params()
+
+        frames_source = open_source(source or 'synthetic', (width, height))
+        first = next(frames_source)
+        height, width = first.shape[:2]
+
+        still_texture = glGenTextures(1)
+
+        def teximage(frame):
+            # what init_texture() does (glTexImage2D from client memory), once per frame
+            gl_state.bind_texture(GL_TEXTURE_2D, still_texture, unit=GL_TEXTURE0)
+            image_ingest.upload(frame)
+            gl_state.tex_parameter(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+            gl_state.tex_parameter(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+
+        stream = StreamingTexture(width, height, wrap=GL_CLAMP_TO_BORDER)
+        for label, upload in (('teximage', teximage), ('pbo x2', stream.update)):
+            upload(first)
+            glsl_py12.draw_frame()
+            context.present()
+
+            start = time.perf_counter()
+            for frame in itertools.islice(frames_source, frames):
+                upload(frame)
+                glsl_py12.draw_frame()
+                # a swap would not wait for the GPU either; only the last frame is waited for
+            context.present()
+            elapsed = (time.perf_counter() - start) / frames
+            print('%10s %-10s %12.3f %10.1f' % ('%dx%d' % (width, height), label, elapsed * 1000, 1 / elapsed))
+
+        stream.delete()
+        gl_state.delete_texture(still_texture)
+        context.destroy()
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Sustained upload + fisheye render FPS for streamed frames.')
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--source', help='video file, camera index or frame directory instead of synthetic frames')
+    args = parser.parse_args()
+
+    sizes = [(1920, 1080), (3840, 2160)]
+    benchmark(sizes[:1] if args.source else sizes, args.frames, args.source)